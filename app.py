@@ -1,4 +1,3 @@
-import os
 import streamlit as st
 
 st.set_page_config(
@@ -7,32 +6,41 @@ st.set_page_config(
     layout="wide",
 )
 
-# CSS
-if os.path.exists("style.css"):
-    with open("style.css", encoding="utf-8") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+from modules.auth import eh_admin, verificar_autenticacao
+from modules.estaticos import aplicar_estilo, carregar_estatico
+from modules.metricas import finalizar_rerun, iniciar_exportacao, iniciar_rerun
+
+iniciar_exportacao()
+iniciar_rerun()
 
-from modules.auth import verificar_autenticacao
-from modules.pendencias import pagina_pendencias
-from modules.sac import pagina_sac
-from modules.dashboard import pagina_dashboard
+# CSS
+aplicar_estilo()
 
 # ── Auth gate ──────────────────────────────────────────────────────────────
 if not verificar_autenticacao():
     st.stop()
 
+from modules.registros import preaquecer
+
+preaquecer()
+
 # ── Sidebar ────────────────────────────────────────────────────────────────
 _usuario = st.session_state.get("usuario_logado", "")
 
-if os.path.exists("logo.png"):
-    st.sidebar.image("logo.png", use_container_width=True)
+_logo = carregar_estatico("logo.png")
+if _logo is not None:
+    st.sidebar.image(_logo, use_container_width=True)
 
 st.sidebar.markdown(f"<p style='margin:0.5rem 0 0.1rem;font-weight:700;color:#1e293b'>👤 {_usuario}</p>", unsafe_allow_html=True)
 st.sidebar.caption("MENU PRINCIPAL")
 
+_paginas = ["Pendências Logísticas", "SAC / Atendimento", "📊 Dashboard Gerencial"]
+if eh_admin(_usuario):
+    _paginas.append("🛠️ Métricas")
+
 pagina = st.sidebar.radio(
     "Navegação:",
-    ("Pendências Logísticas", "SAC / Atendimento", "📊 Dashboard Gerencial"),
+    _paginas,
     label_visibility="collapsed",
 )
 st.sidebar.markdown("---")
@@ -42,9 +50,19 @@ if st.sidebar.button("🚪 Sair"):
     st.rerun()
 
 # ── Roteamento ─────────────────────────────────────────────────────────────
+# Cada página é importada só quando aberta: o login não espera por pandas,
+# plotly e gspread (ver ``python -m bench.importacao``).
 if pagina == "Pendências Logísticas":
+    from modules.pendencias import pagina_pendencias
     pagina_pendencias()
 elif pagina == "SAC / Atendimento":
+    from modules.sac import pagina_sac
     pagina_sac()
+elif pagina == "🛠️ Métricas":
+    from modules.admin import pagina_metricas
+    pagina_metricas()
 else:
+    from modules.dashboard import pagina_dashboard
     pagina_dashboard()
+
+finalizar_rerun(pagina)
@@ -0,0 +1,418 @@
+"""Teste de carga: N atendentes usando o app ao mesmo tempo, contra a planilha falsa.
+
+Uso::
+
+    python -m bench.carga                                   # 1, 5, 10 e 20 sessões
+    python -m bench.carga --sessoes 10 30 --rodadas 5 --latencia 0.2 --csv carga.csv
+
+Sobe um ``streamlit run app.py`` de verdade e abre uma conexão websocket por
+atendente, cada uma na sua thread, falando o protocolo do navegador: manda o
+estado dos widgets que mudaram e lê as mensagens do servidor até o fim do
+rerun (o ``AppTest`` não serve aqui, ele troca estado global a cada execução e
+não aguenta sessões simultâneas). Cada atendente faz login e, a cada rodada,
+preenche e registra uma Pendência e um SAC e abre o dashboard, o explorador
+de registros e uma busca. O painel de gravações é atualizado a cada
+``run_every`` segundos, como faria o navegador. A planilha falsa começa com
+``--base`` atendimentos e responde com ``--latencia`` segundos por chamada;
+journal, snapshot, planilha e ``secrets.toml`` ficam numa pasta temporária.
+
+Para cada quantidade de sessões mede a latência de cada rerun (p50/p95/p99 por
+ação e no total), a vazão (reruns e registros por segundo), o tempo até a fila
+entregar tudo à planilha e a memória do servidor (RSS) com as sessões abertas.
+"""
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Button_pb2 import Button as ButtonProto
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.runtime.state.common import user_key_from_element_id
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+from websockets.sync.client import connect
+
+from bench.gerador import COLUNAS, RAIZ, gerar_linhas
+from modules.journal import Journal
+from modules.planilha_falsa import PlanilhaFalsa
+from modules.templates import carregar_listas
+
+SESSOES = [1, 5, 10, 20]
+SENHA = "carga"
+_APP = os.path.join(RAIZ, "app.py")
+_CAMPOS = ["sessoes", "acao", "reruns", "p50_ms", "p95_ms", "p99_ms",
+           "reruns_s", "registros_s", "fila_s", "rss_mb", "mb_por_sessao", "erros"]
+_REEXECUTAR = ForwardMsg.ScriptFinishedStatus.FINISHED_EARLY_FOR_RERUN
+_LOTES = itertools.count()  # pedidos de cada medição não repetem os da anterior
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Servidor:
+    """``streamlit run app.py`` num subprocesso, com a saída num log da pasta."""
+
+    def __init__(self, pasta: str, env: dict[str, str], timeout: float = 60.0):
+        self.porta = _porta_livre()
+        self.log = os.path.join(pasta, "servidor.log")
+        with open(self.log, "w") as saida:
+            self.processo = subprocess.Popen(
+                [sys.executable, "-m", "streamlit", "run", _APP,
+                 "--server.headless", "true", "--server.port", str(self.porta),
+                 "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false",
+                 "--secrets.files", os.path.join(pasta, "secrets.toml"), "--logger.level", "error"],
+                cwd=RAIZ, env=env, stdout=saida, stderr=subprocess.STDOUT,
+            )
+        limite = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{self.porta}/_stcore/health", timeout=1):
+                    break
+            except OSError:
+                if self.processo.poll() is not None or time.monotonic() > limite:
+                    self.encerrar()
+                    raise RuntimeError(f"o servidor não subiu:\n{self.ultimas_linhas()}")
+                time.sleep(0.2)
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.porta}/_stcore/stream"
+
+    def rss_mb(self) -> float | None:
+        """Memória residente do servidor (None sem ``/proc``)."""
+        try:
+            with open(f"/proc/{self.processo.pid}/status") as f:
+                for linha in f:
+                    if linha.startswith("VmRSS:"):
+                        return int(linha.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def ultimas_linhas(self, n: int = 20) -> str:
+        with open(self.log, errors="replace") as f:
+            return "".join(f.readlines()[-n:])
+
+    def encerrar(self):
+        self.processo.terminate()
+        try:
+            self.processo.wait(10)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+            self.processo.wait()
+
+
+class Atendente:
+    """Uma sessão do app pelo websocket, cronometrando cada rerun.
+
+    Como o navegador, manda só o estado dos widgets que mudaram (o servidor
+    guarda o resto) e, quando eles foram desenhados num ``st.fragment``,
+    reexecuta só o fragmento. Os widgets com ``key`` são achados pelas
+    mensagens de cada execução; os sem ``key`` (login, navegação), pela árvore
+    da última execução completa.
+    """
+
+    def __init__(self, numero: int, nome: str, pausa: float, timeout: float):
+        self.numero = numero
+        self.nome = nome
+        self.pausa = pausa
+        self.timeout = timeout
+        self.ws = None
+        self.arvore = None
+        self.widgets: dict[str, tuple[object, str]] = {}  # key → (proto, fragmento em que foi desenhado)
+        self.periodicos: dict[str, float] = {}            # fragmento → intervalo do run_every
+        self.ultima_atualizacao = time.monotonic()
+        self.tempos: list[tuple[str, float]] = []
+        self.registros = 0
+        self.erros: list[str] = []
+
+    # ── Protocolo ────────────────────────────────────────────────────────────
+
+    def _receber(self) -> list[ForwardMsg]:
+        mensagens: list[ForwardMsg] = []
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(self.ws.recv(timeout=self.timeout))
+            tipo = msg.WhichOneof("type")
+            if tipo == "new_session":  # rerun completo recomeça a página (inclusive após st.rerun())
+                mensagens.clear()
+                self.periodicos.clear()
+            elif tipo == "auto_rerun":
+                self.periodicos[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif tipo == "script_finished" and msg.script_finished != _REEXECUTAR:
+                return mensagens
+            mensagens.append(msg)
+
+    def _anotar_widgets(self, mensagens: list[ForwardMsg]):
+        for msg in mensagens:
+            if not msg.HasField("delta"):
+                continue
+            if msg.delta.HasField("add_block"):
+                proto = msg.delta.add_block.expandable
+            else:
+                elemento = msg.delta.new_element
+                proto = getattr(elemento, elemento.WhichOneof("type") or "", None)
+            chave = user_key_from_element_id(getattr(proto, "id", "") or "-None")
+            if chave is not None:
+                self.widgets[chave] = (proto, msg.delta.fragment_id)
+
+    def _rodar(self, acao: str, estados: list[WidgetState] = (), fragmento: str = ""):
+        time.sleep(self.pausa)
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(estados)
+        msg.rerun_script.fragment_id = fragmento
+        inicio = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        mensagens = self._receber()
+        self.tempos.append((acao, time.perf_counter() - inicio))
+
+        arvore = parse_tree_from_messages(mensagens)
+        if arvore.exception:
+            self.erros.append(f"{acao}: {arvore.exception[0].message}")
+        if not fragmento:
+            self.arvore = arvore
+            self.widgets.clear()
+        self._anotar_widgets(mensagens)
+
+    def _mudar(self, acao: str, valores: dict[str, object]):
+        """Rerun com novos valores para os widgets de ``key`` dada (True num botão é clique)."""
+        estados, fragmentos = [], set()
+        for chave, valor in valores.items():
+            if chave not in self.widgets:
+                raise LookupError(f"widget {chave!r} não está na tela")
+            proto, fragmento = self.widgets[chave]
+            estado = WidgetState(id=proto.id)
+            if isinstance(valor, str):
+                estado.string_value = valor
+            elif isinstance(proto, ButtonProto):
+                estado.trigger_value = valor
+            else:
+                estado.bool_value = valor
+            estados.append(estado)
+            fragmentos.add(fragmento)
+        self._rodar(acao, estados, fragmentos.pop() if len(fragmentos) == 1 else "")
+
+    def _atualizar_paineis(self):
+        """Reexecuta os fragmentos com ``run_every`` vencido, como o navegador entre uma ação e outra."""
+        if self.periodicos and time.monotonic() - self.ultima_atualizacao >= min(self.periodicos.values()):
+            self.ultima_atualizacao = time.monotonic()
+            for fragmento in list(self.periodicos):
+                self._rodar("painel_gravacoes", fragmento=fragmento)
+
+    # ── Roteiro ──────────────────────────────────────────────────────────────
+
+    def _ir_para(self, acao: str, pagina: str):
+        self._atualizar_paineis()
+        self._rodar(acao, [WidgetState(id=self.arvore.sidebar.radio[0].id, string_value=pagina)])
+
+    def _preencher_e_registrar(self, acao: str, sufixo: str, botao: str, pedido: str):
+        self._atualizar_paineis()
+        self._mudar(f"{acao}.preencher", {
+            f"cliente{sufixo}": f"Cliente {self.numero}", f"ped{sufixo}": pedido, f"nf{sufixo}": f"NF{pedido}",
+        })
+        self._mudar(f"{acao}.registrar", {botao: True})
+        campo, _ = self.widgets[f"ped{sufixo}"]
+        if campo.set_value and not campo.value:  # registro aceito: o callback limpa os campos
+            self.registros += 1
+        else:
+            self.erros.append(f"{acao}.registrar: nada foi enfileirado")
+
+    def entrar(self):
+        self._rodar("abrir")
+        self._rodar("login", [
+            WidgetState(id=self.arvore.selectbox[0].id, string_value=self.nome),
+            WidgetState(id=self.arvore.text_input[0].id, string_value=SENHA),
+            WidgetState(id=next(b.id for b in self.arvore.button if b.label.startswith("Entrar")),
+                        trigger_value=True),
+        ])
+        if not self.arvore.sidebar.radio:
+            raise RuntimeError(f"login recusado: {[e.value for e in self.arvore.error]}")
+
+    def rodada(self, identificador: str):
+        self._ir_para("pendencias", "Pendências Logísticas")
+        self._preencher_e_registrar("pendencias", "_p", "btn_save_pend", f"P{identificador}")
+        self._ir_para("sac", "SAC / Atendimento")
+        self._preencher_e_registrar("sac", "_s", "btn_save_sac", f"S{identificador}")
+        self._ir_para("dashboard", "📊 Dashboard Gerencial")
+        self._mudar("dashboard.registros", {"exp_registros": True})
+        self._mudar("dashboard.busca", {"explorador_busca": f"P{identificador[:4]}"})
+
+
+def _preparar_ambiente(pasta: str, base: int, latencia: float, falha: float, nomes: list[str]) -> dict[str, str]:
+    """Planilha falsa semeada, ``secrets.toml`` com a senha de todos e o ambiente do servidor."""
+    planilha = os.path.join(pasta, "planilha.csv")
+    if base:
+        PlanilhaFalsa(COLUNAS, caminho=planilha).append_rows(gerar_linhas(base))
+    with open(os.path.join(pasta, "secrets.toml"), "w", encoding="utf-8") as f:
+        f.write("[auth]\n")
+        for nome in nomes:  # sem escapes \u: o leitor de TOML do Streamlit não os entende nas chaves
+            f.write(f"{json.dumps(nome, ensure_ascii=False)} = {json.dumps(SENHA)}\n")
+    env = {
+        **os.environ,
+        "ENGAGE_JOURNAL": os.path.join(pasta, "journal.sqlite3"),
+        "ENGAGE_SNAPSHOT": os.path.join(pasta, "snapshot"),
+        "ENGAGE_PLANILHA_FALSA": json.dumps({"caminho": planilha, "latencia": latencia, "falha": falha}),
+    }
+    for variavel in ("ENGAGE_ARMAZENAMENTO", "ENGAGE_METRICAS_ARQUIVO", "ENGAGE_METRICAS_PORTA"):
+        env.pop(variavel, None)
+    return env
+
+
+def _esperar_fila(journal: Journal, limite: float) -> float | None:
+    """Segundos até a fila de gravação esvaziar (None se passar de ``limite``)."""
+    inicio = time.perf_counter()
+    while journal.total_pendente():
+        if time.perf_counter() - inicio > limite:
+            return None
+        time.sleep(0.1)
+    return time.perf_counter() - inicio
+
+
+def rodar(servidor: Servidor, journal: Journal, sessoes: int, rodadas: int, nomes: list[str],
+          pausa: float = 0.0, timeout: float = 60.0, espera_fila: float = 120.0) -> list[dict]:
+    """Roda ``sessoes`` atendentes em paralelo e devolve uma linha por ação mais o total."""
+    rss_antes = servidor.rss_mb()
+    lote = next(_LOTES)
+    atendentes = [Atendente(i, nomes[i % len(nomes)], pausa, timeout) for i in range(sessoes)]
+    largada = threading.Barrier(sessoes + 1)
+    chegada = threading.Barrier(sessoes + 1)
+    medido = threading.Event()
+
+    def roteiro(atendente: Atendente):
+        largada.wait()
+        with contextlib.ExitStack() as conexao:
+            try:
+                atendente.ws = conexao.enter_context(
+                    connect(servidor.url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout))
+                atendente.entrar()
+                for r in range(rodadas):
+                    atendente.rodada(f"{lote:03d}{atendente.numero:04d}{r:03d}")
+            except Exception as e:  # um atendente quebrado não derruba a medição dos outros
+                atendente.erros.append(f"{type(e).__name__}: {e}")
+            chegada.wait()
+            medido.wait()  # a conexão fica aberta até a memória ser medida
+
+    threads = [threading.Thread(target=roteiro, args=(a,), name=f"atendente-{a.numero}") for a in atendentes]
+    for t in threads:
+        t.start()
+    largada.wait()
+    inicio = time.perf_counter()
+    chegada.wait()
+    duracao = time.perf_counter() - inicio
+    fila = _esperar_fila(journal, espera_fila)
+    rss = servidor.rss_mb()  # com as sessões ainda abertas
+    medido.set()
+    for t in threads:
+        t.join()
+
+    por_acao: dict[str, list[float]] = defaultdict(list)
+    for atendente in atendentes:
+        for acao, segundos in atendente.tempos:
+            por_acao[acao].append(segundos)
+    todos = [s for tempos in por_acao.values() for s in tempos]
+    erros = [e for a in atendentes for e in a.erros]
+    for erro in erros[:5]:
+        print(f"    erro: {erro}", file=sys.stderr)
+
+    def linha(acao: str, tempos: list[float], **extras) -> dict:
+        return {"sessoes": sessoes, "acao": acao, "reruns": len(tempos),
+                **{f"p{p}_ms": _percentil(tempos, p) * 1000 if tempos else None for p in (50, 95, 99)}, **extras}
+
+    resultados = [linha(acao, tempos) for acao, tempos in por_acao.items()]
+    resultados.append(linha(
+        "total", todos,
+        reruns_s=len(todos) / duracao,
+        registros_s=sum(a.registros for a in atendentes) / duracao,
+        fila_s=fila,
+        rss_mb=rss,
+        mb_por_sessao=(rss - rss_antes) / sessoes if rss is not None and rss_antes is not None else None,
+        erros=len(erros),
+    ))
+    return resultados
+
+
+def _formatar(r: dict) -> str:
+    ms = "  ".join(f"{r[f'p{p}_ms']:8.0f}" if r[f"p{p}_ms"] is not None else f"{'-':>8}" for p in (50, 95, 99))
+    texto = f"{r['sessoes']:>7}  {r['acao']:<22} {r['reruns']:>7}  {ms}"
+    if r["acao"] == "total":
+        fila = f"{r['fila_s']:.1f}s" if r["fila_s"] is not None else "não esvaziou"
+        memoria = (f"RSS {r['rss_mb']:.0f} MB ({r['mb_por_sessao']:+.1f} MB/sessão)"
+                   if r["rss_mb"] is not None else "RSS indisponível")
+        texto += (f"\n{'':>7}  {r['reruns_s']:.1f} reruns/s · {r['registros_s']:.2f} registros/s · "
+                  f"fila em {fila} · {memoria} · {r['erros']} erro(s)")
+    return texto
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessoes", type=int, nargs="+", default=SESSOES,
+                        help="quantidades de atendentes simultâneos")
+    parser.add_argument("--rodadas", type=int, default=3, help="rodadas do roteiro por atendente")
+    parser.add_argument("--base", type=int, default=5_000, help="atendimentos já na planilha falsa")
+    parser.add_argument("--latencia", type=float, default=0.05, help="segundos por chamada à planilha falsa")
+    parser.add_argument("--falha", type=float, default=0.0, help="probabilidade de erro 5xx por chamada")
+    parser.add_argument("--pausa", type=float, default=0.0, help="segundos de \"digitação\" antes de cada ação")
+    parser.add_argument("--timeout", type=float, default=60.0, help="limite de cada rerun")
+    parser.add_argument("--csv", help="grava os resultados também em CSV")
+    args = parser.parse_args(argv)
+
+    # Fora do `streamlit run` os caches avisam a cada chamada
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith("streamlit"):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+    listas = carregar_listas()
+    nomes = list(dict.fromkeys(listas["colaboradores_sac"] + listas["colaboradores_pendencias"]))
+    pasta = tempfile.mkdtemp(prefix="engage-carga-")
+    servidor = None
+    try:
+        env = _preparar_ambiente(pasta, args.base, args.latencia, args.falha, nomes)
+        servidor = Servidor(pasta, env, args.timeout)
+        journal = Journal(env["ENGAGE_JOURNAL"])
+        # Uma sessão antes de medir: carga da base e caches não entram na primeira contagem
+        rodar(servidor, journal, 1, 1, nomes, timeout=args.timeout)
+
+        print(f"{'sessoes':>7}  {'acao':<22} {'reruns':>7}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}",
+              file=sys.stderr)
+        resultados = []
+        for sessoes in args.sessoes:
+            linhas = rodar(servidor, journal, sessoes, args.rodadas, nomes, args.pausa, args.timeout)
+            for r in linhas:
+                print(_formatar(r), file=sys.stderr, flush=True)
+            resultados += linhas
+            if servidor.processo.poll() is not None:
+                raise RuntimeError(f"o servidor caiu:\n{servidor.ultimas_linhas()}")
+    finally:
+        if servidor is not None:
+            servidor.encerrar()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=_CAMPOS)
+            escritor.writeheader()
+            escritor.writerows(resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Gerador de atendimentos sintéticos com distribuições próximas das reais.
+
+As listas de colaboradores, portais, transportadoras e motivos vêm de
+``data/lists.json`` e dos templates; os pesos seguem uma lei de Zipf (poucos
+portais/motivos concentram a maior parte do volume), o volume por dia cai no
+fim de semana e as horas têm picos no fim da manhã e no meio da tarde.
+"""
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from modules.planilha_falsa import PlanilhaFalsa
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(RAIZ, "data")
+
+COLUNAS = ["Data", "Hora", "Dia_Semana", "Setor", "Colaborador", "Motivo",
+           "Portal", "Nota_Fiscal", "Numero_Pedido", "Motivo_CRM", "Transportadora"]
+_DIAS = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+         "Sexta-feira", "Sábado", "Domingo"]
+
+
+def _ler(nome: str) -> dict:
+    with open(os.path.join(DATA_DIR, nome), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _zipf(n: int, s: float = 1.1) -> np.ndarray:
+    pesos = 1.0 / np.arange(1, n + 1) ** s
+    return pesos / pesos.sum()
+
+
+def _escolher(rng: np.random.Generator, valores: list[str], n: int, s: float = 1.1) -> np.ndarray:
+    ordem = rng.permutation(len(valores))  # quem é "popular" varia com a semente
+    idx = rng.choice(len(valores), size=n, p=_zipf(len(valores), s))
+    return np.asarray(valores, dtype=object)[ordem][idx]
+
+
+def gerar_atendimentos(n: int, dias: int = 365, fim: date | None = None, semente: int = 42) -> pd.DataFrame:
+    """``n`` linhas no formato cru da planilha (todas as colunas como texto)."""
+    rng = np.random.default_rng(semente)
+    listas = _ler("lists.json")
+    motivos_sac = list(_ler("templates_sac.json"))
+    motivos_pend = list(_ler("templates_pendencias.json"))
+    fim = fim or date.today()
+
+    # Dias úteis pesam 5x mais que fim de semana
+    calendario = [fim - timedelta(days=d) for d in range(dias)][::-1]
+    pesos_dia = np.array([1.0 if d.weekday() < 5 else 0.2 for d in calendario])
+    dia_idx = rng.choice(dias, size=n, p=pesos_dia / pesos_dia.sum())
+
+    # Horário comercial com picos às 11h e às 15h
+    horas_base = np.where(rng.random(n) < 0.5, rng.normal(11, 1.5, n), rng.normal(15, 1.8, n))
+    segundos = (horas_base * 3600).astype(int) + rng.integers(0, 60, n)
+    segundos = np.clip(segundos, 8 * 3600, 19 * 3600 - 1)
+
+    # A planilha é append-only: linhas em ordem cronológica
+    ordem = np.lexsort((segundos, dia_idx))
+    dia_idx, segundos = dia_idx[ordem], segundos[ordem]
+    datas = np.array([d.strftime("%d/%m/%Y") for d in calendario], dtype=object)[dia_idx]
+    dia_semana = np.array([_DIAS[d.weekday()] for d in calendario], dtype=object)[dia_idx]
+    relogio = np.array([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)], dtype=object)
+    horas = relogio[segundos]
+
+    sac = rng.random(n) < 0.6
+    setor = np.where(sac, "SAC", "Pendência").astype(object)
+    colab = np.where(
+        sac,
+        _escolher(rng, listas["colaboradores_sac"], n, 0.4),
+        _escolher(rng, listas["colaboradores_pendencias"], n, 0.4),
+    )
+    motivo = np.where(sac, _escolher(rng, motivos_sac, n), _escolher(rng, motivos_pend, n))
+    crm = _escolher(rng, ["-"] + listas["lista_motivo_crm"], n)
+    transp = np.where(
+        sac & (rng.random(n) < 0.7), "-",
+        _escolher(rng, listas["lista_transportadoras"], n, 0.9),
+    )
+
+    return pd.DataFrame({
+        "Data":           pd.array(datas, dtype="str"),
+        "Hora":           pd.array(horas, dtype="str"),
+        "Dia_Semana":     pd.array(dia_semana, dtype="str"),
+        "Setor":          pd.array(setor, dtype="str"),
+        "Colaborador":    pd.array(colab, dtype="str"),
+        "Motivo":         pd.array(motivo, dtype="str"),
+        "Portal":         pd.array(_escolher(rng, listas["lista_portais"], n), dtype="str"),
+        "Nota_Fiscal":    pd.array(rng.integers(100_000, 999_999, n).astype(str), dtype="str"),
+        "Numero_Pedido":  pd.array(rng.integers(10**9, 10**10, n).astype(str), dtype="str"),
+        "Motivo_CRM":     pd.array(crm, dtype="str"),
+        "Transportadora": pd.array(transp, dtype="str"),
+    })[COLUNAS]
+
+
+def gerar_linhas(n: int, **kwargs) -> list[list[str]]:
+    """Mesmos dados como lista de linhas, como devolve ``Worksheet.get_values``."""
+    return gerar_atendimentos(n, **kwargs).astype(object).values.tolist()
+
+
+def planilha_falsa(n: int, semente: int = 42, **config) -> PlanilhaFalsa:
+    """``PlanilhaFalsa`` já com ``n`` atendimentos; ``config`` liga latência e falhas."""
+    planilha = PlanilhaFalsa(COLUNAS, semente=semente)
+    planilha.append_rows(gerar_linhas(n, semente=semente))
+    for chave, valor in config.items():
+        setattr(planilha, chave, valor)
+    return planilha
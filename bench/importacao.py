@@ -0,0 +1,85 @@
+"""Perfil de tempo de importação: quanto cada página custa num processo frio.
+
+Uso::
+
+    python -m bench.importacao                    # login e cada página
+    python -m bench.importacao --top 15 --repeticoes 5
+
+Cada medição roda num subprocesso novo com ``python -X importtime``. O
+Streamlit é importado antes (ele já está carregado quando o ``app.py`` roda) e
+o custo informado é só o que a página acrescenta; a quebra por pacote soma o
+tempo próprio (``self``) de todos os módulos de cada pacote de topo.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE = "streamlit"
+
+# O que cada tela importa antes de desenhar a primeira coisa
+_APP = ["modules.auth", "modules.estaticos", "modules.metricas"]
+PERFIS = {
+    "login": _APP,
+    "pendencias": [*_APP, "modules.pendencias"],
+    "sac": [*_APP, "modules.sac"],
+    "dashboard": [*_APP, "modules.dashboard"],
+    "metricas": [*_APP, "modules.admin"],
+}
+
+
+def medir(modulos: list[str]) -> tuple[float, float, dict[str, float]]:
+    """(ms do Streamlit, ms acrescentados pelos módulos, ms próprios por pacote)."""
+    codigo = "; ".join(f"import {m}" for m in [BASE, *modulos])
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    ).stderr
+    base = total = 0.0
+    depois_da_base = False
+    pacotes: dict[str, float] = defaultdict(float)
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "|" not in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|")
+        if not proprio.strip().isdigit():
+            continue  # cabeçalho
+        topo = not nome.startswith("  ")  # importado direto pelo -c, não por outro módulo
+        nome = nome.strip()
+        if depois_da_base:
+            pacotes[nome.split(".")[0]] += int(proprio) / 1000
+            if topo:
+                total += int(acumulado) / 1000
+        elif topo and nome == BASE:
+            base = int(acumulado) / 1000
+            depois_da_base = True
+    return base, total, pacotes
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("perfis", nargs="*", metavar="tela",
+                        help=f"telas a medir: {', '.join(PERFIS)} (padrão: todas)")
+    parser.add_argument("--repeticoes", type=int, default=3,
+                        help="processos por tela; vale a mediana")
+    parser.add_argument("--top", type=int, default=8, help="pacotes mais pesados listados por tela")
+    args = parser.parse_args(argv)
+    for perfil in set(args.perfis) - set(PERFIS):
+        parser.error(f"tela desconhecida: {perfil}")
+
+    for perfil in args.perfis or PERFIS:
+        medicoes = [medir(PERFIS[perfil]) for _ in range(args.repeticoes)]
+        base = statistics.median(m[0] for m in medicoes)
+        total = statistics.median(m[1] for m in medicoes)
+        pacotes = {p: statistics.median(m[2].get(p, 0.0) for m in medicoes)
+                   for p in set().union(*(m[2] for m in medicoes))}
+        print(f"{perfil:<12} {total:>8.0f} ms  (+ {base:.0f} ms do {BASE})")
+        for pacote, ms in sorted(pacotes.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"{'':<12} {ms:>8.0f} ms  {pacote}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Benchmark do pipeline completo sobre bases sintéticas.
+
+Uso::
+
+    python -m bench.run                          # 10k, 100k, 1M e 5M linhas
+    python -m bench.run --tamanhos 10000 200000 --csv bench_output.txt
+
+Para cada tamanho gera a base com ``bench.gerador`` e mede, etapa por etapa,
+o tempo (``perf_counter``) e o pico de memória alocada (``tracemalloc``, numa
+segunda execução da etapa para não distorcer o tempo).
+"""
+import argparse
+import csv
+import gc
+import logging
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from typing import Callable
+
+import pandas as pd
+
+from bench.gerador import COLUNAS, gerar_atendimentos
+from modules import rollup
+from modules.explorador import IndiceExplorador
+from modules.exportacao import gerar_csv, gerar_excel
+from modules.ingestao import categorias_de_listas, ordenar, tipar
+from modules.sac import CAMPOS_EXTRAS
+from modules.snapshot import SnapshotAtendimentos
+from modules.templates import carregar_listas, carregar_motor, carregar_templates, renderizar_template
+from modules.validation import validar_pendencia, validar_sac
+
+TAMANHOS = [10_000, 100_000, 1_000_000, 5_000_000]
+CAUDA = 1_000  # linhas anexadas ao cubo na etapa incremental
+
+
+class Etapa:
+    def __init__(self, nome: str, executar: Callable[[dict], object]):
+        self.nome = nome
+        self.executar = executar
+
+
+def _mensagens(ctx: dict) -> pd.DataFrame:
+    return ctx["bruto"].head(ctx["max_mensagens"])
+
+
+def _montar_sac(ctx: dict) -> int:
+    motor = carregar_motor("sac")
+    linhas = _mensagens(ctx)
+    linhas = linhas[linhas["Setor"] == "SAC"]
+    for i, (colab, portal, motivo, pedido, transp) in enumerate(zip(
+        linhas["Colaborador"], linhas["Portal"], linhas["Motivo"],
+        linhas["Numero_Pedido"], linhas["Transportadora"],
+    )):
+        extras = {chave: (transp if chave == "transportadora" else f"{chave}-{i}")
+                  for _, _, _, chave in CAMPOS_EXTRAS.get(motivo, [])}
+        valores = {
+            "nome_cliente":  f"Cliente {i}" if i % 4 else "(Nome do cliente)",
+            "numero_pedido": pedido,
+            "portal":        portal,
+            "colaborador":   colab if "AMAZON" not in portal else "",
+            **extras,
+        }
+        motor.renderizar(motivo, valores)
+    return len(linhas)
+
+
+def _montar_pendencias(ctx: dict) -> int:
+    motor = carregar_motor("pendencias")
+    linhas = _mensagens(ctx)
+    linhas = linhas[linhas["Setor"] != "SAC"]
+    for i, (colab, portal, motivo, pedido, transp) in enumerate(zip(
+        linhas["Colaborador"], linhas["Portal"], linhas["Motivo"],
+        linhas["Numero_Pedido"], linhas["Transportadora"],
+    )):
+        motor.renderizar(motivo, {
+            "nome_cliente":   f"Cliente {i}",
+            "numero_pedido":  pedido,
+            "transportadora": transp,
+            "colaborador":    colab if "AMAZON" not in portal else "",
+        })
+    return len(linhas)
+
+
+def _renderizar_template(ctx: dict) -> int:
+    modelos = list(carregar_templates("sac").values()) + list(carregar_templates("pendencias").values())
+    linhas = _mensagens(ctx)
+    for i, (colab, portal, pedido) in enumerate(zip(linhas["Colaborador"], linhas["Portal"], linhas["Numero_Pedido"])):
+        renderizar_template(modelos[i % len(modelos)], {
+            "nome_cliente": f"Cliente {i}", "numero_pedido": pedido, "portal": portal, "colaborador": colab,
+        })
+    return len(linhas)
+
+
+def _validar(ctx: dict) -> int:
+    linhas = _mensagens(ctx)
+    for i, (setor, colab, portal, motivo, pedido, crm, transp) in enumerate(zip(
+        linhas["Setor"], linhas["Colaborador"], linhas["Portal"], linhas["Motivo"],
+        linhas["Numero_Pedido"], linhas["Motivo_CRM"], linhas["Transportadora"],
+    )):
+        dados = {
+            "colaborador": colab, "nome_cliente": "" if i % 7 == 0 else f"Cliente {i}",
+            "portal": portal, "numero_pedido": pedido, "motivo_crm": crm, "transportadora": transp,
+        }
+        if setor == "SAC":
+            validar_sac({**dados, "motivo": motivo}, motivo)
+        else:
+            validar_pendencia(dados)
+    return len(linhas)
+
+
+def _consultas(ctx: dict):
+    """As mesmas agregações que ``pagina_dashboard`` faz num rerun."""
+    cubo = ctx["cubo"].df
+    fim = cubo["Data_Filtro"].max().date()
+    ini = fim - timedelta(days=30)
+    colab = cubo["Colaborador"].mode()[0]
+    hoje = pd.Timestamp(fim)
+    ini_sem = (hoje - timedelta(days=hoje.weekday())).date()
+    for setores in (["SAC", "Pendência"], ["SAC"]):
+        cub = rollup.filtrar(cubo, ini, fim, setores)
+        rollup.kpis(cub)
+        rollup.por_colaborador(cub)
+        rollup.total_colaborador(cub, colab, ini_sem)
+        rollup.total_colaborador(cub, colab, ini_sem - timedelta(days=7), ini_sem)
+        rollup.tendencia_diaria(cub)
+        rollup.evolucao_semanal(cub, colab)
+        rollup.distribuicao_portal(cub)
+        rollup.top_motivos_crm(cub)
+        rollup.picos_por_hora(cub)
+        rollup.motivos_por_setor(cub)
+
+
+def _fatiar(ctx: dict) -> pd.DataFrame:
+    snap = ctx["snap"]
+    fim = ctx["df"]["Data_Filtro"].max().date()
+    snap.publicar(snap.df, snap.cubo, snap.versao + 1)  # sem cache de máscaras, como logo após uma sincronização
+    snap.fatiar(fim - timedelta(days=90), fim, ["SAC"])
+    return snap.fatiar(fim - timedelta(days=30), fim, ["SAC", "Pendência"])
+
+
+def _explorar(ctx: dict) -> int:
+    """Índices do explorador (com a busca) e as páginas de alguns cliques."""
+    indice = IndiceExplorador(ctx["df"])
+    indice.indice_busca()
+    pedido = str(ctx["df"]["Numero_Pedido"].iloc[-1])
+    portal = indice.valores["Portal"][0]
+    for filtros, busca in (({}, ""), ({}, pedido[:2]), ({}, pedido[2:6]), ({"Portal": [portal]}, pedido[-3:])):
+        for inicio in (0, 5_000):
+            indice.pagina(filtros, busca, inicio, 50)
+    return len(ctx["df"])
+
+
+def _incorporar(ctx: dict) -> rollup.CuboAtendimentos:
+    cubo = rollup.CuboAtendimentos()
+    cubo.df = ctx["cubo"].df
+    cubo.incorporar(ctx["cauda"])
+    return cubo
+
+
+def _exportar(ctx: dict) -> int:
+    gerar_excel(ctx["fatia"])
+    return len(ctx["fatia"])
+
+
+def _exportar_csv(ctx: dict) -> int:
+    gerar_csv(ctx["fatia"])
+    return len(ctx["fatia"])
+
+
+def _preparar_snapshot(ctx: dict):
+    snap = SnapshotAtendimentos(COLUNAS, categorias=ctx["categorias"])
+    snap.linhas = len(ctx["df"])
+    snap.publicar(ctx["df"], ctx["cubo"], 1)
+    return snap
+
+
+ETAPAS = [
+    Etapa("gerar",               lambda ctx: gerar_atendimentos(ctx["n"])),
+    Etapa("tipar",               lambda ctx: tipar(ctx["bruto"], ctx["categorias"])),
+    Etapa("ordenar",             lambda ctx: ordenar(ctx["tipado"])),
+    Etapa("cubo",                lambda ctx: _novo_cubo(ctx["df"])),
+    Etapa("cubo.incorporar",     _incorporar),
+    Etapa("dashboard.consultas", _consultas),
+    Etapa("snapshot.fatiar",     _fatiar),
+    Etapa("explorador",          _explorar),
+    Etapa("renderizar_template", _renderizar_template),
+    Etapa("mensagem.sac",        _montar_sac),
+    Etapa("mensagem.pendencias", _montar_pendencias),
+    Etapa("validacao",           _validar),
+    Etapa("exportar_csv",        _exportar_csv),
+    Etapa("exportar_excel",      _exportar),
+]
+# Onde o resultado de cada etapa fica guardado para as seguintes
+_SAIDAS = {"gerar": "bruto", "tipar": "tipado", "ordenar": "df", "cubo": "cubo", "snapshot.fatiar": "fatia"}
+
+
+def _novo_cubo(df: pd.DataFrame) -> rollup.CuboAtendimentos:
+    cubo = rollup.CuboAtendimentos()
+    cubo.reconstruir(df)
+    return cubo
+
+
+def _medir(etapa: Etapa, ctx: dict, memoria: bool) -> tuple[object, float, float | None]:
+    gc.collect()
+    t0 = time.perf_counter()
+    resultado = etapa.executar(ctx)
+    segundos = time.perf_counter() - t0
+    pico = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            etapa.executar(ctx)
+            pico = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def rodar(n: int, memoria: bool = True, max_mensagens: int = 100_000, max_excel: int = 200_000) -> list[dict]:
+    listas = carregar_listas()
+    ctx = {
+        "n": n,
+        "max_mensagens": max_mensagens,
+        "categorias": categorias_de_listas(listas, [carregar_templates("sac"), carregar_templates("pendencias")]),
+    }
+    carregar_motor("sac"), carregar_motor("pendencias")  # compilação fora da medição
+
+    resultados = []
+    for etapa in ETAPAS:
+        if etapa.nome == "exportar_excel" and len(ctx.get("fatia", ())) > max_excel:
+            resultados.append({"tamanho": n, "etapa": etapa.nome, "linhas": len(ctx["fatia"]),
+                               "segundos": None, "pico_mb": None})
+            print(_formatar(resultados[-1]), file=sys.stderr, flush=True)
+            continue
+        if etapa.nome == "cubo.incorporar":
+            # Cauda com datas novas, como as linhas que chegam da planilha
+            cauda = ctx["df"].tail(CAUDA).copy()
+            cauda["Data_Filtro"] = cauda["Data_Filtro"] + pd.Timedelta(days=1)
+            ctx["cauda"] = cauda
+        if etapa.nome == "snapshot.fatiar":
+            ctx["snap"] = _preparar_snapshot(ctx)
+
+        resultado, segundos, pico = _medir(etapa, ctx, memoria)
+        if etapa.nome in _SAIDAS:
+            ctx[_SAIDAS[etapa.nome]] = resultado
+        if etapa.nome == "ordenar":
+            ctx.pop("tipado")  # libera a cópia não ordenada
+
+        if isinstance(resultado, int):
+            linhas = resultado
+        elif isinstance(resultado, pd.DataFrame):
+            linhas = len(resultado)
+        elif isinstance(resultado, rollup.CuboAtendimentos):
+            linhas = len(resultado.df)
+        else:
+            linhas = n
+        resultados.append({"tamanho": n, "etapa": etapa.nome, "linhas": linhas,
+                           "segundos": segundos, "pico_mb": pico})
+        print(_formatar(resultados[-1]), file=sys.stderr, flush=True)
+    return resultados
+
+
+def _formatar(r: dict) -> str:
+    seg = f"{r['segundos']:9.3f}s" if r["segundos"] is not None else "   pulado "
+    pico = f"{r['pico_mb']:9.1f} MB" if r["pico_mb"] is not None else "        - "
+    return f"{r['tamanho']:>10,}  {r['etapa']:<22} {r['linhas']:>10,}  {seg}  {pico}"
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS,
+                        help="quantidades de linhas da base sintética")
+    parser.add_argument("--sem-memoria", action="store_true",
+                        help="não mede o pico de memória (roda cada etapa uma vez só)")
+    parser.add_argument("--max-mensagens", type=int, default=100_000,
+                        help="linhas usadas nas etapas de mensagem e validação")
+    parser.add_argument("--max-excel", type=int, default=200_000,
+                        help="acima disso a exportação Excel é pulada")
+    parser.add_argument("--csv", help="grava os resultados também em CSV")
+    args = parser.parse_args(argv)
+
+    # Fora do `streamlit run` os caches avisam a cada chamada
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith("streamlit"):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+
+    print(f"{'tamanho':>10}  {'etapa':<22} {'linhas':>10}  {'tempo':>10}  {'pico':>12}", file=sys.stderr)
+    resultados = []
+    for n in args.tamanhos:
+        resultados += rodar(n, memoria=not args.sem_memoria,
+                            max_mensagens=args.max_mensagens, max_excel=args.max_excel)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=["tamanho", "etapa", "linhas", "segundos", "pico_mb"])
+            escritor.writeheader()
+            escritor.writerows(resultados)
+
+
+if __name__ == "__main__":
+    main()
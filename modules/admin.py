@@ -0,0 +1,77 @@
+import pandas as pd
+import streamlit as st
+
+from modules.metricas import METRICAS, rastro_anterior
+
+
+def _tabela_contadores(prefixo: str) -> pd.DataFrame:
+    linhas = [
+        {"metrica": nome, "rotulos": ", ".join(f"{k}={v}" for k, v in rotulos), "valor": valor}
+        for (nome, rotulos), valor in sorted(METRICAS.contadores().items())
+        if nome.startswith(prefixo)
+    ]
+    return pd.DataFrame(linhas, columns=["metrica", "rotulos", "valor"])
+
+
+def _tabela_caches() -> pd.DataFrame:
+    chamadas, faltas = {}, {}
+    for (nome, rotulos), valor in METRICAS.contadores().items():
+        funcao = dict(rotulos).get("funcao")
+        if nome == "engage_cache_chamadas_total":
+            chamadas[funcao] = valor
+        elif nome == "engage_cache_misses_total":
+            faltas[funcao] = valor
+    linhas = [
+        {"funcao": f, "chamadas": int(n), "acertos": int(n - faltas.get(f, 0)), "faltas": int(faltas.get(f, 0)),
+         "taxa_acerto": (n - faltas.get(f, 0)) / n if n else 0.0}
+        for f, n in sorted(chamadas.items(), key=lambda item: -item[1])
+    ]
+    return pd.DataFrame(linhas, columns=["funcao", "chamadas", "acertos", "faltas", "taxa_acerto"])
+
+
+def pagina_metricas():
+    """Rastro do último rerun da sessão e métricas acumuladas do processo (só administradores)."""
+    st.markdown(
+        '<div style="background:linear-gradient(135deg,#0f172a 0%,#334155 100%);'
+        'border-radius:20px;padding:1.75rem 2rem;margin-bottom:1.25rem;color:white">'
+        '<h1 style="margin:0;color:white;font-size:1.9rem;font-weight:800">🛠️ Métricas</h1>'
+        '<p style="margin:0.35rem 0 0;opacity:0.85;font-size:0.9rem">'
+        'Onde o tempo vai: etapas, chamadas ao Google Sheets, fila de gravação e caches</p>'
+        '</div>',
+        unsafe_allow_html=True,
+    )
+    if st.button("🔄 Atualizar"):
+        st.rerun()
+
+    pagina, spans = rastro_anterior()
+    st.subheader(f"Último rerun{f' · {pagina}' if pagina else ''}")
+    if spans:
+        rastro = pd.DataFrame(sorted(spans, key=lambda s: s.inicio))
+        rastro["etapa"] = ["    " * p + e for e, p in zip(rastro["etapa"], rastro["profundidade"])]
+        segundos = st.column_config.NumberColumn(format="%.3f s")
+        st.dataframe(
+            rastro[["etapa", "inicio", "duracao"]], column_config={"inicio": segundos, "duracao": segundos},
+            hide_index=True, use_container_width=True,
+        )
+    else:
+        st.caption("Abra outra página e volte para ver o rastro dela.")
+
+    st.subheader("Etapas e latências (processo)")
+    resumo = pd.DataFrame(METRICAS.resumo(), columns=["metrica", "rotulos", "n", "total_s", "media_s", "p50_s", "p95_s"])
+    st.dataframe(resumo, hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Google Sheets e fila")
+        st.dataframe(
+            pd.concat([_tabela_contadores("engage_sheets_"), _tabela_contadores("engage_fila_")]),
+            hide_index=True, use_container_width=True,
+        )
+    with col2:
+        st.subheader("Caches")
+        st.dataframe(_tabela_caches(), hide_index=True, use_container_width=True)
+
+    texto = METRICAS.exportar()
+    st.download_button("⬇️ Métricas (Prometheus)", data=texto, file_name="metricas.prom", mime="text/plain")
+    with st.expander("Formato texto do Prometheus"):
+        st.code(texto, language="text")
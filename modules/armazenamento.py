@@ -0,0 +1,328 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+
+import pandas as pd
+
+from modules.explorador import FILTROS, TAMANHO_NGRAMA, normalizar_busca
+from modules.fila_gravacao import FilaGravacao
+from modules.indice_pedidos import COLUNAS_HISTORICO, mais_recentes, normalizar_chave
+from modules.ingestao import como_categoria, tipar
+from modules.journal import VAR_DIR
+from modules.metricas import span
+from modules.rollup import DIMENSOES, CuboAtendimentos
+
+CAMINHO_BASE_LOCAL = os.environ.get("ENGAGE_BASE_LOCAL", os.path.join(VAR_DIR, "atendimentos.sqlite3"))
+
+
+class Armazenamento(ABC):
+    """Onde os atendimentos ficam guardados.
+
+    A ``FilaGravacao`` entrega os lotes do journal por ``gravar_lote`` e resolve
+    envios incertos com ``conferir_lote``. O dashboard consulta ``base()``, um
+    objeto com ``versao``, ``linhas``, ``cubo``, ``fatiar(ini, fim, setores)``,
+    ``explorar(filtros, busca, inicio, quantidade)`` e ``valores_filtro()``
+    (como ``SnapshotAtendimentos``). Um backend que não implemente os quatro
+    métodos falha já ao ser instanciado.
+    """
+
+    janela = 2.0  # segundos que a fila espera para juntar um lote
+
+    @abstractmethod
+    def gravar_lote(self, linhas: list[list]):
+        ...
+
+    @abstractmethod
+    def conferir_lote(self, linhas: list[list]) -> set[int]:
+        ...
+
+    @abstractmethod
+    def base(self, ini: date | None = None, fim: date | None = None):
+        """Base do dashboard; ``ini``/``fim`` dizem que período precisa estar em dia."""
+
+    @abstractmethod
+    def historico(self, pedido: str | None = None, nf: str | None = None, limite: int = 20) -> pd.DataFrame:
+        """Atendimentos já registrados para o pedido ou a NF, do mais recente ao mais antigo."""
+
+
+def _dia_iso(data: str) -> str | None:
+    try:
+        return datetime.strptime(str(data), "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return None
+
+
+def _hora_int(hora: str) -> int | None:
+    prefixo = str(hora)[:2]
+    return int(prefixo) if prefixo.strip().isdigit() else None
+
+
+class ArmazenamentoLocal(Armazenamento):
+    """Base SQLite local (modo WAL) com uma linha por atendimento.
+
+    Além das colunas da planilha guarda ``dia`` (ISO) e ``hora_int``, indexados
+    para o dashboard: o cubo é agregado no próprio SQLite (``GROUP BY``) e
+    atualizado só com as linhas novas, e ``fatiar`` filtra período e setor no
+    ``WHERE`` em vez de carregar a base inteira no pandas. Pedido e NF têm
+    índices próprios (sobre o valor normalizado) para o ``historico``. O
+    explorador pagina no SQLite (``LIMIT``/``OFFSET`` sobre o índice de data e
+    hora), filtra pelos índices de cada coluna e busca pedido/NF numa tabela
+    FTS5 com tokenizador de trigramas, mantida por gatilho.
+
+    Com ``espelho`` (uma ``FilaGravacao`` para a planilha) as linhas também são
+    enfileiradas para o Google Sheets depois do COMMIT na base, em ordem de id.
+    A tabela ``espelho`` guarda até que id isso já foi feito, e a chave de cada
+    linha no journal do espelho é o próprio id (``local:<id>``): nem um envio
+    incerto conferido, nem um reinício voltam a mandar a mesma linha, e linhas
+    idênticas continuam sendo linhas distintas na planilha.
+    """
+
+    janela = 0.2
+
+    def __init__(
+        self,
+        colunas: list[str],
+        caminho: str = CAMINHO_BASE_LOCAL,
+        categorias: dict[str, list[str]] | None = None,
+        espelho: FilaGravacao | None = None,
+    ):
+        self.colunas = list(colunas)
+        self.categorias = categorias or {}
+        self.espelho = espelho
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        campos = ", ".join(f'"{c}" TEXT' for c in self.colunas)
+        self._con.executescript(f"""
+            CREATE TABLE IF NOT EXISTS atendimentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, {campos}, dia TEXT, hora_int INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_dia ON atendimentos (dia, "Setor");
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_colaborador ON atendimentos ("Colaborador", dia);
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_pedido ON atendimentos (UPPER(TRIM("Numero_Pedido")));
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_nf ON atendimentos (UPPER(TRIM("Nota_Fiscal")));
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_recencia ON atendimentos (dia, "Hora");
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_portal ON atendimentos ("Portal", dia, "Hora");
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_transportadora ON atendimentos ("Transportadora", dia, "Hora");
+            CREATE INDEX IF NOT EXISTS ix_atendimentos_motivo ON atendimentos ("Motivo", dia, "Hora");
+            CREATE TABLE IF NOT EXISTS espelho (ate INTEGER NOT NULL);
+        """)
+        if self._con.execute("SELECT 1 FROM espelho").fetchone() is None:
+            # Base anterior ao controle do espelho: o que já estava nela já foi enfileirado
+            self._con.execute("INSERT INTO espelho SELECT COALESCE(MAX(id), 0) FROM atendimentos")
+        self._busca_fts = self._criar_busca()
+        self._lock_cubo = threading.Lock()
+        self.cubo = CuboAtendimentos()
+        self.versao = 0   # maior id já agregado no cubo
+        self.linhas = 0
+        self._valores: tuple[int, dict[str, list[str]]] = (-1, {})
+        self._lock_espelho = threading.Lock()
+        self._espelhar(conferir=True)  # a última execução pode ter caído no meio do espelho
+
+    def _criar_busca(self) -> bool:
+        """Tabela de busca por trigramas de pedido/NF; False se o SQLite não tiver FTS5 com trigramas."""
+        existia = self._con.execute("SELECT 1 FROM sqlite_master WHERE name = 'atendimentos_busca'").fetchone()
+        # Pedido e NF numa coluna só, separados por um caractere que ninguém digita
+        chave = 'UPPER(TRIM(new."Numero_Pedido")) || char(31) || UPPER(TRIM(new."Nota_Fiscal"))'
+        try:
+            self._con.executescript(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS atendimentos_busca USING fts5(chave, tokenize='trigram');
+                CREATE TRIGGER IF NOT EXISTS atendimentos_busca_ai AFTER INSERT ON atendimentos BEGIN
+                    INSERT INTO atendimentos_busca (rowid, chave) VALUES (new.id, {chave});
+                END;
+            """)
+        except sqlite3.OperationalError:
+            return False
+        if not existia:  # base criada antes da busca: indexa o que já está lá
+            self._con.execute(
+                f"INSERT INTO atendimentos_busca (rowid, chave) SELECT id, {chave.replace('new.', '')} FROM atendimentos"
+            )
+        return True
+
+    # ── Escrita ──────────────────────────────────────────────────────────────
+
+    def _normalizar(self, linha: list) -> list[str]:
+        n = len(self.colunas)
+        return (["" if v is None else str(v) for v in linha] + [""] * n)[:n]
+
+    def _espelhar(self, conferir: bool = False):
+        """Enfileira no espelho as linhas com id além da marca da tabela ``espelho``.
+
+        Com ``conferir``, pula as que o journal do espelho já tem (queda entre a
+        anotação e a atualização da marca).
+        """
+        if self.espelho is None:
+            return
+        colunas = ", ".join(f'"{c}"' for c in self.colunas)
+        with self._lock_espelho:
+            ate, = self._consultar("SELECT ate FROM espelho")[0]
+            feito = ate
+            try:
+                for id_linha, *linha in self._consultar(
+                    f"SELECT id, {colunas} FROM atendimentos WHERE id > ? ORDER BY id", (ate,)
+                ):
+                    chave = f"local:{id_linha}"
+                    if not (conferir and self.espelho.anotada(chave)):
+                        self.espelho.enfileirar(linha, chave)
+                    feito = id_linha
+            finally:
+                if feito != ate:
+                    with self._lock:
+                        self._con.execute("UPDATE espelho SET ate = ?", (feito,))
+
+    def gravar_lote(self, linhas: list[list]):
+        linhas = [self._normalizar(linha) for linha in linhas]
+        colunas = ", ".join(f'"{c}"' for c in self.colunas)
+        marcas = ", ".join("?" * (len(self.colunas) + 2))
+        valores = [(*linha, _dia_iso(linha[0]), _hora_int(linha[1])) for linha in linhas]
+        with self._lock:
+            self._con.execute("BEGIN")
+            try:
+                self._con.executemany(
+                    f"INSERT INTO atendimentos ({colunas}, dia, hora_int) VALUES ({marcas})", valores
+                )
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            self._con.execute("COMMIT")
+        self._espelhar()  # só depois do COMMIT: a planilha não recebe o que a base recusou
+
+    def conferir_lote(self, linhas: list[list]) -> set[int]:
+        condicao = " AND ".join(f'"{c}" = ?' for c in self.colunas)
+        presentes = set()
+        with self._lock:
+            for k, linha in enumerate(linhas):
+                linha = self._normalizar(linha)
+                sql = f"SELECT 1 FROM atendimentos WHERE dia IS ? AND {condicao} LIMIT 1"
+                if self._con.execute(sql, (_dia_iso(linha[0]), *linha)).fetchone():
+                    presentes.add(k)
+        self._espelhar()  # um envio incerto pode ter caído entre o COMMIT e o espelho
+        return presentes
+
+    # ── Consultas ────────────────────────────────────────────────────────────
+
+    def _consultar(self, sql: str, parametros: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._con.execute(sql, parametros).fetchall()
+
+    def _cubo_sql(self, desde: int, ate: int) -> pd.DataFrame:
+        """Cubo (mesmo formato de ``rollup.agrupar``) das linhas com ``desde < id <= ate``."""
+        linhas = self._consultar(
+            'SELECT dia, hora_int, "Setor", "Colaborador", "Portal", "Motivo_CRM", COUNT(*) '
+            "FROM atendimentos WHERE id > ? AND id <= ? "
+            "GROUP BY 1, 2, 3, 4, 5, 6 ORDER BY dia IS NULL, 1, 2, 3, 4, 5, 6",
+            (desde, ate),
+        )
+        cubo = pd.DataFrame(linhas, columns=[*DIMENSOES, "Qtd"])
+        cubo["Data_Filtro"] = pd.to_datetime(cubo["Data_Filtro"], format="%Y-%m-%d")
+        cubo["Hora_Int"] = cubo["Hora_Int"].astype("Int8")
+        for col in DIMENSOES[2:]:
+            cubo[col] = como_categoria(cubo[col], self.categorias.get(col, []))
+        cubo["Qtd"] = cubo["Qtd"].astype("int64")
+        return cubo
+
+    def atualizar(self):
+        """Incorpora ao cubo as linhas gravadas desde a última chamada."""
+        with self._lock_cubo:
+            ultimo, = self._consultar("SELECT COALESCE(MAX(id), 0) FROM atendimentos")[0]
+            if ultimo == self.versao:
+                return
+            novas, = self._consultar("SELECT COUNT(*) FROM atendimentos WHERE id > ? AND id <= ?",
+                                     (self.versao, ultimo))[0]
+            delta = CuboAtendimentos()
+            with span("base_local.cubo"):
+                delta.df = self._cubo_sql(self.versao, ultimo)
+            cubo = CuboAtendimentos()
+            cubo.combinar([self.cubo, delta])
+            self.cubo = cubo
+            self.linhas += novas
+            self.versao = ultimo  # por último: quem lê a versão antes do cubo nunca vê cubo velho
+
+    def base(self, ini: date | None = None, fim: date | None = None) -> "ArmazenamentoLocal":
+        self.atualizar()  # a base local tem todos os períodos
+        return self
+
+    def _selecionar(self, filtro: str = "", parametros: tuple = ()) -> pd.DataFrame:
+        colunas = ", ".join(f'"{c}"' for c in self.colunas)
+        with span("base_local.consultar"):
+            linhas = self._consultar(
+                f'SELECT {colunas} FROM atendimentos {filtro} ORDER BY dia IS NULL, dia, "Hora", id', parametros
+            )
+        with span("base_local.tipar"):
+            return tipar(pd.DataFrame(linhas, columns=self.colunas, dtype="str"), self.categorias)
+
+    def fatiar(self, ini, fim, setores: list[str]) -> pd.DataFrame:
+        """Linhas entre ``ini`` e ``fim`` (inclusive) dos setores pedidos, filtradas no SQLite."""
+        marcas = ", ".join("?" * len(setores))
+        return self._selecionar(
+            f'WHERE dia BETWEEN ? AND ? AND "Setor" IN ({marcas})',
+            (pd.Timestamp(ini).date().isoformat(), pd.Timestamp(fim).date().isoformat(), *setores),
+        )
+
+    def historico(self, pedido: str | None = None, nf: str | None = None, limite: int = 20) -> pd.DataFrame:
+        condicoes, parametros = [], []
+        for campo, valor in (("Numero_Pedido", pedido), ("Nota_Fiscal", nf)):
+            chave = normalizar_chave(valor)
+            if chave is not None:
+                condicoes.append(f'UPPER(TRIM("{campo}")) = ?')
+                parametros.append(chave)
+        if not condicoes:
+            return mais_recentes(pd.DataFrame(), limite)
+        colunas = ", ".join(f'"{c}"' for c in COLUNAS_HISTORICO)
+        # Um SELECT por índice (UNION) em vez de OR, que faria o SQLite varrer a tabela
+        consulta = " UNION ".join(f"SELECT id, {colunas} FROM atendimentos WHERE {c}" for c in condicoes)
+        linhas = self._consultar(f"SELECT {colunas} FROM ({consulta}) ORDER BY id DESC LIMIT ?", (*parametros, limite))
+        return mais_recentes(pd.DataFrame(linhas, columns=COLUNAS_HISTORICO, dtype="str"), limite)
+
+    def _condicao_busca(self, termo: str) -> tuple[str, tuple]:
+        if len(termo) >= TAMANHO_NGRAMA and self._busca_fts:
+            padrao = "".join(f"[{c}]" if c in "*?[" else c for c in termo)  # GLOB: sem curingas do usuário
+            return "id IN (SELECT rowid FROM atendimentos_busca WHERE chave GLOB ?)", (f"*{padrao}*",)
+        if len(termo) >= TAMANHO_NGRAMA:
+            return ('(INSTR(UPPER(TRIM("Numero_Pedido")), ?) OR INSTR(UPPER(TRIM("Nota_Fiscal")), ?))',
+                    (termo, termo))
+        # Termo curto: prefixo, por faixa nos índices de pedido e NF
+        faixa = (termo, termo + "\U0010ffff")
+        return (
+            'id IN (SELECT id FROM atendimentos WHERE UPPER(TRIM("Numero_Pedido")) >= ? '
+            'AND UPPER(TRIM("Numero_Pedido")) < ? UNION SELECT id FROM atendimentos '
+            'WHERE UPPER(TRIM("Nota_Fiscal")) >= ? AND UPPER(TRIM("Nota_Fiscal")) < ?)',
+            faixa + faixa,
+        )
+
+    def explorar(self, filtros: dict[str, list[str]], busca: str = "", inicio: int = 0,
+                 quantidade: int = 50) -> tuple[pd.DataFrame, int]:
+        condicoes, parametros = [], []
+        for col in FILTROS:
+            if filtros.get(col):
+                condicoes.append(f'"{col}" IN ({", ".join("?" * len(filtros[col]))})')
+                parametros.extend(filtros[col])
+        termo = normalizar_busca(busca)
+        if termo:
+            condicao, valores = self._condicao_busca(termo)
+            condicoes.append(condicao)
+            parametros.extend(valores)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        colunas = ", ".join(f'"{c}"' for c in self.colunas)
+        with span("base_local.explorar"):
+            total, = self._consultar(f"SELECT COUNT(*) FROM atendimentos {onde}", tuple(parametros))[0]
+            # Datas inválidas (NULL) ficam no fim, como no snapshot
+            linhas = self._consultar(
+                f'SELECT {colunas} FROM atendimentos {onde} ORDER BY dia DESC, "Hora" DESC, id DESC LIMIT ? OFFSET ?',
+                (*parametros, quantidade, inicio),
+            )
+        return pd.DataFrame(linhas, columns=self.colunas, dtype="str"), total
+
+    def valores_filtro(self) -> dict[str, list[str]]:
+        versao, valores = self._valores
+        if versao != self.versao:
+            valores = {
+                col: sorted(v for v, in self._consultar(f'SELECT DISTINCT "{col}" FROM atendimentos') if v is not None)
+                for col in FILTROS
+            }
+            self._valores = (self.versao, valores)
+        return valores
@@ -2,6 +2,7 @@ import os
 
 import streamlit as st
 
+from modules.estaticos import carregar_estatico
 from modules.templates import carregar_listas
 
 
@@ -31,11 +32,11 @@ def tela_login() -> bool:
         st.markdown("<div style='margin-top: 1rem'></div>", unsafe_allow_html=True)
 
         # Logo
-        logo_path = "logo.png"
-        if os.path.exists(logo_path):
+        logo = carregar_estatico("logo.png")
+        if logo is not None:
             _, logo_col, _ = st.columns([1, 2, 1])
             with logo_col:
-                st.image(logo_path, use_container_width=True)
+                st.image(logo, use_container_width=True)
 
         st.markdown("<div style='margin-top: 1.5rem'></div>", unsafe_allow_html=True)
 
@@ -82,6 +83,22 @@ def tela_login() -> bool:
     return False
 
 
+def eh_admin(usuario: str) -> bool:
+    """Se ``usuario`` vê a página de métricas.
+
+    Lista em ``ENGAGE_ADMINS`` (nomes separados por vírgula) ou ``admins`` nos secrets.
+    """
+    bruto = os.environ.get("ENGAGE_ADMINS")
+    if bruto is not None:
+        admins = [nome.strip() for nome in bruto.split(",")]
+    else:
+        try:
+            admins = list(st.secrets.get("admins", []))
+        except Exception:  # sem secrets.toml
+            admins = []
+    return bool(usuario) and usuario in admins
+
+
 def verificar_autenticacao() -> bool:
     """Verifica se o usuário está autenticado. Mostra login se não estiver."""
     if st.session_state.get("autenticado"):
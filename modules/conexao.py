@@ -0,0 +1,244 @@
+import functools
+import random
+import threading
+import time
+from typing import Any, Callable
+
+import requests
+from google.auth.exceptions import GoogleAuthError, TransportError
+from gspread.exceptions import APIError
+
+from modules.limitador import AgendadorSheets
+from modules.metricas import METRICAS
+
+
+def erro_de_conexao(erro: Exception) -> bool:
+    """Falhas que pedem reconexão (rede, autenticação, planilha sumida).
+
+    Cota (429) e erros 5xx não derrubam a conexão: reabrir não ajudaria.
+    """
+    if isinstance(erro, APIError):
+        return erro.code in (401, 403, 404)
+    return isinstance(erro, (requests.exceptions.RequestException, GoogleAuthError, ConnectionError))
+
+
+def _erro_de_autenticacao(erro: Exception) -> bool:
+    if isinstance(erro, APIError):
+        return erro.code in (401, 403)
+    return isinstance(erro, GoogleAuthError) and not isinstance(erro, TransportError)
+
+
+def _tipo_erro(erro: Exception) -> str:
+    """Rótulo do erro nas métricas: o código HTTP da API ou o nome da exceção."""
+    if isinstance(erro, APIError):
+        return str(erro.code)
+    return type(erro).__name__
+
+
+class PlanilhaMonitorada:
+    """Repassa as chamadas ao Worksheet e informa o resultado à ``ConexaoPlanilha``.
+
+    As outras abas da mesma planilha (``abas``, ``aba``, ``criar_aba``) vêm
+    embrulhadas do mesmo jeito e contam como a mesma conexão.
+    """
+
+    def __init__(self, sheet, conexao: "ConexaoPlanilha", raiz: "PlanilhaMonitorada | None" = None):
+        self._sheet = sheet
+        self._conexao = conexao
+        self._raiz = raiz or self
+        self._abas: dict[str, PlanilhaMonitorada] = {}
+
+    def __getattr__(self, nome: str) -> Any:
+        atributo = getattr(self._sheet, nome)
+        if not callable(atributo):
+            return atributo
+
+        @functools.wraps(atributo)
+        def chamar(*args, **kwargs):
+            return self._conexao.executar(nome, atributo, args, kwargs, origem=self._raiz)
+
+        return chamar
+
+    def _embrulhar(self, worksheet) -> "PlanilhaMonitorada":
+        if worksheet.title == self._raiz._sheet.title:
+            return self._raiz
+        aba = self._raiz._abas.get(worksheet.title)
+        if aba is None:
+            aba = self._raiz._abas[worksheet.title] = PlanilhaMonitorada(worksheet, self._conexao, self._raiz)
+        return aba
+
+    def abas(self) -> "dict[str, PlanilhaMonitorada]":
+        """Todas as abas da planilha, por título, na ordem das guias."""
+        planilha = self._raiz._sheet.spreadsheet
+        lista = self._conexao.executar("worksheets", planilha.worksheets, (), {}, origem=self._raiz)
+        return {ws.title: self._embrulhar(ws) for ws in lista}
+
+    def aba(self, titulo: str) -> "PlanilhaMonitorada":
+        """Aba pelo título; levanta ``WorksheetNotFound`` se não existir."""
+        if titulo == self._raiz._sheet.title:
+            return self._raiz
+        if titulo in self._raiz._abas:
+            return self._raiz._abas[titulo]
+        planilha = self._raiz._sheet.spreadsheet
+        ws = self._conexao.executar("worksheet", planilha.worksheet, (titulo,), {}, origem=self._raiz)
+        return self._embrulhar(ws)
+
+    def criar_aba(self, titulo: str, linhas: int, colunas: int) -> "PlanilhaMonitorada":
+        planilha = self._raiz._sheet.spreadsheet
+        ws = self._conexao.executar(
+            "add_worksheet", planilha.add_worksheet, (titulo,), {"rows": linhas, "cols": colunas},
+            origem=self._raiz,
+        )
+        return self._embrulhar(ws)
+
+
+class ConexaoPlanilha:
+    """Cliente da planilha de longa duração, com verificação de saúde e reconexão.
+
+    O cliente (credenciais e sessão HTTP com keep-alive e renovação de token)
+    é criado uma vez por ``criar_cliente`` e só é recriado após erro de
+    autenticação. ``abrir(cliente, chave)`` devolve o Worksheet; depois da
+    primeira abertura a chave da planilha é lembrada, então as reaberturas vão
+    direto por ``open_by_key``.
+
+    Toda chamada feita pelo Worksheet devolvido informa sucesso ou falha. Uma
+    falha de conexão descarta o Worksheet e agenda a próxima tentativa com
+    backoff exponencial com jitter; até lá ``obter`` devolve None sem tocar a
+    rede, e nada de ruim fica em cache. Se a conexão ficar ociosa por mais de
+    ``intervalo_verificacao`` segundos, ``verificar`` faz uma sondagem barata
+    antes de reaproveitá-la.
+
+    Com ``agendador`` todas as chamadas (inclusive abertura e sondagem) passam
+    pela cota de leitura/escrita do processo. Por isso sondagem e abertura
+    rodam fora do lock, uma por vez: quem chama ``obter`` enquanto uma delas
+    está em andamento espera o resultado dela, e ``registrar_falha`` não fica
+    preso atrás da cota.
+    """
+
+    def __init__(
+        self,
+        criar_cliente: Callable[[], Any],
+        abrir: Callable[[Any, str | None], Any],
+        verificar: Callable[[Any], None],
+        chave: str | None = None,
+        intervalo_verificacao: float = 120.0,
+        espera_min: float = 1.0,
+        espera_max: float = 60.0,
+        agendador: AgendadorSheets | None = None,
+    ):
+        self._criar_cliente = criar_cliente
+        self._abrir = abrir
+        self._verificar = verificar
+        self.chave = chave
+        self._intervalo_verificacao = intervalo_verificacao
+        self._espera_min = espera_min
+        self._espera_max = espera_max
+        self.agendador = agendador
+        self._cliente = None
+        self._sheet: PlanilhaMonitorada | None = None
+        self._lock = threading.Lock()
+        self._em_andamento: threading.Event | None = None  # sondagem/abertura em curso
+        self.falhas_seguidas = 0
+        self.proxima_tentativa = 0.0
+        self.ultimo_sucesso = 0.0
+        self.reconexoes = 0
+
+    # ── Estado ───────────────────────────────────────────────────────────────
+
+    def registrar_sucesso(self):
+        self.ultimo_sucesso = time.monotonic()
+        self.falhas_seguidas = 0
+
+    def registrar_falha(self, erro: Exception, origem: PlanilhaMonitorada | None = None):
+        if not erro_de_conexao(erro):
+            return
+        with self._lock:
+            if origem is not None and origem is not self._sheet:
+                return  # conexão antiga, já substituída
+            self._descartar(erro)
+
+    def _descartar(self, erro: Exception | None = None):
+        self._sheet = None
+        if erro is None or _erro_de_autenticacao(erro):
+            self._cliente = None
+        self.falhas_seguidas += 1
+        teto = min(self._espera_max, self._espera_min * 2 ** (self.falhas_seguidas - 1))
+        self.proxima_tentativa = time.monotonic() + random.uniform(teto / 2, teto)
+
+    def _agendar(self, nome: str, funcao: Callable, args: tuple = (), kwargs: dict | None = None) -> Any:
+        if self.agendador is None:
+            return funcao(*args, **(kwargs or {}))
+        return self.agendador.executar(nome, funcao, args, kwargs)
+
+    # ── API pública ──────────────────────────────────────────────────────────
+
+    def executar(self, nome: str, funcao: Callable, args: tuple, kwargs: dict,
+                 origem: PlanilhaMonitorada | None = None) -> Any:
+        """Faz a chamada ``nome`` no Worksheet respeitando a cota e registra o resultado."""
+        inicio = time.perf_counter()
+        try:
+            resultado = self._agendar(nome, funcao, args, kwargs)
+        except Exception as e:
+            METRICAS.contar("engage_sheets_erros_total", metodo=nome, erro=_tipo_erro(e))
+            self.registrar_falha(e, origem)
+            raise
+        finally:
+            METRICAS.observar("engage_sheets_latencia_segundos", time.perf_counter() - inicio, metodo=nome)
+        self.registrar_sucesso()
+        return resultado
+
+    def _sondar(self, sheet: PlanilhaMonitorada) -> PlanilhaMonitorada | None:
+        try:
+            self._agendar("verificar", self._verificar, (sheet._sheet,))
+        except Exception as e:
+            if not erro_de_conexao(e):
+                return sheet  # ex.: cota estourada, mas a conexão está de pé
+            with self._lock:
+                if self._sheet is sheet:
+                    self._descartar(e)
+            return None
+        self.registrar_sucesso()
+        return sheet
+
+    def _reabrir(self, cliente) -> PlanilhaMonitorada | None:
+        try:
+            if cliente is None:
+                cliente = self._criar_cliente()
+            if cliente is None:  # sem credenciais configuradas
+                with self._lock:
+                    self._descartar()
+                return None
+            sheet = self._agendar("abrir", self._abrir, (cliente, self.chave))
+        except Exception as e:
+            with self._lock:
+                self._cliente = cliente
+                self._descartar(e)
+            return None
+        with self._lock:
+            self._cliente = cliente
+            self.chave = getattr(getattr(sheet, "spreadsheet", None), "id", None) or self.chave
+            self._sheet = PlanilhaMonitorada(sheet, self)
+            self.reconexoes += 1
+        self.registrar_sucesso()
+        return self._sheet
+
+    def obter(self) -> PlanilhaMonitorada | None:
+        """Worksheet saudável, ou None se estiver sem conexão (em backoff)."""
+        with self._lock:
+            agora = time.monotonic()
+            sheet, cliente, pronto = self._sheet, self._cliente, self._em_andamento
+            if sheet is not None and agora - self.ultimo_sucesso < self._intervalo_verificacao:
+                return sheet
+            if pronto is None:
+                if sheet is None and agora < self.proxima_tentativa:
+                    return None
+                self._em_andamento = threading.Event()
+        if pronto is not None:  # outra thread já está sondando ou abrindo
+            pronto.wait()
+            return self._sheet
+        try:
+            return self._sondar(sheet) if sheet is not None else self._reabrir(cliente)
+        finally:
+            with self._lock:
+                pronto, self._em_andamento = self._em_andamento, None
+            pronto.set()
@@ -1,12 +1,14 @@
-import io
 from datetime import datetime, timedelta
 
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 
-from modules.sheets import carregar_dados_dashboard
+from modules import rollup
+from modules.exportacao import MIME_EXCEL, csv_sob_demanda, excel_sob_demanda
+from modules.explorador import FILTROS
+from modules.metricas import cache_contado, span
+from modules.registros import carregar_base
 
 # ── Paleta consistente ────────────────────────────────────────────────────────
 COR_SAC      = "#2563eb"
@@ -15,6 +17,8 @@ COR_POSITIVO = "#059669"
 COR_ALERTA   = "#f59e0b"
 COR_NEUTRO   = "#64748b"
 
+TAMANHOS_PAGINA = [25, 50, 100, 200]  # opções de linhas por página do explorador
+
 _CHART_LAYOUT = dict(
     template="plotly_white",
     paper_bgcolor="rgba(0,0,0,0)",
@@ -54,35 +58,232 @@ def _secao(titulo: str, descricao: str = ""):
     )
 
 
-def _exportar_excel(df: pd.DataFrame) -> bytes:
-    buffer = io.BytesIO()
-    df_dados = df.copy().drop(columns=["Data_Filtro", "Hora_Int"], errors="ignore")
-    df_dados["Nota_Fiscal"]    = df_dados["Nota_Fiscal"].astype(str)
-    df_dados["Numero_Pedido"]  = df_dados["Numero_Pedido"].astype(str)
+# ── Agregados do time (compartilhados entre sessões) ──────────────────────────
+
+_CONSULTAS_TIME = {
+    "kpis":            rollup.kpis,
+    "por_colaborador": rollup.por_colaborador,
+    "tendencia":       rollup.tendencia_diaria,
+    "media_semanal":   rollup.media_semanal_time,
+    "portais":         rollup.distribuicao_portal,
+    "crm":             lambda cub: rollup.top_motivos_crm(cub, 12),
+    "motivos_setor":   lambda cub: rollup.motivos_por_setor(cub, 10),
+    "horas":           rollup.picos_por_hora,
+}
+
+
+@cache_contado(st.cache_data, max_entries=256, show_spinner=False)
+def _do_time(consulta: str, chave: tuple, _cub):
+    """Agregado que não depende do usuário, calculado uma vez por visão.
+
+    ``chave`` é (versão do snapshot, início, fim, setores) e identifica ``_cub``,
+    que fica fora do hash. Cada sessão recebe a sua cópia do resultado.
+    """
+    return _CONSULTAS_TIME[consulta](_cub)
+
+
+# ── Seções de gráficos (cada uma só roda com a aba aberta) ─────────────────────
+
+@span("grafico.tendencia")
+def _grafico_tendencia(cub, chave: tuple):
+    """Volume total por dia."""
+    _secao("📈 Tendência Diária", "Volume total de atendimentos por dia")
+    trend = _do_time("tendencia", chave, cub)
+    fig1  = px.area(
+        trend, x="Data_Filtro", y="Atendimentos",
+        markers=True, line_shape="spline", text="Atendimentos",
+        color_discrete_sequence=[COR_SAC],
+    )
+    fig1.update_traces(
+        textposition="top center",
+        fillcolor="rgba(37,99,235,0.12)",
+        line=dict(width=2.5),
+    )
+    fig1.update_xaxes(tickformat="%d/%m", dtick="D1", gridcolor="#e2e8f0")
+    fig1.update_yaxes(gridcolor="#e2e8f0")
+    fig1.update_layout(**_CHART_LAYOUT)
+    st.plotly_chart(fig1, use_container_width=True)
+
+
+@span("grafico.evolucao")
+def _grafico_evolucao(cub, chave: tuple, usuario: str):
+    """Semanas do usuário contra a média do time."""
+    _secao("📆 Sua Evolução Semanal", "Seus atendimentos por semana comparado à média do time")
+    evo_merged = rollup.evolucao_semanal(cub, usuario, _do_time("media_semanal", chave, cub))
+
+    fig_evo = go.Figure()
+    fig_evo.add_trace(go.Scatter(
+        x=evo_merged["Semana"], y=evo_merged["Media_Time"].round(1),
+        name="Média do time", mode="lines+markers",
+        line=dict(color=COR_NEUTRO, width=2, dash="dot"),
+        marker=dict(size=6),
+        hovertemplate="Média do time<br>Semana: %{x|%d/%m}<br>Atend.: %{y:.1f}<extra></extra>",
+    ))
+    if usuario:
+        fig_evo.add_trace(go.Scatter(
+            x=evo_merged["Semana"], y=evo_merged["Atendimentos"],
+            name=usuario, mode="lines+markers+text",
+            text=evo_merged["Atendimentos"].astype(int),
+            textposition="top center",
+            line=dict(color=COR_SAC, width=3),
+            marker=dict(size=8),
+            fill="tozeroy",
+            fillcolor="rgba(37,99,235,0.07)",
+            hovertemplate=f"{usuario}<br>Semana: %{{x|%d/%m}}<br>Atend.: %{{y}}<extra></extra>",
+        ))
+    fig_evo.update_xaxes(tickformat="%d/%m", gridcolor="#e2e8f0")
+    fig_evo.update_yaxes(gridcolor="#e2e8f0")
+    fig_evo.update_layout(**_CHART_LAYOUT)
+    st.plotly_chart(fig_evo, use_container_width=True)
+
+
+@span("grafico.portais")
+def _grafico_portais(cub, chave: tuple):
+    """Participação de cada portal."""
+    _secao("🗺️ Distribuição por Portal", "Participação de cada marketplace no total de atendimentos")
+    portais = _do_time("portais", chave, cub)
+    portais["Pct"] = (portais["Qtd"] / portais["Qtd"].sum() * 100).round(1)
+    portais["Label"] = portais.apply(lambda r: f"{r['Qtd']}  ({r['Pct']}%)", axis=1)
+    portais = portais.sort_values("Qtd")  # crescente → maior fica no topo do eixo Y
+    altura_portais = max(320, len(portais) * 42)
+    fig4 = px.bar(
+        portais, x="Qtd", y="Portal", orientation="h",
+        text="Label",
+        color="Qtd",
+        color_continuous_scale=["#bfdbfe", COR_SAC],
+    )
+    fig4.update_traces(textposition="outside", textfont_size=13)
+    fig4.update_layout(
+        height=altura_portais,
+        xaxis=dict(visible=False),
+        yaxis=dict(tickfont=dict(size=13), gridcolor="#e2e8f0"),
+        coloraxis_showscale=False,
+        **_CHART_LAYOUT,
+    )
+    st.plotly_chart(fig4, use_container_width=True)
+
+
+@span("grafico.motivos")
+def _grafico_motivos(cub, chave: tuple):
+    """Top motivos CRM, no total e por setor."""
+    _secao("📂 Top Motivos CRM")
+    crm = _do_time("crm", chave, cub)
+    if not crm.empty:
+        fig5 = px.bar(
+            crm, x="Qtd", y="Motivo", orientation="h", text="Qtd",
+            color="Qtd",
+            color_continuous_scale=["#fde68a", "#f59e0b"],
+        )
+        fig5.update_traces(textposition="outside")
+        fig5.update_layout(
+            height=max(380, len(crm) * 38),
+            yaxis={"categoryorder": "total ascending"},
+            coloraxis_showscale=False,
+            **_CHART_LAYOUT,
+        )
+        st.plotly_chart(fig5, use_container_width=True)
+    else:
+        st.info("Sem dados de CRM no período.")
 
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df_dados.to_excel(writer, sheet_name="Dados", index=False)
+    _secao("📊 Top Motivos CRM por Setor")
+    mot_set = _do_time("motivos_setor", chave, cub)
+    if not mot_set.empty:
+        fig7 = px.bar(
+            mot_set, x="Motivo_CRM", y="Qtd", color="Setor", barmode="stack",
+            color_discrete_map={"Pendência": COR_PEND, "SAC": COR_SAC},
+            text="Qtd",
+        )
+        fig7.update_traces(textposition="inside")
+        fig7.update_xaxes(tickangle=-28, gridcolor="#e2e8f0")
+        fig7.update_yaxes(gridcolor="#e2e8f0")
+        fig7.update_layout(**_CHART_LAYOUT)
+        st.plotly_chart(fig7, use_container_width=True)
 
-        total    = len(df_dados)
-        sac      = len(df_dados[df_dados["Setor"] == "SAC"]) if "Setor" in df_dados else 0
-        pend     = len(df_dados[df_dados["Setor"] == "Pendência"]) if "Setor" in df_dados else 0
-        taxa     = f"{sac / total * 100:.1f}%" if total else "0%"
-        top_port = df_dados["Portal"].mode()[0] if "Portal" in df_dados and not df_dados.empty else "-"
 
-        resumo = pd.DataFrame({
-            "Métrica": ["Total de Atendimentos", "SAC", "Pendências", "Taxa SAC/Total", "Portal Mais Ativo"],
-            "Valor":   [total, sac, pend, taxa, top_port],
-        })
-        resumo.to_excel(writer, sheet_name="Resumo", index=False)
+@span("grafico.horas")
+def _grafico_horas(cub, chave: tuple):
+    """Distribuição por hora dentro de cada setor."""
+    _secao("⏰ Picos de Demanda por Hora")
+    heat = _do_time("horas", chave, cub)
+    fig2 = px.line(
+        heat, x="Hora_Int", y="Pct", color="Setor", markers=True,
+        labels={"Hora_Int": "Hora", "Pct": "% do setor"},
+        color_discrete_map={"Pendência": COR_PEND, "SAC": COR_SAC},
+    )
+    fig2.update_traces(line=dict(width=2.5))
+    fig2.update_layout(
+        xaxis=dict(tickmode="linear", dtick=1, gridcolor="#e2e8f0"),
+        yaxis=dict(ticksuffix="%", gridcolor="#e2e8f0"),
+        **_CHART_LAYOUT,
+    )
+    st.plotly_chart(fig2, use_container_width=True)
 
-        if "Colaborador" in df_dados and "Setor" in df_dados:
-            pivot = df_dados.pivot_table(
-                index="Colaborador", columns="Setor", aggfunc="size", fill_value=0
-            ).reset_index()
-            pivot["Total"] = pivot.select_dtypes("number").sum(axis=1)
-            pivot.to_excel(writer, sheet_name="Por Colaborador", index=False)
 
-    return buffer.getvalue()
+@st.fragment
+def _abas_graficos(cub, chave: tuple, usuario: str):
+    """Gráficos em abas: só a aba aberta calcula e envia sua figura.
+
+    Trocar de aba reexecuta apenas este fragmento, não a página inteira.
+    """
+    aba_tend, aba_evo, aba_port, aba_crm, aba_hora = st.tabs(
+        ["📈 Tendência", "📆 Sua Evolução", "🗺️ Portais", "📂 Motivos CRM", "⏰ Horários"],
+        key="abas_dashboard", on_change="rerun",
+    )
+    if aba_tend.open:
+        with aba_tend:
+            _grafico_tendencia(cub, chave)
+    if aba_evo.open:
+        with aba_evo:
+            _grafico_evolucao(cub, chave, usuario)
+    if aba_port.open:
+        with aba_port:
+            _grafico_portais(cub, chave)
+    if aba_crm.open:
+        with aba_crm:
+            _grafico_motivos(cub, chave)
+    if aba_hora.open:
+        with aba_hora:
+            _grafico_horas(cub, chave)
+
+
+def _primeira_pagina():
+    st.session_state["explorador_pagina"] = 1
+
+
+@st.fragment
+def _explorador_registros(snap):
+    """Registros de toda a base, paginados, montados só com o expander aberto.
+
+    Filtros, busca e página vão aos índices da base (``snap.explorar``): cada
+    clique copia só as linhas da página, sem ordenar nem enviar a base inteira.
+    """
+    exp = st.expander("📋 Registros · explorar toda a base", key="exp_registros", on_change="rerun")
+    if not exp.open:
+        return
+    with exp:
+        valores = snap.valores_filtro()
+        filtros = {
+            col: coluna.multiselect(col, valores.get(col, []), key=f"explorador_{col}", on_change=_primeira_pagina)
+            for col, coluna in zip(FILTROS, st.columns(len(FILTROS)))
+        }
+        c_busca, c_tamanho = st.columns([3, 1])
+        busca = c_busca.text_input("Pedido ou NF contém", key="explorador_busca", on_change=_primeira_pagina)
+        tamanho = c_tamanho.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1,
+                                      key="explorador_tamanho", on_change=_primeira_pagina)
+
+        pagina = st.session_state.get("explorador_pagina", 1)
+        with span("dashboard.explorar"):
+            linhas, total = snap.explorar(filtros, busca, (pagina - 1) * tamanho, tamanho)
+            paginas = max(1, -(-total // tamanho))
+            if pagina > paginas:  # a base ou o filtro encolheram
+                pagina = paginas
+                linhas, total = snap.explorar(filtros, busca, (pagina - 1) * tamanho, tamanho)
+        st.session_state["explorador_pagina"] = pagina
+
+        c_info, c_pagina = st.columns([3, 1])
+        c_pagina.number_input("Página", min_value=1, max_value=paginas, step=1, key="explorador_pagina")
+        c_info.caption(f"{total} registro(s) · página {pagina} de {paginas} · mais recentes primeiro")
+        st.dataframe(linhas, use_container_width=True, hide_index=True)
 
 
 # ── Página principal ──────────────────────────────────────────────────────────
@@ -99,53 +300,45 @@ def pagina_dashboard():
         unsafe_allow_html=True,
     )
 
-    df_raw = carregar_dados_dashboard()
-    if df_raw.empty:
+    # Período já escolhido nesta sessão: só as abas mensais que o tocam precisam estar lidas
+    snap   = carregar_base(st.session_state.get("dash_ini"), st.session_state.get("dash_fim"))
+    versao = snap.versao  # lida antes do cubo: a sincronização troca o cubo e depois a versão
+    cubo   = snap.cubo.df
+    if not snap.linhas or cubo.empty:
         st.warning("⚠️ Planilha vazia ou sem conexão com o Google Sheets.")
         return
 
-    df_raw["Data_Filtro"] = pd.to_datetime(df_raw["Data"], format="%d/%m/%Y", errors="coerce")
-    total_na_base = len(df_raw)
+    total_na_base = snap.linhas
 
     # ── Filtros na sidebar ────────────────────────────────────────────────────
     st.sidebar.markdown("---")
     st.sidebar.markdown("**🔍 Filtros do painel**")
 
-    d_min = df_raw["Data_Filtro"].min().date() if not df_raw["Data_Filtro"].isnull().all() else datetime.today().date()
-    d_max = df_raw["Data_Filtro"].max().date() if not df_raw["Data_Filtro"].isnull().all() else datetime.today().date()
+    d_min = cubo["Data_Filtro"].min().date() if not cubo["Data_Filtro"].isnull().all() else datetime.today().date()
+    d_max = cubo["Data_Filtro"].max().date() if not cubo["Data_Filtro"].isnull().all() else datetime.today().date()
 
     c1, c2 = st.sidebar.columns(2)
-    ini = c1.date_input("Início", d_min, format="DD/MM/YYYY")
-    fim = c2.date_input("Fim",    d_max, format="DD/MM/YYYY")
+    ini = c1.date_input("Início", d_min, format="DD/MM/YYYY", key="dash_ini")
+    fim = c2.date_input("Fim",    d_max, format="DD/MM/YYYY", key="dash_fim")
 
-    setores  = sorted(df_raw["Setor"].dropna().unique().tolist())
+    setores  = sorted(cubo["Setor"].dropna().unique().tolist())
     f_setor  = st.sidebar.multiselect("Setor:", options=setores, default=setores)
     if not f_setor:
         f_setor = setores
 
-    mask = (
-        (df_raw["Data_Filtro"].dt.date >= ini)
-        & (df_raw["Data_Filtro"].dt.date <= fim)
-        & (df_raw["Setor"].isin(f_setor))
-    )
-    df = df_raw.loc[mask].copy()
-
-    if df.empty:
+    with span("dashboard.filtrar"):
+        cub = rollup.filtrar(cubo, ini, fim, f_setor)
+    chave = (versao, ini, fim, tuple(f_setor))  # identifica a visão nos caches
+    if cub.empty:
         st.warning("Nenhum dado para o período/filtro selecionado.")
         return
 
     # Nota de transparência
-    st.sidebar.caption(f"📦 {total_na_base} registros na base · {len(df)} exibidos")
-
-    # Coluna de hora (necessária para cálculos de velocidade)
-    df["Hora_Int"] = pd.to_datetime(df["Hora"], format="%H:%M:%S", errors="coerce").dt.hour
+    st.sidebar.caption(f"📦 {total_na_base} registros na base · {int(cub['Qtd'].sum())} exibidos")
 
     # ── KPIs ──────────────────────────────────────────────────────────────────
-    total      = len(df)
-    sac        = len(df[df["Setor"] == "SAC"])
-    pend       = len(df[df["Setor"] == "Pendência"])
-    taxa_sac   = f"{sac / total * 100:.1f}%" if total else "0%"
-    top_portal = df["Portal"].mode()[0] if "Portal" in df and not df.empty else "-"
+    k = _do_time("kpis", chave, cub)
+    total, sac, pend, taxa_sac, top_portal = k["total"], k["sac"], k["pend"], k["taxa_sac"], k["top_portal"]
 
     k1, k2, k3, k4, k5 = st.columns(5)
     with k1:
@@ -169,12 +362,7 @@ def pagina_dashboard():
     _secao("⭐ Seu Desempenho", "Seus números em contexto — período selecionado")
 
     # Atendimentos/dia por colaborador
-    atend_por_dia = (
-        df.groupby("Colaborador")
-        .agg(total_atend=("Colaborador", "count"),
-             dias=("Data_Filtro", lambda x: x.dt.date.nunique()))
-        .assign(taxa=lambda t: t["total_atend"] / t["dias"].clip(lower=1))
-    )
+    atend_por_dia  = _do_time("por_colaborador", chave, cub)
     media_time     = atend_por_dia["total_atend"].mean() if not atend_por_dia.empty else 0
     taxa_media_dia = atend_por_dia["taxa"].mean() if not atend_por_dia.empty else 0
 
@@ -185,10 +373,8 @@ def pagina_dashboard():
     hoje       = datetime.today().date()
     ini_sem    = hoje - timedelta(days=hoje.weekday())
     ini_sem_ant= ini_sem - timedelta(days=7)
-    df_sem_at  = df[df["Data_Filtro"].dt.date >= ini_sem]
-    df_sem_ant = df[(df["Data_Filtro"].dt.date >= ini_sem_ant) & (df["Data_Filtro"].dt.date < ini_sem)]
-    minha_sem_at  = int((df_sem_at["Colaborador"] == usuario_logado).sum()) if usuario_logado else 0
-    minha_sem_ant = int((df_sem_ant["Colaborador"] == usuario_logado).sum()) if usuario_logado else 0
+    minha_sem_at  = rollup.total_colaborador(cub, usuario_logado, ini_sem) if usuario_logado else 0
+    minha_sem_ant = rollup.total_colaborador(cub, usuario_logado, ini_sem_ant, ini_sem) if usuario_logado else 0
 
     delta_semana  = minha_sem_at - minha_sem_ant
     sinal_sem     = ("▲ +" if delta_semana > 0 else ("▼ " if delta_semana < 0 else "= ")) + str(abs(delta_semana)) + " vs sem. passada"
@@ -227,187 +413,28 @@ def pagina_dashboard():
 
     st.markdown("<div style='margin-top:2rem'></div>", unsafe_allow_html=True)
 
-    # ── Gráfico 1: Tendência diária ───────────────────────────────────────────
-    _secao("📈 Tendência Diária", "Volume total de atendimentos por dia")
-    trend = df.groupby("Data_Filtro").size().reset_index(name="Atendimentos")
-    fig1  = px.area(
-        trend, x="Data_Filtro", y="Atendimentos",
-        markers=True, line_shape="spline", text="Atendimentos",
-        color_discrete_sequence=[COR_SAC],
-    )
-    fig1.update_traces(
-        textposition="top center",
-        fillcolor="rgba(37,99,235,0.12)",
-        line=dict(width=2.5),
-    )
-    fig1.update_xaxes(tickformat="%d/%m", dtick="D1", gridcolor="#e2e8f0")
-    fig1.update_yaxes(gridcolor="#e2e8f0")
-    fig1.update_layout(**_CHART_LAYOUT)
-    st.plotly_chart(fig1, use_container_width=True)
-
-    # ── Evolução semanal: você vs média do time ───────────────────────────────
-    _secao("📆 Sua Evolução Semanal", "Seus atendimentos por semana comparado à média do time")
-    df["Semana"] = df["Data_Filtro"].dt.to_period("W").dt.start_time
-
-    # Média semanal do time
-    evo_time = (
-        df.groupby(["Semana", "Colaborador"]).size()
-        .reset_index(name="Atendimentos")
-        .groupby("Semana")["Atendimentos"].mean()
-        .reset_index()
-        .rename(columns={"Atendimentos": "Media_Time"})
-    )
-
-    # Linha do usuário logado
-    if usuario_logado:
-        evo_user = (
-            df[df["Colaborador"] == usuario_logado]
-            .groupby("Semana").size()
-            .reset_index(name="Atendimentos")
-        )
-    else:
-        evo_user = pd.DataFrame(columns=["Semana", "Atendimentos"])
-
-    evo_merged = pd.merge(evo_time, evo_user, on="Semana", how="left").fillna(0)
-
-    fig_evo = go.Figure()
-    fig_evo.add_trace(go.Scatter(
-        x=evo_merged["Semana"], y=evo_merged["Media_Time"].round(1),
-        name="Média do time", mode="lines+markers",
-        line=dict(color=COR_NEUTRO, width=2, dash="dot"),
-        marker=dict(size=6),
-        hovertemplate="Média do time<br>Semana: %{x|%d/%m}<br>Atend.: %{y:.1f}<extra></extra>",
-    ))
-    if usuario_logado:
-        fig_evo.add_trace(go.Scatter(
-            x=evo_merged["Semana"], y=evo_merged["Atendimentos"],
-            name=usuario_logado, mode="lines+markers+text",
-            text=evo_merged["Atendimentos"].astype(int),
-            textposition="top center",
-            line=dict(color=COR_SAC, width=3),
-            marker=dict(size=8),
-            fill="tozeroy",
-            fillcolor="rgba(37,99,235,0.07)",
-            hovertemplate=f"{usuario_logado}<br>Semana: %{{x|%d/%m}}<br>Atend.: %{{y}}<extra></extra>",
-        ))
-    fig_evo.update_xaxes(tickformat="%d/%m", gridcolor="#e2e8f0")
-    fig_evo.update_yaxes(gridcolor="#e2e8f0")
-    fig_evo.update_layout(**_CHART_LAYOUT)
-    st.plotly_chart(fig_evo, use_container_width=True)
-
-    # ── Distribuição por Portal ───────────────────────────────────────────────
-    _secao("🗺️ Distribuição por Portal", "Participação de cada marketplace no total de atendimentos")
-    portais = df["Portal"].value_counts().reset_index()
-    portais.columns = ["Portal", "Qtd"]
-    portais["Pct"] = (portais["Qtd"] / portais["Qtd"].sum() * 100).round(1)
-    portais["Label"] = portais.apply(lambda r: f"{r['Qtd']}  ({r['Pct']}%)", axis=1)
-    portais = portais.sort_values("Qtd")  # crescente → maior fica no topo do eixo Y
-    altura_portais = max(320, len(portais) * 42)
-    fig4 = px.bar(
-        portais, x="Qtd", y="Portal", orientation="h",
-        text="Label",
-        color="Qtd",
-        color_continuous_scale=["#bfdbfe", COR_SAC],
-    )
-    fig4.update_traces(textposition="outside", textfont_size=13)
-    fig4.update_layout(
-        height=altura_portais,
-        xaxis=dict(visible=False),
-        yaxis=dict(tickfont=dict(size=13), gridcolor="#e2e8f0"),
-        coloraxis_showscale=False,
-        **_CHART_LAYOUT,
-    )
-    st.plotly_chart(fig4, use_container_width=True)
-
-    # ── Gráficos lado a lado 2 ────────────────────────────────────────────────
-    col_c, col_d = st.columns(2)
-
-    with col_c:
-        _secao("📂 Top Motivos CRM")
-        df_crm = df[df["Motivo_CRM"].notna() & (df["Motivo_CRM"] != "-")]
-        if not df_crm.empty:
-            crm = df_crm["Motivo_CRM"].value_counts().head(12).reset_index()
-            crm.columns = ["Motivo", "Qtd"]
-            fig5 = px.bar(
-                crm, x="Qtd", y="Motivo", orientation="h", text="Qtd",
-                color="Qtd",
-                color_continuous_scale=["#fde68a", "#f59e0b"],
-            )
-            fig5.update_traces(textposition="outside")
-            fig5.update_layout(
-                height=max(380, len(crm) * 38),
-                yaxis={"categoryorder": "total ascending"},
-                coloraxis_showscale=False,
-                **_CHART_LAYOUT,
-            )
-            st.plotly_chart(fig5, use_container_width=True)
-        else:
-            st.info("Sem dados de CRM no período.")
-
-    with col_d:
-        _secao("⏰ Picos de Demanda por Hora")
-        total_sec = df.groupby("Setor").size().reset_index(name="Total_Setor")
-        heat      = df.groupby(["Hora_Int", "Setor"]).size().reset_index(name="Atendimentos")
-        heat      = pd.merge(heat, total_sec, on="Setor")
-        heat["Pct"] = (heat["Atendimentos"] / heat["Total_Setor"]) * 100
-        fig2 = px.line(
-            heat, x="Hora_Int", y="Pct", color="Setor", markers=True,
-            labels={"Hora_Int": "Hora", "Pct": "% do setor"},
-            color_discrete_map={"Pendência": COR_PEND, "SAC": COR_SAC},
-        )
-        fig2.update_traces(line=dict(width=2.5))
-        fig2.update_layout(
-            xaxis=dict(tickmode="linear", dtick=1, gridcolor="#e2e8f0"),
-            yaxis=dict(ticksuffix="%", gridcolor="#e2e8f0"),
-            **_CHART_LAYOUT,
-        )
-        st.plotly_chart(fig2, use_container_width=True)
-
-    # ── Motivos por setor ─────────────────────────────────────────────────────
-    _secao("📊 Top Motivos CRM por Setor")
-    df_mot = df[df["Motivo_CRM"].notna() & (df["Motivo_CRM"] != "-")]
-    if not df_mot.empty:
-        top10   = df_mot["Motivo_CRM"].value_counts().head(10).index.tolist()
-        mot_set = df_mot[df_mot["Motivo_CRM"].isin(top10)].groupby(["Motivo_CRM", "Setor"]).size().reset_index(name="Qtd")
-        fig7 = px.bar(
-            mot_set, x="Motivo_CRM", y="Qtd", color="Setor", barmode="stack",
-            color_discrete_map={"Pendência": COR_PEND, "SAC": COR_SAC},
-            text="Qtd",
-        )
-        fig7.update_traces(textposition="inside")
-        fig7.update_xaxes(tickangle=-28, gridcolor="#e2e8f0")
-        fig7.update_yaxes(gridcolor="#e2e8f0")
-        fig7.update_layout(**_CHART_LAYOUT)
-        st.plotly_chart(fig7, use_container_width=True)
+    _abas_graficos(cub, chave, usuario_logado)
 
     # ── Exportação ────────────────────────────────────────────────────────────
     _secao("📥 Exportação de Dados")
-    df_export = df.drop(columns=["Data_Filtro", "Hora_Int"], errors="ignore").copy()
-    csv = df_export.to_csv(index=False, sep=";", encoding="utf-8-sig").encode("utf-8-sig")
 
+    def fatiar():
+        # Linhas brutas do período: só a exportação precisa delas, e só no clique
+        with span("dashboard.fatiar"):
+            return snap.fatiar(ini, fim, f_setor)
+
+    # Gerados só no clique, numa thread de exportação, e reaproveitados por versão/filtro
     col_e1, col_e2, col_e3 = st.columns([1, 1, 2])
     col_e1.download_button(
-        "⬇️ CSV", data=csv,
+        "⬇️ CSV", data=csv_sob_demanda(fatiar, chave),
         file_name="relatorio_engage.csv", mime="text/csv",
-        use_container_width=True,
+        on_click="ignore", use_container_width=True,
+    )
+    col_e2.download_button(
+        "📊 Excel (3 abas)", data=excel_sob_demanda(fatiar, chave),
+        file_name="relatorio_engage.xlsx", mime=MIME_EXCEL,
+        on_click="ignore", use_container_width=True,
     )
-    try:
-        excel = _exportar_excel(df)
-        col_e2.download_button(
-            "📊 Excel (3 abas)", data=excel,
-            file_name="relatorio_engage.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True,
-        )
-    except Exception as e:
-        col_e2.warning(f"Excel: {e}")
 
     # ── Tabela ────────────────────────────────────────────────────────────────
-    _secao("📋 Registros Recentes", "Últimos 100 atendimentos registrados")
-    df_display = df.sort_values(by=["Data_Filtro", "Hora"], ascending=False).head(100)
-    st.data_editor(
-        df_display.drop(columns=["Data_Filtro", "Hora_Int"], errors="ignore"),
-        use_container_width=True,
-        hide_index=True,
-        disabled=True,
-    )
+    _explorador_registros(snap)
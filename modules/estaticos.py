@@ -0,0 +1,28 @@
+import os
+
+import streamlit as st
+
+from modules.metricas import cache_contado
+
+
+RAIZ = os.path.dirname(os.path.dirname(__file__))
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def carregar_estatico(nome: str) -> bytes | None:
+    """Conteúdo de um arquivo da raiz do app (``style.css``, ``logo.png``), lido uma vez por processo.
+
+    None se o arquivo não existir. Os bytes são compartilhados entre sessões.
+    """
+    caminho = os.path.join(RAIZ, nome)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def aplicar_estilo():
+    """Injeta o ``style.css`` (a cada rerun, mas sem voltar ao disco)."""
+    css = carregar_estatico("style.css")
+    if css is not None:
+        st.markdown(f"<style>{css.decode('utf-8')}</style>", unsafe_allow_html=True)
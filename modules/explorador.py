@@ -0,0 +1,196 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from modules.indice_pedidos import CAMPOS_BUSCA, normalizar_coluna
+from modules.metricas import span
+
+FILTROS = ("Colaborador", "Portal", "Transportadora", "Motivo")
+TAMANHO_NGRAMA = 3    # termos menores que isso são buscados por prefixo
+LARGURA_CHAVE = 32    # caracteres de pedido/NF que entram no índice de busca
+_CONSULTAS_GUARDADAS = 32
+
+
+def normalizar_busca(texto) -> str:
+    """Termo de busca no mesmo formato das chaves indexadas (maiúsculo, sem espaços nas pontas)."""
+    return str(texto or "").strip().upper()[:LARGURA_CHAVE]
+
+
+class _Postagens:
+    """Listas invertidas num vetor só: os ``ids`` de cada chave ficam contíguos.
+
+    ``chaves`` sai ordenado; a lista da chave ``chaves[k]`` é
+    ``ids[inicio[k]:inicio[k + 1]]``, na ordem em que os ids chegaram (com
+    ``estavel``; sem ele a ordem dentro da lista é qualquer uma).
+    """
+
+    def __init__(self, chaves: np.ndarray, ids: np.ndarray, estavel: bool = True):
+        ordem = np.argsort(chaves, kind="stable" if estavel else None)
+        ordenadas = chaves[ordem]
+        cortes = np.flatnonzero(ordenadas[1:] != ordenadas[:-1]) + 1
+        self.chaves = ordenadas[np.concatenate([[0], cortes])] if len(ordenadas) else ordenadas
+        self.inicio = np.concatenate([[0], cortes, [len(ordenadas)]]).astype(np.int64)
+        self.ids = ids[ordem]
+
+    def grupos(self, posicoes: np.ndarray) -> np.ndarray:
+        """Ids das chaves nas ``posicoes`` de ``chaves``, concatenados sem laço Python."""
+        inicios, fins = self.inicio[posicoes], self.inicio[np.asarray(posicoes) + 1]
+        tamanhos = fins - inicios
+        deslocamento = np.repeat(inicios - (np.cumsum(tamanhos) - tamanhos), tamanhos)
+        return self.ids[np.arange(int(tamanhos.sum())) + deslocamento]
+
+    def de(self, chaves) -> np.ndarray:
+        chaves = np.asarray(chaves)
+        posicoes = np.searchsorted(self.chaves, chaves)
+        achadas = posicoes < len(self.chaves)
+        achadas[achadas] = self.chaves[posicoes[achadas]] == chaves[achadas]
+        return self.grupos(posicoes[achadas])
+
+
+class IndiceExplorador:
+    """Ordem de recência e índices invertidos de uma versão da base.
+
+    ``df`` vem ordenado por data e hora (datas inválidas no fim), então a ordem
+    do mais recente ao mais antigo sai daqui sem ordenar nada. Cada linha passa
+    a ser identificada pelo seu posto nessa ordem (0 = a mais recente) e os
+    índices guardam listas de postos crescentes: uma página é um recorte e
+    combinar filtros é interseção de listas ordenadas.
+
+    Os filtros usam os códigos das categorias. A busca em pedido/NF usa
+    trigramas das chaves distintas, montados na primeira busca; termos com
+    menos de ``TAMANHO_NGRAMA`` caracteres vão por prefixo, com busca binária
+    sobre as chaves ordenadas.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        n = len(df)
+        validas = int(df["Data_Filtro"].notna().sum()) if "Data_Filtro" in df else n
+        self.ordem = np.concatenate([np.arange(validas - 1, -1, -1), np.arange(validas, n)])  # posto → posição
+        self.valores: dict[str, list[str]] = {}
+        self._filtros: dict[str, tuple[pd.Index, _Postagens]] = {}
+        postos = np.arange(n, dtype=np.int32)
+        for col in FILTROS:
+            if col not in df:
+                continue
+            serie = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype("category")
+            codigos = serie.cat.codes.to_numpy()[self.ordem]
+            postagens = _Postagens(codigos, postos)
+            usados = postagens.chaves[postagens.chaves >= 0]
+            self.valores[col] = sorted(map(str, serie.cat.categories[usados]))
+            self._filtros[col] = (serie.cat.categories, postagens)
+        self._busca: tuple[np.ndarray, _Postagens, _Postagens] | None = None
+        self._lock = threading.Lock()            # montagem da busca
+        self._lock_consultas = threading.Lock()  # separado: a montagem demora
+        self._consultas: OrderedDict = OrderedDict()
+
+    # ── Busca em pedido/NF ───────────────────────────────────────────────────
+
+    def _montar_busca(self) -> tuple[np.ndarray, _Postagens, _Postagens]:
+        chaves, postos = [], []
+        for campo in CAMPOS_BUSCA:
+            if campo in self.df:
+                coluna = normalizar_coluna(self.df[campo].iloc[self.ordem]).str[:LARGURA_CHAVE]
+                presentes = coluna.notna().to_numpy()
+                chaves.append(coluna[presentes])
+                postos.append(np.flatnonzero(presentes).astype(np.int32))
+        chaves = pd.concat(chaves, ignore_index=True) if chaves else pd.Series([], dtype="string")
+        codigos, distintas = chaves.factorize()
+        distintas = distintas.to_numpy(dtype=str)
+        ordem = np.argsort(distintas)
+        distintas = distintas[ordem]
+        lugar = np.empty_like(ordem)
+        lugar[ordem] = np.arange(len(ordem))
+        linhas = _Postagens(lugar[codigos], np.concatenate(postos) if postos else codigos, estavel=False)
+
+        # Trigramas como inteiros: três pontos de código de 21 bits num uint64
+        largura = distintas.dtype.itemsize // 4
+        pontos = distintas.view(np.uint32).reshape(len(distintas), largura).T.copy()
+        gramas, donos = [], []
+        for j in range(largura - TAMANHO_NGRAMA + 1):
+            presentes = np.flatnonzero(pontos[j + TAMANHO_NGRAMA - 1])  # chave comprida o bastante
+            codigo = np.zeros(len(presentes), dtype=np.uint64)
+            for k in range(TAMANHO_NGRAMA):
+                codigo <<= np.uint64(21)
+                codigo |= pontos[j + k, presentes]
+            gramas.append(codigo)
+            donos.append(presentes.astype(np.int32))
+        gramas = np.concatenate(gramas) if gramas else np.array([], dtype=np.uint64)
+        donos = np.concatenate(donos) if donos else np.array([], dtype=np.int32)
+        return distintas, linhas, _Postagens(gramas, donos, estavel=False)
+
+    @property
+    def busca_montada(self) -> bool:
+        return self._busca is not None
+
+    def indice_busca(self) -> tuple[np.ndarray, _Postagens, _Postagens]:
+        """Chaves distintas ordenadas, chave → postos e trigrama → chaves (montados na primeira chamada)."""
+        with self._lock:
+            if self._busca is None:
+                with span("explorador.indexar_busca"):
+                    self._busca = self._montar_busca()
+            return self._busca
+
+    @staticmethod
+    def _trigramas(termo: str) -> np.ndarray:
+        pontos = np.frombuffer(termo.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        codigo = np.zeros(len(pontos) - TAMANHO_NGRAMA + 1, dtype=np.uint64)
+        for k in range(TAMANHO_NGRAMA):
+            codigo = (codigo << np.uint64(21)) | pontos[k:len(pontos) - TAMANHO_NGRAMA + 1 + k]
+        return np.unique(codigo)
+
+    def _postos_busca(self, termo: str) -> np.ndarray:
+        distintas, linhas, gramas = self.indice_busca()
+        if len(termo) < TAMANHO_NGRAMA:
+            lo, hi = np.searchsorted(distintas, [termo, termo + "\U0010ffff"])
+            achadas = np.arange(lo, hi)
+        else:
+            achadas = None
+            for grama in self._trigramas(termo):
+                donos = np.unique(gramas.de([grama]))
+                achadas = donos if achadas is None else np.intersect1d(achadas, donos, assume_unique=True)
+                if not len(achadas):
+                    break
+            # Ter todos os trigramas não garante a sequência: confere as candidatas
+            achadas = achadas[np.char.find(distintas[achadas], termo) >= 0]
+        return np.unique(linhas.grupos(achadas))
+
+    # ── Consultas ────────────────────────────────────────────────────────────
+
+    def _postos_filtro(self, col: str, valores: list[str]) -> np.ndarray:
+        categorias, postagens = self._filtros[col]
+        codigos = categorias.get_indexer(valores)
+        return np.sort(postagens.de(codigos[codigos >= 0]))  # categorias distintas não se repetem
+
+    def consultar(self, filtros: dict[str, list[str]], busca: str = "") -> np.ndarray | None:
+        """Postos (crescentes) das linhas que atendem a tudo; None quando nada foi filtrado."""
+        filtros = {col: tuple(v) for col, v in filtros.items() if v and col in self._filtros}
+        termo = normalizar_busca(busca)
+        chave = (tuple(sorted(filtros.items())), termo)
+        with self._lock_consultas:
+            if chave in self._consultas:
+                self._consultas.move_to_end(chave)
+                return self._consultas[chave]
+        with span("explorador.consultar"):
+            listas = [self._postos_filtro(col, list(v)) for col, v in filtros.items()]
+            if termo:
+                listas.append(self._postos_busca(termo))
+            postos = None
+            for lista in sorted(listas, key=len):  # a menor primeiro encurta as interseções
+                postos = lista if postos is None else np.intersect1d(postos, lista, assume_unique=True)
+        with self._lock_consultas:
+            self._consultas[chave] = postos
+            while len(self._consultas) > _CONSULTAS_GUARDADAS:
+                self._consultas.popitem(last=False)
+        return postos
+
+    def pagina(self, filtros: dict[str, list[str]], busca: str = "", inicio: int = 0,
+               quantidade: int = 50) -> tuple[pd.DataFrame, int]:
+        """Linhas ``inicio:inicio + quantidade`` do resultado, mais recentes primeiro, e o total."""
+        postos = self.consultar(filtros, busca)
+        total = len(self.ordem) if postos is None else len(postos)
+        fim = min(inicio + quantidade, total)
+        fatia = np.arange(inicio, fim) if postos is None else postos[inicio:fim]
+        return self.df.iloc[self.ordem[fatia]], total
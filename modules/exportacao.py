@@ -0,0 +1,131 @@
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import pandas as pd
+import streamlit as st
+from openpyxl import Workbook
+
+from modules.ingestao import DERIVADAS
+from modules.metricas import cache_contado, span
+
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+_LOTE = 5_000       # linhas convertidas para objetos Python por vez
+_LOTE_CSV = 50_000  # linhas serializadas por vez no CSV
+
+
+def _linhas(df: pd.DataFrame):
+    """Linhas de ``df`` como tuplas, convertendo um lote de cada vez."""
+    for ini in range(0, len(df), _LOTE):
+        lote = df.iloc[ini:ini + _LOTE].astype(object)
+        yield from lote.where(lote.notna(), None).itertuples(index=False, name=None)
+
+
+@span("exportacao.excel")
+def gerar_excel(df: pd.DataFrame) -> bytes:
+    """Workbook com as abas Dados, Resumo e Por Colaborador.
+
+    Usa o modo write-only do openpyxl: as linhas vão direto para o arquivo, sem
+    criar uma célula por valor nem copiar o frame inteiro.
+    """
+    colunas = [c for c in df.columns if c not in DERIVADAS]
+    wb = Workbook(write_only=True)
+
+    dados = wb.create_sheet("Dados")
+    dados.append(colunas)
+    for linha in _linhas(df[colunas]):
+        dados.append(linha)
+
+    total = len(df)
+    sac   = int((df["Setor"] == "SAC").sum()) if "Setor" in df else 0
+    pend  = int((df["Setor"] == "Pendência").sum()) if "Setor" in df else 0
+    resumo = wb.create_sheet("Resumo")
+    resumo.append(["Métrica", "Valor"])
+    resumo.append(["Total de Atendimentos", total])
+    resumo.append(["SAC", sac])
+    resumo.append(["Pendências", pend])
+    resumo.append(["Taxa SAC/Total", f"{sac / total * 100:.1f}%" if total else "0%"])
+    resumo.append(["Portal Mais Ativo", df["Portal"].mode()[0] if "Portal" in df and total else "-"])
+
+    if "Colaborador" in df and "Setor" in df:
+        pivot = df.groupby(["Colaborador", "Setor"], observed=True).size().unstack(fill_value=0)
+        pivot["Total"] = pivot.sum(axis=1)
+        aba = wb.create_sheet("Por Colaborador")
+        aba.append(["Colaborador", *pivot.columns])
+        for colaborador, valores in zip(pivot.index, pivot.to_numpy().tolist()):
+            aba.append([colaborador, *valores])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@span("exportacao.csv")
+def gerar_csv(df: pd.DataFrame) -> bytes:
+    """CSV (``;``, UTF-8 com BOM para o Excel) serializado em blocos de linhas."""
+    colunas = [c for c in df.columns if c not in DERIVADAS]
+    buffer = io.BytesIO()
+    buffer.write(";".join(colunas).encode("utf-8-sig") + b"\n")
+    for ini in range(0, len(df), _LOTE_CSV):
+        bloco = df.iloc[ini:ini + _LOTE_CSV][colunas]
+        buffer.write(bloco.to_csv(index=False, header=False, sep=";").encode("utf-8"))
+    return buffer.getvalue()
+
+
+class Exportador:
+    """Gera exportações numa thread própria e guarda as mais recentes.
+
+    A chave identifica a visão exportada (formato, versão do snapshot, período e
+    setores): cliques repetidos — de qualquer sessão — reaproveitam o arquivo
+    pronto, e pedidos simultâneos da mesma chave esperam o mesmo trabalho.
+    """
+
+    def __init__(self, max_itens: int = 8, workers: int = 1):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exportacao")
+        self._itens: OrderedDict[tuple, Future] = OrderedDict()
+        self._max_itens = max_itens
+        self._lock = threading.Lock()
+
+    def pedir(self, chave: tuple, gerar: Callable[[], bytes]) -> Future:
+        with self._lock:
+            futuro = self._itens.get(chave)
+            falhou = futuro is not None and futuro.done() and futuro.exception() is not None
+            if futuro is None or falhou:
+                futuro = self._executor.submit(gerar)
+                self._itens[chave] = futuro
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self._max_itens:
+                self._itens.popitem(last=False)
+            return futuro
+
+    def obter(self, chave: tuple, gerar: Callable[[], bytes]) -> bytes:
+        return self.pedir(chave, gerar).result()
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def _exportador() -> Exportador:
+    """Exportador único do processo, compartilhado por todas as sessões."""
+    return Exportador()
+
+
+def _sob_demanda(formato: str, gerar: Callable[[pd.DataFrame], bytes],
+                 fatiar: Callable[[], pd.DataFrame], chave: tuple):
+    return lambda: _exportador().obter((formato, *chave), lambda: gerar(fatiar()))
+
+
+def excel_sob_demanda(fatiar: Callable[[], pd.DataFrame], chave: tuple) -> Callable[[], bytes]:
+    """Callable para ``st.download_button(data=...)``.
+
+    O Streamlit só o chama no clique, fora da thread do script; até lá nem as
+    linhas são separadas: ``fatiar`` devolve o frame a exportar e só roda quando
+    o arquivo da ``chave`` ainda não está pronto. ``chave`` deve mudar sempre que
+    o resultado de ``fatiar`` mudar.
+    """
+    return _sob_demanda("xlsx", gerar_excel, fatiar, chave)
+
+
+def csv_sob_demanda(fatiar: Callable[[], pd.DataFrame], chave: tuple) -> Callable[[], bytes]:
+    """Como ``excel_sob_demanda``, para o CSV."""
+    return _sob_demanda("csv", gerar_csv, fatiar, chave)
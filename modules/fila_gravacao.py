@@ -0,0 +1,172 @@
+import threading
+import time
+import uuid
+from typing import Callable
+
+from modules.idempotencia import IndiceIdempotencia
+from modules.journal import Journal
+from modules.metricas import METRICAS
+
+PENDENTE = "pendente"
+GRAVADO  = "gravado"
+
+
+class SemConexao(Exception):
+    """Levantada por ``gravar_lote`` quando nada chegou a ser enviado."""
+
+
+class FilaGravacao:
+    """Fila write-behind compartilhada pelo processo, apoiada no journal local.
+
+    ``enfileirar`` só grava a linha no journal (fsync local) e retorna. Um worker
+    drena o journal para a planilha com uma única chamada ``gravar_lote`` por lote,
+    disparada quando há ``tamanho_lote`` linhas ou quando a mais antiga espera
+    ``janela`` segundos. Em caso de falha as linhas continuam no journal e são
+    reenviadas quando a conexão volta.
+
+    ``conferir_lote`` recebe as linhas de um envio incerto e devolve os índices das
+    que já estão na planilha — é o que garante que nada é gravado duas vezes.
+    Com ``indice``, ``enfileirar`` recusa (``RegistroDuplicado``) uma chave já
+    anotada dentro da janela, venha de que sessão vier. Com ``retencao``, os
+    registros confirmados há mais que isso (em segundos) saem do journal.
+    """
+
+    def __init__(
+        self,
+        journal: Journal,
+        gravar_lote: Callable[[list[list]], None],
+        conferir_lote: Callable[[list[list]], set[int]],
+        tamanho_lote: int = 50,
+        janela: float = 2.0,
+        intervalo_replay: float = 30.0,
+        indice: IndiceIdempotencia | None = None,
+        retencao: float | None = None,
+    ):
+        self._journal          = journal
+        self._gravar_lote      = gravar_lote
+        self._conferir_lote    = conferir_lote
+        self._tamanho_lote     = tamanho_lote
+        self._janela           = janela
+        self._intervalo_replay = intervalo_replay
+        self._indice           = indice
+        self._retencao         = retencao
+        self._limpo_em         = float("-inf")
+        self._acordar = threading.Event()
+        self._novos = 0
+        self._lock = threading.Lock()
+        self.ultimo_erro: float | None = None
+        self._acordar.set()  # drena o que sobrou de execuções anteriores
+        self._worker = threading.Thread(target=self._loop, name="fila-gravacao", daemon=True)
+        self._worker.start()
+
+    # ── API pública ──────────────────────────────────────────────────────────
+
+    def enfileirar(self, linha: list, chave: str | None = None) -> str:
+        """Grava a linha no journal e retorna o ticket sem esperar a rede."""
+        if chave is None or self._indice is None:
+            ticket = str(self._journal.anotar(linha, chave))
+        else:
+            ticket = self._indice.registrar(chave, lambda: str(self._journal.anotar(linha, chave)))
+        with self._lock:
+            self._novos += 1
+        self._acordar.set()
+        return ticket
+
+    def anotada(self, chave: str) -> bool:
+        """True se o journal ainda tem um registro anotado com ``chave``."""
+        return self._journal.tem_chave(chave)
+
+    def status(self, ticket: str) -> str | None:
+        enviado = self._journal.enviado(int(ticket))
+        if enviado is None:
+            return None
+        return GRAVADO if enviado else PENDENTE
+
+    def aguardar(self, ticket: str, timeout: float | None = None) -> str | None:
+        """Espera (por polling do journal) o ticket sair de PENDENTE."""
+        limite = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        status = self.status(ticket)
+        while status == PENDENTE and time.monotonic() < limite:
+            time.sleep(0.1)
+            status = self.status(ticket)
+        return status
+
+    def tamanho(self) -> int:
+        return self._journal.total_pendente()
+
+    # ── Worker ───────────────────────────────────────────────────────────────
+
+    def _esperar_lote(self):
+        """Acumula linhas até encher o lote ou a janela expirar."""
+        limite = time.monotonic() + self._janela
+        while time.monotonic() < limite:
+            with self._lock:
+                if self._novos >= self._tamanho_lote:
+                    break
+            time.sleep(min(0.05, self._janela))
+
+    def _reconciliar_em_voo(self) -> bool:
+        """Resolve envios incertos. Retorna False se ainda não foi possível."""
+        em_voo = self._journal.em_voo()
+        if not em_voo:
+            return True
+        try:
+            presentes = self._conferir_lote([linha for _, linha in em_voo])
+        except Exception:
+            return False
+        self._journal.confirmar([i for k, (i, _) in enumerate(em_voo) if k in presentes])
+        self._journal.liberar([i for k, (i, _) in enumerate(em_voo) if k not in presentes])
+        return True
+
+    @staticmethod
+    def _medir_lote(inicio: float, resultado: str):
+        METRICAS.observar("engage_fila_lote_segundos", time.perf_counter() - inicio, resultado=resultado)
+        METRICAS.contar("engage_fila_lotes_total", resultado=resultado)
+
+    def _drenar(self) -> bool:
+        if not self._reconciliar_em_voo():
+            return False
+        while True:
+            lote = self._journal.pendentes(self._tamanho_lote)
+            if not lote:
+                return True
+            ids = [i for i, _ in lote]
+            self._journal.marcar_lote(ids, uuid.uuid4().hex)
+            inicio = time.perf_counter()
+            try:
+                self._gravar_lote([linha for _, linha in lote])
+            except SemConexao:
+                self._journal.liberar(ids)
+                self._medir_lote(inicio, "sem_conexao")
+                return False
+            except Exception:
+                # Resultado incerto: fica em voo e é conferido na próxima rodada
+                self._medir_lote(inicio, "incerto")
+                return False
+            self._journal.confirmar(ids)
+            self._medir_lote(inicio, "gravado")
+
+    def _limpar_journal(self):
+        """Apaga os confirmados fora da retenção, no máximo uma vez por ``intervalo_replay``."""
+        if self._retencao is None or time.monotonic() - self._limpo_em < self._intervalo_replay:
+            return
+        self._limpo_em = time.monotonic()
+        self._journal.limpar(time.time() - self._retencao)
+
+    def _loop(self):
+        falhas = 0
+        while True:
+            if falhas:
+                time.sleep(min(60.0, 0.5 * (2 ** falhas)))
+            elif self._acordar.wait(timeout=self._intervalo_replay):
+                self._esperar_lote()
+            self._acordar.clear()
+            with self._lock:
+                self._novos = 0
+            if self._drenar():
+                falhas, self.ultimo_erro = 0, None
+                self._limpar_journal()
+            else:
+                falhas += 1
+                self.ultimo_erro = time.time()
+                METRICAS.contar("engage_fila_retentativas_total")
@@ -0,0 +1,31 @@
+import streamlit as st
+
+from modules.registros import historico_pedido
+
+LIMITE_HISTORICO = 20  # atendimentos listados no painel
+
+
+def painel_historico(pedido: str, nota_fiscal: str):
+    """Atendimentos anteriores do pedido/NF digitados, logo abaixo dos campos.
+
+    A busca vai ao índice da base (pedido e NF), não à planilha: responde na
+    hora, mesmo com a base grande. Registros dos últimos instantes podem ainda
+    não aparecer (a base é sincronizada a cada minuto).
+    """
+    if not (pedido.strip() or nota_fiscal.strip()):
+        return
+    try:
+        anteriores = historico_pedido(pedido, nota_fiscal, LIMITE_HISTORICO)
+    except Exception:
+        st.caption("🕘 Histórico indisponível no momento.")
+        return
+    if anteriores.empty:
+        st.caption("🕘 Nenhum atendimento anterior para este pedido/NF.")
+        return
+    ultimo = anteriores.iloc[0]
+    quantidade = f"{len(anteriores)}+" if len(anteriores) >= LIMITE_HISTORICO else str(len(anteriores))
+    with st.expander(
+        f"🕘 Já atendido {quantidade} vez(es) · último em {ultimo['Data']} {ultimo['Hora'][:5]} "
+        f"por {ultimo['Colaborador']} ({ultimo['Motivo']})"
+    ):
+        st.dataframe(anteriores, hide_index=True, use_container_width=True)
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+
+class RegistroDuplicado(Exception):
+    """O mesmo registro já foi anotado dentro da janela de idempotência."""
+
+    def __init__(self, ticket: str, restante: int):
+        super().__init__(f"registro já anotado (ticket {ticket})")
+        self.ticket = ticket
+        self.restante = restante
+
+
+def chave_idempotencia(campos: Iterable) -> str:
+    """Hash curto (64 bits, hex) dos campos que identificam um registro."""
+    texto = "|".join(str(c).strip().upper() for c in campos)
+    return hashlib.blake2b(texto.encode(), digest_size=8).hexdigest()
+
+
+class IndiceIdempotencia:
+    """Chaves dos registros recentes do processo, em ordem de chegada.
+
+    Cada chave vale por ``janela`` segundos; as mais antigas saem pelo começo do
+    ``OrderedDict`` (por idade ou quando passa de ``max_itens``), então consulta e
+    inserção são O(1). ``recentes`` recarrega o índice a partir do journal depois
+    de um reinício.
+    """
+
+    def __init__(
+        self,
+        janela: float = 60.0,
+        max_itens: int = 50_000,
+        recentes: Iterable[tuple[str, str, float]] = (),
+    ):
+        self._janela = janela
+        self._max_itens = max_itens
+        self._itens: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        for chave, ticket, criado in sorted(recentes, key=lambda r: r[2]):
+            self._itens[chave] = (criado, ticket)
+            self._itens.move_to_end(chave)
+        self._expirar(time.time())
+
+    def _expirar(self, agora: float):
+        while self._itens:
+            criado, _ = next(iter(self._itens.values()))
+            if agora - criado < self._janela and len(self._itens) <= self._max_itens:
+                break
+            self._itens.popitem(last=False)
+
+    def registrar(self, chave: str, anotar: Callable[[], str]) -> str:
+        """Chama ``anotar`` e guarda o ticket, a menos que ``chave`` seja recente.
+
+        A verificação e a anotação acontecem sob o mesmo lock: duas sessões
+        enviando o mesmo registro ao mesmo tempo geram um único ticket.
+        """
+        with self._lock:
+            agora = time.time()
+            self._expirar(agora)
+            item = self._itens.get(chave)
+            if item is not None:
+                criado, ticket = item
+                raise RegistroDuplicado(ticket, max(1, int(self._janela - (agora - criado))))
+            ticket = anotar()
+            self._itens[chave] = (agora, ticket)
+            self._expirar(agora)
+            return ticket
+
+    def __len__(self) -> int:
+        return len(self._itens)
@@ -0,0 +1,83 @@
+import pandas as pd
+
+CAMPOS_BUSCA = ("Numero_Pedido", "Nota_Fiscal")
+COLUNAS_HISTORICO = ["Data", "Hora", "Setor", "Colaborador", "Motivo", "Portal", "Motivo_CRM"]
+_VAZIOS = {"", "-", "NAN", "NONE", "<NA>"}
+
+
+def normalizar_chave(valor) -> str | None:
+    """Pedido/NF como chave de busca (sem espaços nas pontas, maiúsculo); None se vazio."""
+    if valor is None:
+        return None
+    chave = str(valor).strip().upper()
+    return None if chave in _VAZIOS else chave
+
+
+def normalizar_coluna(serie: pd.Series) -> pd.Series:
+    """``normalizar_chave`` vetorizado: chaves da coluna, com ``<NA>`` nas vazias."""
+    chaves = serie.astype("string").str.strip().str.upper()
+    return chaves.where(~chaves.isin(list(_VAZIOS)))
+
+
+class IndicePedidos:
+    """Índices hash ``Numero_Pedido`` e ``Nota_Fiscal`` → rótulos das linhas.
+
+    Guarda só os rótulos do índice do frame (a posição da linha na planilha),
+    não cópias das linhas: a chave que aparece uma vez aponta direto para o
+    rótulo, a repetida para a lista deles. É mantido como o ``CuboAtendimentos``:
+    reconstruído numa recarga completa e acrescido com as linhas novas. A
+    recarga monta dicionários novos e os troca de uma vez, então quem consulta
+    de outra thread nunca vê um índice pela metade.
+    """
+
+    def __init__(self):
+        self.por_campo: dict[str, dict] = {campo: {} for campo in CAMPOS_BUSCA}
+
+    @staticmethod
+    def _agrupar(linhas: pd.DataFrame, campo: str) -> dict:
+        if campo not in linhas or linhas.empty:
+            return {}
+        chaves = normalizar_coluna(linhas[campo])
+        validas = chaves.notna().to_numpy()
+        chaves = chaves.to_numpy(dtype=object)[validas]
+        rotulos = linhas.index.to_numpy()[validas]
+        repetidas = pd.Series(chaves).duplicated(keep=False).to_numpy()
+        # Quase todo pedido aparece uma vez só: esses entram sem passar por laço Python
+        indice = dict(zip(chaves[~repetidas].tolist(), rotulos[~repetidas].tolist()))
+        for chave, rotulo in zip(chaves[repetidas].tolist(), rotulos[repetidas].tolist()):
+            indice.setdefault(chave, []).append(rotulo)
+        return indice
+
+    def reconstruir(self, linhas: pd.DataFrame):
+        self.por_campo = {campo: self._agrupar(linhas, campo) for campo in CAMPOS_BUSCA}
+
+    def incorporar(self, novas: pd.DataFrame):
+        for campo, indice in self.por_campo.items():
+            for chave, rotulos in self._agrupar(novas, campo).items():
+                if chave in indice:  # valor novo em vez de alterar a lista que alguém pode estar lendo
+                    indice[chave] = _como_lista(indice[chave]) + _como_lista(rotulos)
+                else:
+                    indice[chave] = rotulos
+
+    def rotulos(self, pedido=None, nf=None) -> list:
+        """Rótulos das linhas com o pedido ou a NF informados (sem repetição)."""
+        encontrados: dict = {}
+        for campo, valor in zip(CAMPOS_BUSCA, (pedido, nf)):
+            chave = normalizar_chave(valor)
+            if chave is not None and chave in self.por_campo[campo]:
+                encontrados.update(dict.fromkeys(_como_lista(self.por_campo[campo][chave])))
+        return list(encontrados)
+
+
+def _como_lista(valor) -> list:
+    return valor if isinstance(valor, list) else [valor]
+
+
+def mais_recentes(linhas: pd.DataFrame, limite: int) -> pd.DataFrame:
+    """As ``limite`` linhas mais recentes, da última para a primeira, só com as colunas do histórico."""
+    if linhas.empty:
+        return pd.DataFrame(columns=COLUNAS_HISTORICO)
+    ordem = pd.to_datetime(linhas["Data"].astype(str) + " " + linhas["Hora"].astype(str),
+                           format="%d/%m/%Y %H:%M:%S", errors="coerce")
+    recentes = linhas.assign(_ordem=ordem.to_numpy()).sort_values("_ordem", ascending=False, na_position="last")
+    return recentes.head(limite)[[c for c in COLUNAS_HISTORICO if c in linhas]].astype(str).reset_index(drop=True)
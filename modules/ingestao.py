@@ -0,0 +1,115 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Colunas de baixa cardinalidade guardadas como categorias
+CATEGORICAS = ["Data", "Dia_Semana", "Setor", "Colaborador", "Motivo", "Portal", "Motivo_CRM", "Transportadora"]
+# Colunas calculadas na ingestão (não existem na planilha)
+DERIVADAS = ["Data_Filtro", "Hora_Int", "Semana"]
+
+
+def categorias_de_listas(listas: dict, templates: list[dict]) -> dict[str, list[str]]:
+    """Categorias iniciais de cada coluna a partir de ``data/lists.json`` e dos templates."""
+    motivos = {m for t in templates for m in t}
+    motivos |= {f"ATRASO - {s}" for s in ("ENTREGUE", "CANCELADO", "COBRADO")}
+    motivos |= {f"DEVOLUÇÃO - {s}" for s in ("DEVOLVIDO", "COBRADO")}
+    return {
+        "Dia_Semana":     ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+                           "Sexta-feira", "Sábado", "Domingo"],
+        "Setor":          ["SAC", "Pendência"],
+        "Colaborador":    sorted(set(listas["colaboradores_pendencias"] + listas["colaboradores_sac"])),
+        "Motivo":         sorted(motivos),
+        "Portal":         ["-"] + listas["lista_portais"],
+        "Motivo_CRM":     ["-"] + listas["lista_motivo_crm"],
+        "Transportadora": ["-"] + listas["lista_transportadoras"],
+    }
+
+
+def como_categoria(serie: pd.Series, semente: list[str]) -> pd.Series:
+    observadas = pd.unique(serie.dropna())
+    categorias = list(dict.fromkeys([*semente, *observadas]))
+    return pd.Categorical(serie, categories=categorias)
+
+
+def tipar(linhas: pd.DataFrame, categorias: dict[str, list[str]]) -> pd.DataFrame:
+    """Converte as linhas cruas (strings) no frame tipado usado pelo dashboard.
+
+    Colunas de baixa cardinalidade viram ``category`` semeadas pelas listas; data,
+    hora e semana são calculadas uma única vez aqui, não a cada rerun.
+    """
+    df = linhas.copy()
+    for col in CATEGORICAS:
+        if col in df:
+            df[col] = como_categoria(df[col], categorias.get(col, []))
+
+    if "Data" in df:
+        # Converte só as datas distintas e espalha pelos códigos
+        datas = pd.to_datetime(df["Data"].cat.categories, format="%d/%m/%Y", errors="coerce")
+        codigos = df["Data"].cat.codes.to_numpy()
+        df["Data_Filtro"] = pd.Series(datas.take(codigos), index=df.index).where(codigos >= 0)
+        df["Semana"] = df["Data_Filtro"].dt.to_period("W").dt.start_time
+    if "Hora" in df:
+        df["Hora_Int"] = pd.to_numeric(df["Hora"].str[:2], errors="coerce").astype("Int8")
+    return df
+
+
+def categorias_atuais(df: pd.DataFrame) -> dict[str, list[str]]:
+    """Categorias em uso no frame, para tipar linhas novas de forma compatível."""
+    return {
+        col: list(df[col].cat.categories)
+        for col in CATEGORICAS
+        if col in df and isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+
+
+def alinhar_categorias(a: pd.DataFrame, b: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Dá às colunas categóricas de ``a`` e ``b`` as mesmas categorias (para concat)."""
+    for col in a.columns.intersection(b.columns):
+        if not (isinstance(a[col].dtype, pd.CategoricalDtype) and isinstance(b[col].dtype, pd.CategoricalDtype)):
+            continue
+        cat_a, cat_b = a[col].cat.categories, b[col].cat.categories
+        if cat_a.equals(cat_b):
+            continue
+        cats = list(dict.fromkeys([*cat_a, *cat_b]))
+        a = a.assign(**{col: a[col].cat.set_categories(cats)})
+        b = b.assign(**{col: b[col].cat.set_categories(cats)})
+    return a, b
+
+
+def concatenar(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena frames tipados unindo as categorias de cada coluna uma vez só."""
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    categorias: dict[str, list] = {}
+    for df in frames:
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                categorias.setdefault(col, []).extend(df[col].cat.categories)
+    categorias = {col: list(dict.fromkeys(cats)) for col, cats in categorias.items()}
+    alinhados = [
+        df.assign(**{col: df[col].cat.set_categories(cats) for col, cats in categorias.items() if col in df})
+        for df in frames
+    ]
+    return pd.concat(alinhados, ignore_index=True)
+
+
+# ── Recortes sobre frames ordenados por Data_Filtro ─────────────────────────
+
+def ordenar(df: pd.DataFrame) -> pd.DataFrame:
+    """Ordena por data e hora (estável, datas inválidas no fim) preservando o índice."""
+    return df.sort_values(["Data_Filtro", "Hora"], kind="mergesort", na_position="last")
+
+
+def limites_periodo(datas: pd.Series, ini: date, fim: date) -> tuple[int, int]:
+    """Posições [lo, hi) de ``datas`` (ordenadas) entre ``ini`` e ``fim`` inclusive, por busca binária."""
+    valores = datas.to_numpy()
+    lo = valores.searchsorted(np.datetime64(pd.Timestamp(ini)), side="left")
+    hi = valores.searchsorted(np.datetime64(pd.Timestamp(fim) + pd.Timedelta(days=1)), side="left")
+    return int(lo), int(hi)
+
+
+def mascara_categorias(serie: pd.Series, valores: list[str]) -> np.ndarray:
+    """Máscara de pertinência comparando só os códigos inteiros da categoria."""
+    alvo = serie.cat.categories.get_indexer(valores)
+    return np.isin(serie.cat.codes.to_numpy(), alvo[alvo >= 0])
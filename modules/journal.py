@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+VAR_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "var")
+CAMINHO_JOURNAL = os.environ.get("ENGAGE_JOURNAL", os.path.join(VAR_DIR, "journal.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    linha   TEXT    NOT NULL,
+    criado  REAL    NOT NULL,
+    lote    TEXT,
+    enviado REAL,
+    chave   TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_registros_pendentes ON registros (enviado) WHERE enviado IS NULL;
+"""
+_INDICES = """
+CREATE INDEX IF NOT EXISTS ix_registros_criado ON registros (criado) WHERE chave IS NOT NULL;
+"""
+
+
+class Journal:
+    """Journal local append-only (SQLite em modo WAL) dos registros a enviar.
+
+    Cada registro passa por três estados:
+      * pendente  — ``lote`` e ``enviado`` nulos; ainda não saiu da máquina;
+      * em voo    — ``lote`` preenchido, ``enviado`` nulo; um envio foi tentado e o
+                    resultado é incerto (timeout, queda do processo);
+      * enviado   — ``enviado`` preenchido; confirmado na planilha.
+    Registros em voo precisam ser conferidos na planilha antes de reenviados.
+
+    ``chave`` é a chave de idempotência do registro (ver ``modules.idempotencia``).
+    """
+
+    def __init__(self, caminho: str = CAMINHO_JOURNAL):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=FULL")
+        self._con.executescript(_SCHEMA)
+        colunas = {r[1] for r in self._con.execute("PRAGMA table_info(registros)")}
+        if "chave" not in colunas:  # journal criado antes da chave de idempotência
+            self._con.execute("ALTER TABLE registros ADD COLUMN chave TEXT")
+        self._con.executescript(_INDICES)
+
+    def anotar(self, linha: list, chave: str | None = None) -> int:
+        """Persiste a linha (com fsync) e devolve o id do registro."""
+        with self._lock:
+            cur = self._con.execute(
+                "INSERT INTO registros (linha, criado, chave) VALUES (?, ?, ?)",
+                (json.dumps(linha, ensure_ascii=False), time.time(), chave),
+            )
+            return cur.lastrowid
+
+    def chaves_recentes(self, desde: float) -> list[tuple[str, str, float]]:
+        """``(chave, ticket, criado)`` dos registros com chave anotados após ``desde``."""
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT chave, id, criado FROM registros WHERE chave IS NOT NULL AND criado >= ?",
+                (desde,),
+            ).fetchall()
+        return [(chave, str(i), criado) for chave, i, criado in rows]
+
+    def tem_chave(self, chave: str) -> bool:
+        """True se algum registro ainda no journal foi anotado com ``chave``."""
+        with self._lock:
+            row = self._con.execute("SELECT 1 FROM registros WHERE chave = ? LIMIT 1", (chave,)).fetchone()
+        return row is not None
+
+    def pendentes(self, limite: int) -> list[tuple[int, list]]:
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT id, linha FROM registros WHERE enviado IS NULL AND lote IS NULL "
+                "ORDER BY id LIMIT ?", (limite,),
+            ).fetchall()
+        return [(i, json.loads(linha)) for i, linha in rows]
+
+    def em_voo(self) -> list[tuple[int, list]]:
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT id, linha FROM registros WHERE enviado IS NULL AND lote IS NOT NULL ORDER BY id"
+            ).fetchall()
+        return [(i, json.loads(linha)) for i, linha in rows]
+
+    def _em_transacao(self, sql: str, parametros: list[tuple]):
+        """``executemany`` numa transação só: um fsync por lote, não por linha."""
+        with self._lock:
+            self._con.execute("BEGIN")
+            try:
+                self._con.executemany(sql, parametros)
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            self._con.execute("COMMIT")
+
+    def marcar_lote(self, ids: list[int], lote: str):
+        """Marca os registros como em voo antes de enviá-los."""
+        self._em_transacao("UPDATE registros SET lote = ? WHERE id = ?", [(lote, i) for i in ids])
+
+    def confirmar(self, ids: list[int]):
+        agora = time.time()
+        self._em_transacao("UPDATE registros SET enviado = ? WHERE id = ?", [(agora, i) for i in ids])
+
+    def liberar(self, ids: list[int]):
+        """Volta registros em voo para pendente (conferido: não chegaram à planilha)."""
+        self._em_transacao("UPDATE registros SET lote = NULL WHERE id = ?", [(i,) for i in ids])
+
+    def limpar(self, antes: float) -> int:
+        """Apaga os registros confirmados até ``antes`` e devolve quantos saíram."""
+        with self._lock:
+            return self._con.execute(
+                "DELETE FROM registros WHERE enviado IS NOT NULL AND enviado < ?", (antes,)
+            ).rowcount
+
+    def enviado(self, id_registro: int) -> bool | None:
+        """True se confirmado, False se ainda pendente/em voo, None se desconhecido."""
+        with self._lock:
+            row = self._con.execute("SELECT enviado FROM registros WHERE id = ?", (id_registro,)).fetchone()
+        if row is None:
+            return None
+        return row[0] is not None
+
+    def total_pendente(self) -> int:
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM registros WHERE enviado IS NULL").fetchone()[0]
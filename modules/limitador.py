@@ -0,0 +1,188 @@
+import email.utils
+import functools
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from gspread.exceptions import APIError
+
+from modules.metricas import METRICAS
+
+# Métodos do Worksheet que gastam cota de escrita; o resto é leitura
+ESCRITAS = {
+    "append_row", "append_rows", "update", "update_cell", "update_cells", "batch_update",
+    "insert_row", "insert_rows", "delete_rows", "clear", "batch_clear", "add_worksheet",
+}
+
+
+class CotaEsgotada(Exception):
+    """A requisição esperou mais que o permitido por cota e não foi enviada."""
+
+
+class BaldeTokens:
+    """Token bucket com fila FIFO: quem chegou primeiro é atendido primeiro."""
+
+    def __init__(self, por_minuto: float, rajada: int):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = float(rajada)
+        self._tokens = float(rajada)
+        self._ultimo = time.monotonic()
+        self._pausado_ate = 0.0
+        self._proxima_senha = 0
+        self._atendendo = 0
+        self._desistentes: set[int] = set()  # senhas que deram timeout fora da vez
+        self._cond = threading.Condition()
+
+    def _repor(self, agora: float):
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def adquirir(self, timeout: float | None = None):
+        """Bloqueia até haver token (e a pausa de ``Retry-After`` acabar)."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            senha = self._proxima_senha
+            self._proxima_senha += 1
+            try:
+                while True:
+                    agora = time.monotonic()
+                    self._repor(agora)
+                    if senha == self._atendendo and agora >= self._pausado_ate and self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    if senha == self._atendendo:
+                        espera = max(self._pausado_ate - agora, (1 - self._tokens) / self.taxa, 0.001)
+                    else:
+                        espera = None  # aguarda a vez
+                    if limite is not None:
+                        restante = limite - agora
+                        if restante <= 0:
+                            raise CotaEsgotada(f"sem cota por {timeout:.0f} s")
+                        espera = restante if espera is None else min(espera, restante)
+                    self._cond.wait(espera)
+            finally:
+                self._desistentes.add(senha)
+                while self._atendendo in self._desistentes:
+                    self._desistentes.discard(self._atendendo)
+                    self._atendendo += 1
+                self._cond.notify_all()
+
+    def pausar(self, segundos: float):
+        """Nenhum token sai antes de ``segundos`` (para respeitar ``Retry-After``)."""
+        with self._cond:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self._tokens = min(self._tokens, 0.0)
+            self._cond.notify_all()
+
+
+class Coalescedor:
+    """Chamadas idênticas simultâneas viram uma só; todos recebem o mesmo resultado."""
+
+    def __init__(self):
+        self._em_voo: dict[Any, Future] = {}
+        self._lock = threading.Lock()
+        self.coalescidas = 0
+
+    def executar(self, chave: Any, funcao: Callable[[], Any]) -> Any:
+        with self._lock:
+            futuro = self._em_voo.get(chave)
+            dono = futuro is None
+            if dono:
+                futuro = self._em_voo[chave] = Future()
+        if not dono:
+            self.coalescidas += 1
+            METRICAS.contar("engage_sheets_coalescidas_total")
+            return futuro.result()
+        try:
+            resultado = funcao()
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+
+
+def _congelar(valor: Any) -> Any:
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _congelar(v)) for k, v in valor.items()))
+    hash(valor)
+    return valor
+
+
+def _retry_after(erro: APIError, tentativa: int) -> float:
+    """Segundos pedidos pelo servidor; sem o cabeçalho, backoff exponencial com jitter."""
+    cabecalho = getattr(getattr(erro, "response", None), "headers", {}).get("Retry-After")
+    if cabecalho:
+        try:
+            return max(0.0, float(cabecalho))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(cabecalho).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0.5, 1.0) * min(60.0, 2.0 ** tentativa)
+
+
+class AgendadorSheets:
+    """Agenda todo o tráfego do processo com a API do Sheets.
+
+    Leituras e escritas têm baldes de cota separados; sem token a requisição
+    espera na fila (até ``espera_max`` segundos, depois ``CotaEsgotada``). Um 429
+    pausa o balde pelo ``Retry-After`` e a requisição é repetida até
+    ``tentativas_429`` vezes. Leituras idênticas simultâneas são coalescidas: o
+    resultado é compartilhado e não deve ser alterado por quem chamou.
+    """
+
+    def __init__(
+        self,
+        leituras_por_minuto: float = 55,
+        escritas_por_minuto: float = 55,
+        rajada: int = 10,
+        tentativas_429: int = 3,
+        espera_max: float = 90.0,
+    ):
+        self.leitura = BaldeTokens(leituras_por_minuto, rajada)
+        self.escrita = BaldeTokens(escritas_por_minuto, rajada)
+        self._tentativas_429 = tentativas_429
+        self._espera_max = espera_max
+        self.coalescedor = Coalescedor()
+        self.erros_429 = 0
+
+    def _com_cota(self, balde: BaldeTokens, funcao: Callable[[], Any]) -> Any:
+        for tentativa in range(self._tentativas_429 + 1):
+            inicio = time.perf_counter()
+            try:
+                balde.adquirir(self._espera_max)
+            finally:
+                METRICAS.observar("engage_sheets_espera_cota_segundos", time.perf_counter() - inicio,
+                                  balde="escrita" if balde is self.escrita else "leitura")
+            try:
+                return funcao()
+            except APIError as e:
+                if e.code != 429:
+                    raise
+                self.erros_429 += 1
+                if tentativa == self._tentativas_429:
+                    raise
+                METRICAS.contar("engage_sheets_retentativas_total", motivo="429")
+                balde.pausar(_retry_after(e, tentativa))
+
+    def executar(self, nome: str, funcao: Callable[..., Any], args: tuple = (), kwargs: dict | None = None) -> Any:
+        chamar = functools.partial(funcao, *args, **(kwargs or {}))
+        if nome in ESCRITAS:
+            return self._com_cota(self.escrita, chamar)
+        try:
+            # ``id`` do objeto dono do método: a mesma leitura em abas diferentes não se junta
+            chave = (nome, id(getattr(funcao, "__self__", None)), _congelar(args), _congelar(kwargs or {}))
+        except TypeError:  # argumento sem hash: não dá para coalescer
+            return self._com_cota(self.leitura, chamar)
+        return self.coalescedor.executar(chave, lambda: self._com_cota(self.leitura, chamar))
@@ -0,0 +1,291 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, NamedTuple
+
+import streamlit as st
+
+# Limites (segundos) dos baldes dos histogramas, do render de um widget a uma ida ao Google
+BALDES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+INTERVALO_ARQUIVO = 15  # segundos entre regravações do arquivo de métricas
+
+# Tipo e descrição de cada métrica (o ``# HELP``/``# TYPE`` do formato Prometheus)
+DESCRICOES = {
+    "engage_etapa_segundos": ("histogram", "Duração de cada etapa instrumentada (span)."),
+    "engage_rerun_segundos": ("histogram", "Duração de uma execução completa do app.py, por página."),
+    "engage_sheets_latencia_segundos": ("histogram", "Latência das chamadas à API do Sheets, com a espera por cota."),
+    "engage_sheets_espera_cota_segundos": ("histogram", "Tempo esperando token de cota antes de cada chamada."),
+    "engage_sheets_erros_total": ("counter", "Chamadas ao Sheets que terminaram em erro, por tipo."),
+    "engage_sheets_retentativas_total": ("counter", "Chamadas ao Sheets repetidas após 429."),
+    "engage_sheets_coalescidas_total": ("counter", "Leituras idênticas simultâneas atendidas por outra chamada."),
+    "engage_fila_lote_segundos": ("histogram", "Duração de cada envio de lote da fila de gravação, por resultado."),
+    "engage_fila_lotes_total": ("counter", "Lotes enviados pela fila de gravação, por resultado."),
+    "engage_fila_retentativas_total": ("counter", "Rodadas da fila que falharam e entraram em backoff."),
+    "engage_cache_chamadas_total": ("counter", "Chamadas a funções com st.cache_data/st.cache_resource."),
+    "engage_cache_misses_total": ("counter", "Chamadas que não estavam em cache e executaram a função."),
+}
+
+
+def _rotulos(rotulos: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar(nome: str, rotulos: tuple[tuple[str, str], ...], valor: float) -> str:
+    if rotulos:
+        nome += "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos) + "}"
+    return f"{nome} {valor:.10g}"
+
+
+class Histograma:
+    def __init__(self, baldes: tuple[float, ...] = BALDES):
+        self.baldes = baldes
+        self.contagens = [0] * (len(baldes) + 1)  # o último é o +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect.bisect_left(self.baldes, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def quantil(self, q: float) -> float:
+        """Estimativa pelo limite superior do balde (como ``histogram_quantile`` sem interpolar)."""
+        alvo, acumulado = q * self.total, 0
+        for limite, n in zip((*self.baldes, float("inf")), self.contagens):
+            acumulado += n
+            if acumulado >= alvo:
+                return limite
+        return float("inf")
+
+
+class Metricas:
+    """Contadores e histogramas do processo, exportados no formato texto do Prometheus.
+
+    Nomes e rótulos seguem ``DESCRICOES``; uma série é criada na primeira vez
+    que aparece. Seguro para as threads do Streamlit, da fila e dos snapshots.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: dict[tuple[str, tuple], float] = {}
+        self._histogramas: dict[tuple[str, tuple], Histograma] = {}
+
+    def contar(self, nome: str, valor: float = 1, **rotulos):
+        chave = (nome, _rotulos(rotulos))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome: str, valor: float, **rotulos):
+        chave = (nome, _rotulos(rotulos))
+        with self._lock:
+            hist = self._histogramas.get(chave)
+            if hist is None:
+                hist = self._histogramas[chave] = Histograma()
+            hist.observar(valor)
+
+    def contadores(self) -> dict[tuple[str, tuple], float]:
+        with self._lock:
+            return dict(self._contadores)
+
+    def resumo(self) -> list[dict]:
+        """Uma linha por série de histograma (contagem, soma, média, p50 e p95), da mais custosa à menos."""
+        with self._lock:
+            series = [(nome, rotulos, h.total, h.soma, h.quantil(0.5), h.quantil(0.95))
+                      for (nome, rotulos), h in self._histogramas.items()]
+        return [
+            {"metrica": nome, "rotulos": ", ".join(f"{k}={v}" for k, v in rotulos),
+             "n": total, "total_s": soma, "media_s": soma / total if total else 0.0, "p50_s": p50, "p95_s": p95}
+            for nome, rotulos, total, soma, p50, p95 in sorted(series, key=lambda s: -s[3])
+        ]
+
+    def exportar(self) -> str:
+        """Todas as séries no formato de exposição em texto do Prometheus."""
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted(
+                ((chave, list(h.contagens), h.soma, h.total, h.baldes) for chave, h in self._histogramas.items()),
+                key=lambda item: item[0],
+            )
+        linhas, vistos = [], set()
+
+        def cabecalho(nome: str, tipo: str):
+            if nome not in vistos:
+                vistos.add(nome)
+                linhas.append(f"# HELP {nome} {DESCRICOES.get(nome, (tipo, nome))[1]}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+
+        for (nome, rotulos), valor in contadores:
+            cabecalho(nome, "counter")
+            linhas.append(_formatar(nome, rotulos, valor))
+        for (nome, rotulos), contagens, soma, total, baldes in histogramas:
+            cabecalho(nome, "histogram")
+            acumulado = 0
+            for limite, n in zip((*baldes, float("inf")), contagens):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                linhas.append(_formatar(f"{nome}_bucket", (*rotulos, ("le", le)), acumulado))
+            linhas.append(_formatar(f"{nome}_sum", rotulos, soma))
+            linhas.append(_formatar(f"{nome}_count", rotulos, total))
+        return "\n".join(linhas) + "\n"
+
+
+METRICAS = Metricas()
+
+
+# ── Spans ─────────────────────────────────────────────────────────────────────
+
+class Span(NamedTuple):
+    etapa: str
+    inicio: float       # segundos desde o começo do rerun
+    duracao: float
+    profundidade: int   # aninhamento dentro do rerun
+
+
+_local = threading.local()  # rastro do rerun em andamento nesta thread do script
+CHAVE_RASTRO = "_rastro_rerun"
+CHAVE_RASTRO_ANTERIOR = "_rastro_rerun_anterior"
+CHAVE_PAGINA = "_rastro_pagina"
+
+
+@contextmanager
+def span(etapa: str):
+    """Cronometra o bloco (ou a função, usado como decorador) como ``etapa``.
+
+    Toda chamada alimenta ``engage_etapa_segundos``; na thread do script,
+    depois de ``iniciar_rerun``, também entra no rastro do rerun.
+    """
+    rastro = getattr(_local, "rastro", None)
+    profundidade = 0
+    if rastro is not None:
+        profundidade = _local.profundidade
+        _local.profundidade += 1
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        METRICAS.observar("engage_etapa_segundos", duracao, etapa=etapa)
+        if rastro is not None:
+            _local.profundidade -= 1
+            rastro.append(Span(etapa, inicio - _local.inicio, duracao, profundidade))
+
+
+def iniciar_rerun():
+    """Abre o rastro desta execução do script; o da execução anterior fica guardado na sessão."""
+    anterior = st.session_state.get(CHAVE_RASTRO)
+    if anterior:
+        st.session_state[CHAVE_RASTRO_ANTERIOR] = (st.session_state.get(CHAVE_PAGINA, ""), anterior)
+    _local.rastro = st.session_state[CHAVE_RASTRO] = []
+    _local.inicio = time.perf_counter()
+    _local.profundidade = 0
+
+
+def finalizar_rerun(pagina: str):
+    """Registra a duração do rerun (chamada no fim do ``app.py``)."""
+    inicio = getattr(_local, "inicio", None)
+    if inicio is not None:
+        METRICAS.observar("engage_rerun_segundos", time.perf_counter() - inicio, pagina=pagina)
+        st.session_state[CHAVE_PAGINA] = pagina
+
+
+def rastro_anterior() -> tuple[str, list[Span]]:
+    """Página e spans do último rerun completo desta sessão."""
+    return st.session_state.get(CHAVE_RASTRO_ANTERIOR, ("", []))
+
+
+# ── Caches ────────────────────────────────────────────────────────────────────
+
+def cache_contado(cache: Callable, **opcoes) -> Callable:
+    """``cache(**opcoes)`` (``st.cache_data`` ou ``st.cache_resource``) contando acertos e faltas.
+
+    Cada chamada vira um span ``cache.<função>``; a função original só roda
+    numa falta, e é aí que ``engage_cache_misses_total`` aumenta.
+    """
+    def decorar(funcao: Callable) -> Callable:
+        nome = funcao.__name__
+
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            METRICAS.contar("engage_cache_misses_total", funcao=nome)
+            return funcao(*args, **kwargs)
+
+        cacheada = cache(**opcoes)(executar)
+
+        @functools.wraps(funcao)
+        def chamar(*args, **kwargs):
+            METRICAS.contar("engage_cache_chamadas_total", funcao=nome)
+            with span(f"cache.{nome}"):
+                return cacheada(*args, **kwargs)
+
+        chamar.clear = cacheada.clear
+        return chamar
+
+    return decorar
+
+
+# ── Exportação ────────────────────────────────────────────────────────────────
+
+def _gravar_arquivo(caminho: str):
+    """Regrava o arquivo periodicamente (troca atômica, como espera o textfile collector)."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    while True:
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(METRICAS.exportar())
+        os.replace(temporario, caminho)
+        time.sleep(INTERVALO_ARQUIVO)
+
+
+class _Endpoint(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = METRICAS.exportar().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _config_exportacao() -> tuple[str | None, int | None]:
+    """Arquivo (``ENGAGE_METRICAS_ARQUIVO``) e porta do ``/metrics`` (``ENGAGE_METRICAS_PORTA``).
+
+    Também lidos de ``metricas_arquivo``/``metricas_porta`` nos secrets; sem
+    nenhum dos dois as métricas ficam só na página de administração.
+    """
+    arquivo, porta = os.environ.get("ENGAGE_METRICAS_ARQUIVO"), os.environ.get("ENGAGE_METRICAS_PORTA")
+    try:
+        arquivo = arquivo or st.secrets.get("metricas_arquivo")
+        porta = porta or st.secrets.get("metricas_porta")
+    except Exception:
+        pass
+    return arquivo or None, int(porta) if porta else None
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_exportacao() -> ThreadingHTTPServer | None:
+    """Liga, uma vez por processo, o arquivo e/ou o endpoint configurados."""
+    arquivo, porta = _config_exportacao()
+    if arquivo:
+        threading.Thread(target=_gravar_arquivo, args=(arquivo,), name="metricas-arquivo", daemon=True).start()
+    if porta is None:
+        return None
+    try:
+        servidor = ThreadingHTTPServer(("0.0.0.0", porta), _Endpoint)
+    except OSError:  # porta ocupada (outro processo do app): fica só o arquivo/página
+        return None
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return servidor
@@ -5,12 +5,17 @@ import time
 import streamlit as st
 import streamlit.components.v1 as components
 
-from modules.templates import carregar_templates, carregar_listas
-from modules.sheets import salvar_registro
+from modules.templates import carregar_listas, carregar_motor, carregar_templates
+from modules.historico import painel_historico
+from modules.idempotencia import RegistroDuplicado
+from modules.metricas import span
+from modules.registros import JANELA_IDEMPOTENCIA, enfileirar_registro
+from modules.status_gravacao import painel_gravacoes
 from modules.validation import validar_pendencia
 
-# Segundos mínimos entre dois registros idênticos (mesmo colaborador + pedido + NF)
-_COOLDOWN = 60
+# Segundos mínimos entre dois registros idênticos (mesmo colaborador + pedido + NF): a mesma
+# janela em que a fila recusa o registro, venha de que sessão vier
+_COOLDOWN = JANELA_IDEMPOTENCIA
 
 
 def _copiar_para_clipboard(texto: str):
@@ -56,11 +61,6 @@ def _callback_registrar(texto_final: str):
         st.session_state["_aviso_dup_p"] = restante
         return  # Bloqueia sem salvar
 
-    # ── Double-submit (cliques simultâneos) ───────────────────────────────
-    if st.session_state.get("_salvando_p"):
-        return
-    st.session_state["_salvando_p"] = True
-
     dados = {
         "setor":          "Pendência",
         "colaborador":    st.session_state.get("colab_p", ""),
@@ -72,19 +72,23 @@ def _callback_registrar(texto_final: str):
         "transportadora": st.session_state.get("transp_p", "-"),
     }
 
-    sucesso = salvar_registro(dados)
-    st.session_state["_salvando_p"] = False
-
-    if sucesso:
-        # Registra hash e tempo para bloquear re-envio imediato
-        st.session_state["_ultimo_hash_p"] = hash_atual
-        st.session_state["_ultimo_save_p"] = time.time()
-        st.session_state["sucesso_recente_p"] = True
-        for campo in ["cliente_p", "nf_p", "ped_p"]:
-            if campo in st.session_state:
-                st.session_state[campo] = ""
-    else:
+    # Só anota no journal local: o envio à planilha acontece fora do callback
+    try:
+        ticket = enfileirar_registro(dados)
+    except RegistroDuplicado as e:  # já anotado por outra aba/sessão
+        st.session_state["_aviso_dup_p"] = e.restante
+        return
+    except Exception:
         st.session_state["erro_recente_p"] = True
+        return
+    st.session_state.setdefault("_tickets_p", {})[ticket] = dados
+
+    # Registra hash e tempo para bloquear re-envio imediato
+    st.session_state["_ultimo_hash_p"] = hash_atual
+    st.session_state["_ultimo_save_p"] = time.time()
+    for campo in ["cliente_p", "nf_p", "ped_p"]:
+        if campo in st.session_state:
+            st.session_state[campo] = ""
 
 
 def _limpar_campos_p():
@@ -99,18 +103,18 @@ def _limpar_campos_p():
 
 
 def pagina_pendencias():
-    if st.session_state.pop("sucesso_recente_p", False):
-        st.toast("Registrado e Limpo!", icon="✅")
+    # ── Status das gravações em lote ──────────────────────────────────────
     if st.session_state.pop("erro_recente_p", False):
-        st.error("⚠️ Falha ao salvar no Google Sheets. Tente novamente.")
+        st.error("⚠️ Falha ao salvar o registro. Tente novamente.")
+    painel_gravacoes("_tickets_p")
 
     # Aviso de duplicata
     restante = st.session_state.pop("_aviso_dup_p", None)
     if restante is not None:
         st.warning(
-            f"⚠️ **Registro duplicado bloqueado.** Este pedido já foi registrado "
-            f"há menos de {restante} segundos. Mude o número do pedido ou NF para "
-            f"continuar, ou aguarde antes de registrar o mesmo atendimento novamente."
+            f"⚠️ **Registro duplicado bloqueado.** Este pedido já foi registrado. "
+            f"Mude o número do pedido ou NF para continuar, ou aguarde {restante}s "
+            f"para registrar o mesmo atendimento novamente."
         )
 
     st.markdown("""
@@ -162,6 +166,8 @@ def pagina_pendencias():
         with c7:
             transp = st.selectbox("🚛 Transportadora:", transportadoras, key="transp_p")
 
+        painel_historico(numero_pedido, nota_fiscal)
+
         st.markdown("<hr style='margin:0.75rem 0;border-color:#e2e8f0'>", unsafe_allow_html=True)
         st.markdown("""<div style="border-left:4px solid #2563eb;padding:0.1rem 0 0.1rem 0.9rem;margin-bottom:0.9rem">
             <span style="font-size:1rem;font-weight:700;color:#1e293b">2. Motivo e Visualização</span>
@@ -170,29 +176,13 @@ def pagina_pendencias():
         opcao = st.selectbox("Selecione o caso:", sorted(modelos.keys()), key="msg_p")
 
         # Renderização do texto
-        texto_cru = modelos[opcao]
-        nome_str  = nome_cliente if nome_cliente else "(Nome do cliente)"
-        assinatura = colab if "AMAZON" not in portal else ""
-        texto_base = (texto_cru
-                      .replace("{transportadora}", str(transp))
-                      .replace("{colaborador}", assinatura)
-                      .replace("{nome_cliente}", nome_str)
-                      .replace("(Nome do cliente)", nome_str))
-
-        motivos_sem_texto = [
-            "ATENDIMENTO DIGISAC", "2° TENTATIVA DE CONTATO", "3° TENTATIVA DE CONTATO",
-            "REENTREGA", "AGUARDANDO TRANSPORTADORA",
-        ]
-        if opcao not in motivos_sem_texto:
-            ped_str = numero_pedido if numero_pedido else "..."
-            frase   = f"O atendimento é referente ao seu pedido de número {ped_str}..."
-            if "\n" in texto_base:
-                partes = texto_base.split("\n", 1)
-                texto_final = f"{partes[0]}\n\n{frase}\n{partes[1]}"
-            else:
-                texto_final = f"{frase}\n\n{texto_base}"
-        else:
-            texto_final = ""
+        with span("mensagem.pendencias"):
+            texto_final = carregar_motor("pendencias").renderizar(opcao, {
+                "nome_cliente":   nome_cliente if nome_cliente else "(Nome do cliente)",
+                "numero_pedido":  numero_pedido if numero_pedido else "...",
+                "transportadora": str(transp),
+                "colaborador":    colab if "AMAZON" not in portal else "",
+            })
 
         st.markdown(f'<div class="preview-box">{texto_final}</div>', unsafe_allow_html=True)
         st.write("")
@@ -263,13 +253,20 @@ def pagina_pendencias():
                 status = st.selectbox("Status:", ["ENTREGUE", "CANCELADO", "COBRADO"])
             submitted = st.form_submit_button("✅ Registrar Atraso")
             if submitted:
-                salvar_registro({
+                dados = {
                     "setor": "Pendência", "colaborador": colab,
                     "motivo": f"ATRASO - {status}", "portal": "-",
                     "nota_fiscal": nf, "numero_pedido": pedido,
                     "motivo_crm": "-", "transportadora": transp,
-                })
-                st.toast("Atraso registrado!", icon="✅")
+                }
+                try:
+                    st.session_state.setdefault("_tickets_p", {})[enfileirar_registro(dados)] = dados
+                except RegistroDuplicado as e:
+                    st.warning(f"⚠️ **Registro duplicado bloqueado.** Este pedido já foi registrado; aguarde {e.restante}s para registrá-lo de novo.")
+                except Exception:
+                    st.error("⚠️ Falha ao salvar o registro. Tente novamente.")
+                else:
+                    st.toast("Atraso enviado para gravação!", icon="⏳")
 
     # ── Devolução ─────────────────────────────────────────────────────────
     elif tipo_fluxo == "Devolução":
@@ -285,10 +282,17 @@ def pagina_pendencias():
                 status = st.selectbox("Status:", ["DEVOLVIDO", "COBRADO"])
             submitted = st.form_submit_button("✅ Registrar Devolução")
             if submitted:
-                salvar_registro({
+                dados = {
                     "setor": "Pendência", "colaborador": colab,
                     "motivo": f"DEVOLUÇÃO - {status}", "portal": "-",
                     "nota_fiscal": nf, "numero_pedido": pedido,
                     "motivo_crm": "-", "transportadora": transp,
-                })
-                st.toast("Devolução registrada!", icon="✅")
+                }
+                try:
+                    st.session_state.setdefault("_tickets_p", {})[enfileirar_registro(dados)] = dados
+                except RegistroDuplicado as e:
+                    st.warning(f"⚠️ **Registro duplicado bloqueado.** Este pedido já foi registrado; aguarde {e.restante}s para registrá-lo de novo.")
+                except Exception:
+                    st.error("⚠️ Falha ao salvar o registro. Tente novamente.")
+                else:
+                    st.toast("Devolução enviada para gravação!", icon="⏳")
@@ -0,0 +1,241 @@
+import copy
+import csv
+import glob
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, numericise_all
+
+
+def _erro_api(codigo: int, mensagem: str, retry_after: float | None = None) -> APIError:
+    """``APIError`` com a mesma cara do que o gspread levanta para a API real."""
+    resposta = requests.Response()
+    resposta.status_code = codigo
+    resposta._content = json.dumps({"error": {"code": codigo, "message": mensagem, "status": "ERRO_SIMULADO"}}).encode()
+    if retry_after is not None:
+        resposta.headers["Retry-After"] = str(int(retry_after))
+    return APIError(resposta)
+
+
+class PlanilhaFalsa:
+    """Substituta em memória de ``gspread.Worksheet`` para testes e carga offline.
+
+    Implementa o subconjunto da API usado pelo app (``append_row``,
+    ``append_rows``, ``get_values``, ``get_all_records``, ``col_values``,
+    ``batch_get``, ``update``, ``fetch_sheet_metadata``) sobre uma lista de linhas em memória. Com ``caminho`` as
+    linhas também vão para um CSV, relido na próxima instância.
+
+    A instância também faz o papel de Spreadsheet (``worksheets``, ``worksheet``,
+    ``add_worksheet``): as outras abas compartilham a injeção de falhas e a cota,
+    e com ``caminho`` cada uma vai para ``<caminho sem .csv>.<título>.csv``.
+
+    Falhas são injetadas antes de cada chamada:
+
+    - ``latencia``: segundos de espera por chamada (número ou ``[min, max]``);
+    - ``erro_429``: probabilidade de ``APIError`` 429 (cota);
+    - ``cota_por_minuto``: limite de chamadas por janela de 60 s, acima dele 429;
+    - ``falha``: probabilidade de ``ConnectionError`` (nada foi gravado);
+    - ``falha_apos_gravar``: probabilidade de ``ReadTimeout`` *depois* de gravar,
+      como um timeout em que a requisição chegou ao servidor.
+    """
+
+    def __init__(
+        self,
+        cabecalho: list[str],
+        caminho: str | None = None,
+        latencia: float | list[float] = 0.0,
+        erro_429: float = 0.0,
+        cota_por_minuto: int | None = None,
+        falha: float = 0.0,
+        falha_apos_gravar: float = 0.0,
+        semente: int | None = None,
+        title: str = "Planilha falsa",
+    ):
+        self.title = title
+        self.caminho = caminho
+        self.latencia = latencia
+        self.erro_429 = erro_429
+        self.cota_por_minuto = cota_por_minuto
+        self.falha = falha
+        self.falha_apos_gravar = falha_apos_gravar
+        self.chamadas = 0
+        self._rng = random.Random(semente)
+        self._janela: deque[float] = deque()
+        self._lock = threading.Lock()
+        self._linhas: list[list[str]] = [list(map(str, cabecalho))]
+        self._raiz = self
+        self._abas: dict[str, PlanilhaFalsa] = {title: self}
+        if caminho and os.path.exists(caminho):
+            self._linhas = self._ler(caminho) or self._linhas
+            prefixo = self._caminho_aba("")[:-len(".csv")]
+            for arquivo in sorted(glob.glob(glob.escape(prefixo) + "*.csv")):
+                aba = self._nova_aba(arquivo[len(prefixo):-len(".csv")])
+                aba._linhas = self._ler(arquivo)
+        elif caminho:
+            self._persistir(self._linhas, modo="w")
+
+    @property
+    def row_count(self) -> int:
+        return len(self._linhas)
+
+    @property
+    def id(self) -> str:
+        return self.caminho or "planilha-falsa"
+
+    @property
+    def spreadsheet(self) -> "PlanilhaFalsa":
+        """A primeira aba faz as vezes de Spreadsheet."""
+        return self._raiz
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> dict:
+        self._chamada()
+        return {"spreadsheetId": self.id, "properties": {"title": self._raiz.title}}
+
+    # ── Abas ─────────────────────────────────────────────────────────────────
+
+    def _caminho_aba(self, titulo: str) -> str:
+        base = self._raiz.caminho
+        return f"{base[:-4] if base.endswith('.csv') else base}.{titulo}.csv"
+
+    def _nova_aba(self, titulo: str) -> "PlanilhaFalsa":
+        aba = copy.copy(self._raiz)  # mesma cota, sorteio e lock
+        aba.title = titulo
+        aba._linhas = []
+        if self._raiz.caminho:
+            aba.caminho = self._caminho_aba(titulo)
+        self._abas[titulo] = aba
+        return aba
+
+    def worksheets(self) -> list["PlanilhaFalsa"]:
+        self._chamada()
+        return list(self._abas.values())
+
+    def worksheet(self, title: str) -> "PlanilhaFalsa":
+        self._chamada()
+        if title not in self._abas:
+            raise WorksheetNotFound(title)
+        return self._abas[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs) -> "PlanilhaFalsa":
+        self._chamada()
+        with self._lock:
+            if title in self._abas:
+                raise _erro_api(400, f'A sheet with the name "{title}" already exists.')
+            aba = self._nova_aba(title)
+            if aba.caminho:
+                aba._persistir([], modo="w")
+        return aba
+
+    # ── Injeção de falhas ────────────────────────────────────────────────────
+
+    def _chamada(self):
+        raiz = self._raiz  # a configuração de falhas vale para todas as abas
+        raiz.chamadas += 1
+        if raiz.latencia:
+            atraso = raiz.latencia if isinstance(raiz.latencia, (int, float)) else self._rng.uniform(*raiz.latencia)
+            time.sleep(atraso)
+        if raiz.cota_por_minuto is not None:
+            agora = time.monotonic()
+            with self._lock:
+                while self._janela and agora - self._janela[0] >= 60:
+                    self._janela.popleft()
+                if len(self._janela) >= raiz.cota_por_minuto:
+                    raise _erro_api(429, "Quota exceeded (simulada)", retry_after=60 - (agora - self._janela[0]))
+                self._janela.append(agora)
+        if self._rng.random() < raiz.erro_429:
+            raise _erro_api(429, "Quota exceeded (simulada)", retry_after=1)
+        if self._rng.random() < raiz.falha:
+            raise requests.exceptions.ConnectionError("Falha de rede simulada")
+
+    def _talvez_timeout(self):
+        if self._rng.random() < self._raiz.falha_apos_gravar:
+            raise requests.exceptions.ReadTimeout("Timeout simulado após gravar")
+
+    # ── Escrita ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _ler(caminho: str) -> list[list[str]]:
+        with open(caminho, newline="", encoding="utf-8") as f:
+            return list(csv.reader(f))
+
+    def _persistir(self, linhas: list[list[str]], modo: str = "a"):
+        with open(self.caminho, modo, newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(linhas)
+
+    def append_rows(self, values: list[list], **kwargs) -> dict:
+        self._chamada()
+        novas = [["" if v is None else str(v) for v in linha] for linha in values]
+        with self._lock:
+            self._linhas.extend(novas)
+            if self.caminho:
+                self._persistir(novas)
+            fim = len(self._linhas)
+        self._talvez_timeout()
+        return {"updates": {"updatedRange": f"A{fim - len(novas) + 1}:{fim}", "updatedRows": len(novas)}}
+
+    def append_row(self, values: list, **kwargs) -> dict:
+        return self.append_rows([values], **kwargs)
+
+    def update(self, values: list[list], range_name: str = "A1", **kwargs) -> dict:
+        """Sobrescreve a partir da célula inicial de ``range_name``."""
+        self._chamada()
+        linha0, col0 = a1_to_rowcol(range_name.split("!")[-1].split(":")[0])
+        with self._lock:
+            for i, valores in enumerate(values):
+                while len(self._linhas) < linha0 + i:
+                    self._linhas.append([])
+                atual = self._linhas[linha0 - 1 + i]
+                atual.extend([""] * (col0 - 1 + len(valores) - len(atual)))
+                atual[col0 - 1:col0 - 1 + len(valores)] = ["" if v is None else str(v) for v in valores]
+            if self.caminho:
+                self._persistir(self._linhas, modo="w")
+        return {"updatedRange": range_name, "updatedRows": len(values)}
+
+    # ── Leitura ──────────────────────────────────────────────────────────────
+
+    def _recortar(self, faixa: str | None) -> list[list[str]]:
+        with self._lock:
+            linhas = list(self._linhas)
+        if faixa is None:
+            return [list(r) for r in linhas]
+        g = a1_range_to_grid_range(faixa.split("!")[-1])
+        ini_l, fim_l = g.get("startRowIndex", 0), g.get("endRowIndex", len(linhas))
+        ini_c, fim_c = g.get("startColumnIndex", 0), g.get("endColumnIndex")
+        return [r[ini_c:fim_c] for r in linhas[ini_l:fim_l]]
+
+    @staticmethod
+    def _retangular(linhas: list[list[str]]) -> list[list[str]]:
+        """Como a API: sem linhas vazias no fim e todas com a mesma largura."""
+        while linhas and not any(linhas[-1]):
+            linhas.pop()
+        largura = max((len(r) for r in linhas), default=0)
+        return [r + [""] * (largura - len(r)) for r in linhas]
+
+    def get_values(self, range_name: str | None = None, **kwargs) -> list[list[str]]:
+        self._chamada()
+        return self._retangular(self._recortar(range_name))
+
+    def batch_get(self, ranges: list[str], **kwargs) -> list[list[list[str]]]:
+        self._chamada()
+        return [self._retangular(self._recortar(faixa)) for faixa in ranges]
+
+    def col_values(self, col: int, **kwargs) -> list[str]:
+        self._chamada()
+        valores = [(r[col - 1] if len(r) >= col else "") for r in self._recortar(None)]
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+    def get_all_records(self, head: int = 1, **kwargs) -> list[dict]:
+        self._chamada()
+        linhas = self._retangular(self._recortar(None))
+        if len(linhas) < head:
+            return []
+        cabecalho = linhas[head - 1]
+        return [dict(zip(cabecalho, numericise_all(r))) for r in linhas[head:]]
@@ -0,0 +1,208 @@
+import importlib
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import TYPE_CHECKING
+
+import pytz
+import streamlit as st
+
+from modules.fila_gravacao import GRAVADO, PENDENTE, FilaGravacao
+from modules.idempotencia import IndiceIdempotencia, RegistroDuplicado, chave_idempotencia
+from modules.journal import CAMINHO_JOURNAL, Journal
+from modules.metricas import cache_contado, span
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from modules.armazenamento import Armazenamento
+
+# Este módulo é o que os formulários importam: só carrega pandas e gspread
+# (via ``modules.sheets``/``modules.armazenamento``) na primeira gravação.
+
+COLUNAS = ["Data", "Hora", "Dia_Semana", "Setor", "Colaborador", "Motivo",
+           "Portal", "Nota_Fiscal", "Numero_Pedido", "Motivo_CRM", "Transportadora"]
+JANELA_IDEMPOTENCIA = 60  # segundos em que o mesmo registro é recusado; é o cooldown dos formulários
+RETENCAO_JOURNAL = 10 * 60  # segundos que um registro confirmado fica no journal (status dos tickets)
+CAMINHO_JOURNAL_ESPELHO = os.path.join(os.path.dirname(CAMINHO_JOURNAL), "journal_espelho.sqlite3")
+
+
+_preaquecido = threading.Event()
+
+
+def preaquecer():
+    """Importa em segundo plano o que a primeira gravação do processo vai usar.
+
+    Chamada depois do login: a tela já está desenhada e o primeiro "Salvar"
+    não paga a importação de pandas e gspread.
+    """
+    if not _preaquecido.is_set():
+        _preaquecido.set()
+        threading.Thread(target=importlib.import_module, args=("modules.sheets",),
+                         name="preaquecer", daemon=True).start()
+
+
+def _obter_data_hora_brasil():
+    fuso = pytz.timezone("America/Sao_Paulo")
+    return datetime.now(fuso)
+
+
+def _dia_semana_pt(dt) -> str:
+    dias = {0: "Segunda-feira", 1: "Terça-feira", 2: "Quarta-feira",
+            3: "Quinta-feira", 4: "Sexta-feira", 5: "Sábado", 6: "Domingo"}
+    return dias[dt.weekday()]
+
+
+def _montar_linha(dados: dict) -> list:
+    agora = _obter_data_hora_brasil()
+    return [
+        agora.strftime("%d/%m/%Y"),
+        agora.strftime("%H:%M:%S"),
+        _dia_semana_pt(agora),
+        dados.get("setor", ""),
+        dados.get("colaborador", ""),
+        dados.get("motivo", ""),
+        dados.get("portal", ""),
+        str(dados.get("nota_fiscal", "")),
+        str(dados.get("numero_pedido", "")),
+        dados.get("motivo_crm", ""),
+        dados.get("transportadora", "-"),
+    ]
+
+
+def _config_armazenamento() -> tuple[str, bool]:
+    """Armazenamento principal (``"sheets"`` ou ``"local"``) e se a planilha espelha a base local.
+
+    ``ENGAGE_ARMAZENAMENTO`` ou ``armazenamento`` nos secrets escolhem o
+    principal; ``ENGAGE_ESPELHO_PLANILHA=0`` ou ``espelho_planilha = false``
+    desligam o espelho.
+    """
+    tipo, espelho = os.environ.get("ENGAGE_ARMAZENAMENTO"), os.environ.get("ENGAGE_ESPELHO_PLANILHA")
+    try:
+        tipo = tipo or st.secrets.get("armazenamento")
+        if espelho is None and "espelho_planilha" in st.secrets:
+            espelho = str(st.secrets["espelho_planilha"])
+    except Exception:
+        pass
+    return (tipo or "sheets").lower(), (espelho or "1").lower() not in ("0", "false")
+
+
+def _nova_fila(journal: Journal, armazenamento: "Armazenamento", idempotente: bool = True) -> FilaGravacao:
+    """Fila sobre ``journal``; sem ``idempotente`` as chaves não passam pelo índice da janela."""
+    indice = IndiceIdempotencia(
+        JANELA_IDEMPOTENCIA, recentes=journal.chaves_recentes(time.time() - JANELA_IDEMPOTENCIA)
+    ) if idempotente else None
+    # Confirmados ficam no journal pela janela e pelo painel de status, que ainda consulta o ticket
+    return FilaGravacao(journal, armazenamento.gravar_lote, armazenamento.conferir_lote,
+                        tamanho_lote=50, janela=armazenamento.janela, indice=indice,
+                        retencao=max(JANELA_IDEMPOTENCIA, RETENCAO_JOURNAL))
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def _armazenamento() -> "Armazenamento":
+    """Armazenamento principal do processo (ver ``_config_armazenamento``).
+
+    Com a base local a planilha vira espelho: os lotes gravados localmente são
+    reenviados a ela por uma segunda fila, com journal próprio.
+    """
+    from modules.sheets import ArmazenamentoSheets, _categorias
+
+    tipo, espelhar = _config_armazenamento()
+    if tipo != "local":
+        return ArmazenamentoSheets()
+    from modules.armazenamento import ArmazenamentoLocal
+
+    # A base local já dá a cada linha uma chave permanente (o id); a janela não se aplica ao espelho
+    espelho = (_nova_fila(Journal(CAMINHO_JOURNAL_ESPELHO), ArmazenamentoSheets(), idempotente=False)
+               if espelhar else None)
+    return ArmazenamentoLocal(COLUNAS, categorias=_categorias(), espelho=espelho)
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def _fila() -> FilaGravacao:
+    """Fila única do processo: journal local + gravação em lote de todas as sessões."""
+    return _nova_fila(Journal(), _armazenamento())
+
+
+def _chave_registro(dados: dict) -> str | None:
+    """Chave de idempotência; sem pedido nem NF o registro não é identificável."""
+    pedido, nf = str(dados.get("numero_pedido", "")), str(dados.get("nota_fiscal", ""))
+    if not (pedido.strip() or nf.strip()):
+        return None
+    return chave_idempotencia((
+        dados.get("setor", ""), dados.get("colaborador", ""), dados.get("motivo", ""), pedido, nf,
+    ))
+
+
+def enfileirar_registro(dados: dict) -> str:
+    """Anota o registro no journal local e retorna o ticket sem esperar a rede.
+
+    Levanta ``RegistroDuplicado`` se o mesmo atendimento (setor, colaborador,
+    motivo, pedido e NF) já foi anotado nos últimos ``JANELA_IDEMPOTENCIA``
+    segundos, por qualquer sessão.
+    """
+    with span("registro.enfileirar"):
+        return _fila().enfileirar(_montar_linha(dados), _chave_registro(dados))
+
+
+def status_registro(ticket: str) -> str | None:
+    """Status do ticket: "pendente", "gravado" ou None se desconhecido."""
+    return _fila().status(ticket)
+
+
+def registros_aguardando() -> int:
+    """Registros salvos localmente que ainda não chegaram à planilha."""
+    return _fila().tamanho()
+
+
+def envio_com_falha() -> bool:
+    """True se a última tentativa de envio à planilha falhou (reenvio em backoff)."""
+    return _fila().ultimo_erro is not None
+
+
+def conferir_tickets(tickets: dict[str, dict]) -> tuple[list[dict], list[dict]]:
+    """Remove de ``tickets`` os que saíram da fila e devolve seus dados: ``(gravados, desconhecidos)``.
+
+    Desconhecido é o ticket que o journal não tem (outro processo, journal
+    limpo): não há como afirmar que chegou à planilha.
+    """
+    gravados, desconhecidos = [], []
+    for ticket in list(tickets):
+        status = status_registro(ticket)
+        if status == GRAVADO:
+            gravados.append(tickets.pop(ticket))
+        elif status != PENDENTE:
+            desconhecidos.append(tickets.pop(ticket))
+    return gravados, desconhecidos
+
+
+def salvar_registro(dados: dict, timeout: float = 15.0) -> bool:
+    """Anota no journal e espera a linha chegar à planilha (uso bloqueante).
+
+    Mesmo quando retorna False o registro não se perde: continua no journal e é
+    reenviado quando a conexão voltar.
+    """
+    with span("registro.salvar"):
+        try:
+            ticket = enfileirar_registro(dados)
+        except RegistroDuplicado as e:  # nova tentativa do mesmo registro: espera o original
+            ticket = e.ticket
+        return _fila().aguardar(ticket, timeout) == GRAVADO
+
+
+def carregar_base(ini: date | None = None, fim: date | None = None):
+    """Base consultada pelo dashboard: ``versao``, ``linhas``, ``cubo`` e ``fatiar``.
+
+    É o snapshot da planilha ou a base local, conforme o armazenamento. Com
+    ``ini``/``fim`` o snapshot só espera pelas abas mensais do período.
+    """
+    with span("dados.carregar_base"):
+        return _armazenamento().base(ini, fim)
+
+
+def historico_pedido(pedido: str | None = None, nf: str | None = None, limite: int = 20) -> "pd.DataFrame":
+    """Atendimentos já registrados para o pedido ou a NF (mais recentes primeiro)."""
+    with span("historico.consultar"):
+        return _armazenamento().historico(pedido, nf, limite)
+
@@ -0,0 +1,179 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from modules.ingestao import alinhar_categorias, concatenar, limites_periodo, mascara_categorias
+
+DIMENSOES = ["Data_Filtro", "Hora_Int", "Setor", "Colaborador", "Portal", "Motivo_CRM"]
+
+
+def agrupar(linhas: pd.DataFrame) -> pd.DataFrame:
+    """Contagem de atendimentos por data × hora × setor × colaborador × portal × motivo CRM.
+
+    Espera o frame tipado por ``modules.ingestao.tipar``.
+    """
+    if linhas.empty:
+        return pd.DataFrame({**{d: [] for d in DIMENSOES}, "Qtd": []})
+    return linhas.groupby(DIMENSOES, dropna=False, observed=True).size().reset_index(name="Qtd")
+
+
+class CuboAtendimentos:
+    """Rollup pré-agregado dos atendimentos, mantido incrementalmente.
+
+    O tamanho de ``df`` cresce com o número de combinações distintas das
+    dimensões, não com o número de atendimentos.
+    """
+
+    def __init__(self):
+        self.df = agrupar(pd.DataFrame())
+
+    def reconstruir(self, linhas: pd.DataFrame):
+        self.df = agrupar(linhas)
+
+    def incorporar(self, novas: pd.DataFrame):
+        if novas.empty:
+            return
+        if self.df.empty:
+            self.df = agrupar(novas)
+            return
+        atual, novo = alinhar_categorias(self.df, agrupar(novas))
+        juntos = pd.concat([atual, novo], ignore_index=True)
+        self.df = juntos.groupby(DIMENSOES, dropna=False, observed=True)["Qtd"].sum().reset_index()
+
+    def combinar(self, cubos: list["CuboAtendimentos"]):
+        """Soma cubos de partes disjuntas da base (ex.: um por aba mensal)."""
+        partes = [c.df for c in cubos if not c.df.empty]
+        if not partes:
+            self.df = agrupar(pd.DataFrame())
+            return
+        juntos = concatenar(partes)
+        self.df = juntos.groupby(DIMENSOES, dropna=False, observed=True)["Qtd"].sum().reset_index()
+
+
+# ── Consultas usadas pelo dashboard ──────────────────────────────────────────
+
+def filtrar(cubo: pd.DataFrame, ini: date, fim: date, setores: list[str]) -> pd.DataFrame:
+    """Recorte do cubo (ordenado por data) por busca binária no período."""
+    lo, hi = limites_periodo(cubo["Data_Filtro"], ini, fim)
+    parte = cubo.iloc[lo:hi]
+    if isinstance(parte["Setor"].dtype, pd.CategoricalDtype):
+        return parte[mascara_categorias(parte["Setor"], setores)]
+    return parte[parte["Setor"].isin(setores)]
+
+
+def _mais_frequente(contagem: pd.Series) -> str:
+    """Como ``Series.mode()[0]`` sobre as linhas: no empate vence o primeiro em ordem alfabética."""
+    return min(contagem.index[contagem == contagem.max()])
+
+
+def kpis(cubo: pd.DataFrame) -> dict:
+    total = int(cubo["Qtd"].sum())
+    por_setor = cubo.groupby("Setor", observed=True)["Qtd"].sum()
+    por_portal = cubo.groupby("Portal", observed=True)["Qtd"].sum()
+    sac = int(por_setor.get("SAC", 0))
+    return {
+        "total": total,
+        "sac":   sac,
+        "pend":  int(por_setor.get("Pendência", 0)),
+        "taxa_sac":   f"{sac / total * 100:.1f}%" if total else "0%",
+        "top_portal": _mais_frequente(por_portal) if not por_portal.empty else "-",
+    }
+
+
+def por_colaborador(cubo: pd.DataFrame) -> pd.DataFrame:
+    """Total, dias com atendimento e atendimentos/dia por colaborador."""
+    return (
+        cubo.groupby("Colaborador", observed=True)
+        .agg(total_atend=("Qtd", "sum"), dias=("Data_Filtro", "nunique"))
+        .assign(taxa=lambda t: t["total_atend"] / t["dias"].clip(lower=1))
+    )
+
+
+def total_colaborador(cubo: pd.DataFrame, colaborador: str, ini: date, fim: date | None = None) -> int:
+    """Atendimentos do colaborador entre ``ini`` (inclusive) e ``fim`` (exclusive)."""
+    datas = cubo["Data_Filtro"].to_numpy()
+    lo = datas.searchsorted(np.datetime64(pd.Timestamp(ini)), side="left")
+    hi = datas.searchsorted(np.datetime64(pd.Timestamp(fim)), side="left") if fim is not None else len(cubo)
+    parte = cubo.iloc[lo:hi]
+    return int(parte.loc[(parte["Colaborador"] == colaborador).to_numpy(), "Qtd"].sum())
+
+
+def tendencia_diaria(cubo: pd.DataFrame) -> pd.DataFrame:
+    return cubo.groupby("Data_Filtro", observed=True)["Qtd"].sum().reset_index(name="Atendimentos")
+
+
+def _por_semana(cubo: pd.DataFrame) -> pd.DataFrame:
+    return cubo.assign(Semana=cubo["Data_Filtro"].dt.to_period("W").dt.start_time)
+
+
+def media_semanal_time(cubo: pd.DataFrame) -> pd.DataFrame:
+    """Semana × média de atendimentos por colaborador."""
+    return (
+        _por_semana(cubo).groupby(["Semana", "Colaborador"], observed=True)["Qtd"].sum()
+        .groupby("Semana", observed=True).mean()
+        .reset_index(name="Media_Time")
+    )
+
+
+def semanas_colaborador(cubo: pd.DataFrame, colaborador: str) -> pd.DataFrame:
+    """Semana × atendimentos do colaborador."""
+    if not colaborador:
+        return pd.DataFrame(columns=["Semana", "Atendimentos"])
+    parte = cubo[(cubo["Colaborador"] == colaborador).to_numpy()]
+    return _por_semana(parte).groupby("Semana", observed=True)["Qtd"].sum().reset_index(name="Atendimentos")
+
+
+def evolucao_semanal(cubo: pd.DataFrame, colaborador: str, media_time: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Semana × (média do time por colaborador, atendimentos do colaborador).
+
+    ``media_time`` evita recalcular a parte do time quando ela já está em cache.
+    """
+    if media_time is None:
+        media_time = media_semanal_time(cubo)
+    return pd.merge(media_time, semanas_colaborador(cubo, colaborador), on="Semana", how="left").fillna(0)
+
+
+def distribuicao_portal(cubo: pd.DataFrame) -> pd.DataFrame:
+    portais = (
+        cubo.groupby("Portal", observed=True)["Qtd"].sum()
+        .sort_values(ascending=False, kind="stable")
+        .reset_index()
+    )
+    portais.columns = ["Portal", "Qtd"]
+    return portais
+
+
+def _com_crm(cubo: pd.DataFrame) -> pd.DataFrame:
+    return cubo[cubo["Motivo_CRM"].notna() & (cubo["Motivo_CRM"] != "-")]
+
+
+def top_motivos_crm(cubo: pd.DataFrame, n: int = 12) -> pd.DataFrame:
+    crm = (
+        _com_crm(cubo).groupby("Motivo_CRM", observed=True)["Qtd"].sum()
+        .sort_values(ascending=False, kind="stable")
+        .head(n)
+        .reset_index()
+    )
+    crm.columns = ["Motivo", "Qtd"]
+    return crm
+
+
+def picos_por_hora(cubo: pd.DataFrame) -> pd.DataFrame:
+    """Percentual de cada hora dentro do total do setor."""
+    total_sec = cubo.groupby("Setor", observed=True)["Qtd"].sum().reset_index(name="Total_Setor")
+    heat = cubo.groupby(["Hora_Int", "Setor"], observed=True)["Qtd"].sum().reset_index(name="Atendimentos")
+    heat = heat[heat["Atendimentos"] > 0]
+    heat = pd.merge(heat, total_sec, on="Setor")
+    heat["Pct"] = (heat["Atendimentos"] / heat["Total_Setor"]) * 100
+    return heat
+
+
+def motivos_por_setor(cubo: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    com_crm = _com_crm(cubo)
+    top = top_motivos_crm(com_crm, n)["Motivo"].tolist()
+    return (
+        com_crm[com_crm["Motivo_CRM"].isin(top)]
+        .groupby(["Motivo_CRM", "Setor"], observed=True)["Qtd"].sum()
+        .reset_index()
+    )
@@ -5,11 +5,15 @@ import time
 import streamlit as st
 import streamlit.components.v1 as components
 
-from modules.templates import carregar_templates, carregar_listas
-from modules.sheets import salvar_registro
+from modules.templates import carregar_listas, carregar_motor, carregar_templates, renderizar_texto
+from modules.historico import painel_historico
+from modules.idempotencia import RegistroDuplicado
+from modules.metricas import span
+from modules.registros import JANELA_IDEMPOTENCIA, enfileirar_registro
+from modules.status_gravacao import painel_gravacoes
 from modules.validation import validar_sac
 
-_COOLDOWN = 60  # segundos mínimos entre registros idênticos
+_COOLDOWN = JANELA_IDEMPOTENCIA  # segundos mínimos entre registros idênticos (a mesma janela da fila)
 
 
 def _copiar_para_clipboard(texto: str):
@@ -95,20 +99,6 @@ LISTA_LIVRE = [
     "INFORMAÇÃO SOBRE O REEMBOLSO",
 ]
 
-SCRIPTS_MARTINS = [
-    "CANCELAMENTO MARTINS (FRETE)",
-    "CANCELAMENTO MARTINS (ESTOQUE)",
-    "CANCELAMENTO MARTINS (PREÇO)",
-]
-
-EXCECOES_NF = [
-    "SAUDAÇÃO", "AGRADECIMENTO", "AGRADECIMENTO 2", "PRÉ-VENDA",
-    "BARRAR ENTREGA NA TRANSPORTADORA", "ALTERAÇÃO DE ENDEREÇO (SOLICITAÇÃO DE DADOS)",
-    "ESTOQUE FALTANTE", "COMPROVANTE DE ENTREGA (MARTINS)", "PEDIDO AMAZON FBA",
-    "BAIXA ERRÔNEA", "COBRANÇA INDEVIDA", "INFORMAÇÃO EMBALAGEM",
-    "RETIRADA DE ENTREGA", "ENCERRAMENTO DE CHAT", "SOLICITAÇÃO DE COLETA",
-] + LISTA_LIVRE
-
 
 def _hash_ticket_s() -> str:
     """Hash dos campos que identificam unicamente um atendimento de SAC."""
@@ -135,11 +125,6 @@ def _callback_registrar(texto_final: str, transp_extra: str):
         st.session_state["_aviso_dup_s"] = restante
         return  # Bloqueia sem salvar
 
-    # ── Double-submit (cliques simultâneos) ───────────────────────────────
-    if st.session_state.get("_salvando_s"):
-        return
-    st.session_state["_salvando_s"] = True
-
     dados = {
         "setor":          "SAC",
         "colaborador":    st.session_state.get("colab_s", ""),
@@ -151,27 +136,31 @@ def _callback_registrar(texto_final: str, transp_extra: str):
         "transportadora": transp_extra or "-",
     }
 
-    sucesso = salvar_registro(dados)
-    st.session_state["_salvando_s"] = False
-
-    if sucesso:
-        st.session_state["_ultimo_hash_s"] = hash_atual
-        st.session_state["_ultimo_save_s"] = time.time()
-        st.session_state["sucesso_recente_s"] = True
-        for campo in ["cliente_s", "nf_s", "ped_s"]:
-            if campo in st.session_state:
-                st.session_state[campo] = ""
-        for campo in [
-            "end_coleta_sac", "fab_in_7", "cont_assist_in_7", "data_comp_out_7",
-            "nf_out_7", "link_out_7", "cod_post_sac", "cod_col_sac", "data_ent_sac",
-            "fab_glp", "site_glp", "val_desc", "prev_ent", "link_rast", "nf_rast",
-            "rua_ins", "cep_ins", "num_ins", "bair_ins", "cid_ins", "uf_ins",
-            "comp_ins", "ref_ins", "data_limite_recusa", "data_entrega_canc_ent",
-        ]:
-            if campo in st.session_state:
-                st.session_state[campo] = ""
-    else:
+    # Só anota no journal local: o envio à planilha acontece fora do callback
+    try:
+        ticket = enfileirar_registro(dados)
+    except RegistroDuplicado as e:  # já anotado por outra aba/sessão
+        st.session_state["_aviso_dup_s"] = e.restante
+        return
+    except Exception:
         st.session_state["erro_recente_s"] = True
+        return
+    st.session_state.setdefault("_tickets_s", {})[ticket] = dados
+
+    st.session_state["_ultimo_hash_s"] = hash_atual
+    st.session_state["_ultimo_save_s"] = time.time()
+    for campo in ["cliente_s", "nf_s", "ped_s"]:
+        if campo in st.session_state:
+            st.session_state[campo] = ""
+    for campo in [
+        "end_coleta_sac", "fab_in_7", "cont_assist_in_7", "data_comp_out_7",
+        "nf_out_7", "link_out_7", "cod_post_sac", "cod_col_sac", "data_ent_sac",
+        "fab_glp", "site_glp", "val_desc", "prev_ent", "link_rast", "nf_rast",
+        "rua_ins", "cep_ins", "num_ins", "bair_ins", "cid_ins", "uf_ins",
+        "comp_ins", "ref_ins", "data_limite_recusa", "data_entrega_canc_ent",
+    ]:
+        if campo in st.session_state:
+            st.session_state[campo] = ""
 
 
 def _limpar_campos_s():
@@ -194,17 +183,17 @@ def _limpar_campos_s():
 
 
 def pagina_sac():
-    if st.session_state.pop("sucesso_recente_s", False):
-        st.toast("Registrado e Limpo!", icon="✅")
+    # ── Status das gravações em lote ──────────────────────────────────────
     if st.session_state.pop("erro_recente_s", False):
         st.error("⚠️ Falha ao salvar. Tente novamente.")
+    painel_gravacoes("_tickets_s")
 
     restante = st.session_state.pop("_aviso_dup_s", None)
     if restante is not None:
         st.warning(
-            f"⚠️ **Registro duplicado bloqueado.** Este atendimento já foi registrado "
-            f"há menos de {restante} segundos. Mude o número do pedido ou NF para "
-            f"continuar, ou aguarde antes de registrar o mesmo atendimento novamente."
+            f"⚠️ **Registro duplicado bloqueado.** Este atendimento já foi registrado. "
+            f"Mude o número do pedido ou NF para continuar, ou aguarde {restante}s "
+            f"para registrar o mesmo atendimento novamente."
         )
 
     st.markdown("""
@@ -253,6 +242,8 @@ def pagina_sac():
     with c6:
         motivo_crm = st.selectbox("📂 Motivo CRM:", motivos_crm, key="crm_s")
 
+    painel_historico(numero_pedido, nota_fiscal)
+
     st.markdown("---")
 
     opcao = st.selectbox("💬 Qual o motivo do contato?", lista_motivos, key="msg_s")
@@ -279,6 +270,15 @@ def pagina_sac():
         <span style="font-size:1rem;font-weight:700;color:#1e293b">2. Visualização da Mensagem</span>
     </div>""", unsafe_allow_html=True)
 
+    # ── Valores dos slots ─────────────────────────────────────────────────
+    valores = {
+        "nome_cliente":  nome_cliente if nome_cliente else "(Nome do cliente)",
+        "numero_pedido": numero_pedido if numero_pedido else "......",
+        "portal":        str(portal),
+        "colaborador":   colab if "AMAZON" not in portal else "",
+        **{chave: valor if valor else "................" for chave, valor in dados_extras.items()},
+    }
+
     # ── Livre escrita ─────────────────────────────────────────────────────
     if opcao in LISTA_LIVRE:
         if opcao == "RECLAME AQUI":
@@ -287,66 +287,14 @@ def pagina_sac():
             label_texto = f"Detalhes sobre {opcao}:"
         else:
             label_texto = "Digite a mensagem personalizada:"
-        texto_base = st.text_area(label_texto, height=200, key="texto_livre_s")
-        if texto_base:
-            texto_base += f"\n\nEquipe de atendimento Engage Eletro.\n{{colaborador}}"
-    else:
-        texto_base = modelos.get(opcao, "")
-
-    # ── Substituições base ────────────────────────────────────────────────
-    nome_str = nome_cliente if nome_cliente else "(Nome do cliente)"
-    ped_str = numero_pedido if numero_pedido else "......"
-
-    texto_base = texto_base.replace("(Nome do cliente)", nome_str)
-
-    # Casos especiais de montagem do texto
-    if opcao in SCRIPTS_MARTINS:
-        texto_final = texto_base.replace("{nome_cliente}", nome_str)
-
-    elif opcao == "RETIRADA DE ENTREGA":
-        texto_final = texto_base.replace("{numero_pedido}", ped_str).replace("(Nome do cliente)", nome_str)
-
-    elif opcao == "SOLICITAÇÃO DE COLETA":
-        end_res = dados_extras.get("endereco_resumido", "................")
-        texto_final = (texto_base
-                       .replace("{numero_pedido}", ped_str)
-                       .replace("{endereco_resumido}", end_res or "................"))
-
-    elif opcao == "ENCERRAMENTO DE CHAT":
-        texto_final = texto_base
-
-    elif opcao == "ESTOQUE FALTANTE":
-        texto_final = texto_base.replace("{portal}", str(portal))
-
-    elif opcao == "COMPROVANTE DE ENTREGA (MARTINS)":
-        texto_final = ""
-
-    elif opcao == "BARRAR ENTREGA NA TRANSPORTADORA":
-        corpo = modelos["BARRAR ENTREGA NA TRANSPORTADORA"].replace("Olá, (Nome do cliente)!", "").strip()
-        texto_final = f"Olá, {nome_str}!\nO atendimento é referente ao seu pedido de número {ped_str}\n\n{corpo}"
-
-    elif opcao == "ALTERAÇÃO DE ENDEREÇO (SOLICITAÇÃO DE DADOS)":
-        corpo = modelos["ALTERAÇÃO DE ENDEREÇO (SOLICITAÇÃO DE DADOS)"].replace("Olá, (Nome do cliente)!", "").strip()
-        texto_final = f"Olá, {nome_str}!\nO atendimento é referente ao seu pedido de número {ped_str}\n\n{corpo}"
-
-    elif opcao in EXCECOES_NF or opcao in LISTA_LIVRE:
-        texto_final = texto_base
-
+        texto_livre = st.text_area(label_texto, height=200, key="texto_livre_s")
+        if texto_livre:
+            texto_livre += f"\n\nEquipe de atendimento Engage Eletro.\n{{colaborador}}"
+        with span("mensagem.sac"):
+            texto_final = renderizar_texto(texto_livre, valores) if texto_livre else ""
     else:
-        frase = f"O atendimento é referente ao seu pedido de número {ped_str}..."
-        if "\n" in texto_base:
-            partes = texto_base.split("\n", 1)
-            texto_final = f"{partes[0]}\n\n{frase}\n{partes[1]}"
-        else:
-            texto_final = f"{frase}\n\n{texto_base}"
-
-    # Assinatura
-    assinatura = colab if "AMAZON" not in portal else ""
-    texto_final = texto_final.replace("{colaborador}", assinatura)
-
-    # Substitui todos os campos extras
-    for chave, valor in dados_extras.items():
-        texto_final = texto_final.replace(f"{{{chave}}}", valor if valor else "................")
+        with span("mensagem.sac"):
+            texto_final = carregar_motor("sac").renderizar(opcao, valores)
 
     st.markdown(f'<div class="preview-box">{texto_final}</div>', unsafe_allow_html=True)
     st.write("")
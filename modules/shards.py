@@ -0,0 +1,162 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from modules.indice_pedidos import mais_recentes
+from modules.ingestao import concatenar, ordenar
+from modules.rollup import CuboAtendimentos
+from modules.snapshot import SnapshotAtendimentos, pa
+
+_PADRAO_ABA = re.compile(r"^(\d{4})-(\d{2})$")
+DIAS_CARENCIA = 3  # um mês só é dado como fechado alguns dias depois de acabar (fila atrasada)
+
+
+# ── Nomes das abas ────────────────────────────────────────────────────────────
+
+def aba_do_mes(dia: date) -> str:
+    """Título da aba mensal que guarda ``dia``: ``AAAA-MM``."""
+    return f"{dia.year:04d}-{dia.month:02d}"
+
+
+def mes_da_aba(titulo: str) -> date | None:
+    """Primeiro dia do mês da aba, ou None se não for uma aba mensal."""
+    m = _PADRAO_ABA.match(titulo)
+    if not m or not 1 <= int(m.group(2)) <= 12:
+        return None
+    return date(int(m.group(1)), int(m.group(2)), 1)
+
+
+def _ordem_aba(titulo: str) -> tuple:
+    """Chave de ordenação das abas: a base antiga (não mensal) primeiro, depois os meses."""
+    mes = mes_da_aba(titulo)
+    return mes is not None, mes or date.min, titulo
+
+
+def _fim_do_mes(mes: date) -> date:
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def agrupar_por_aba(linhas: list[list]) -> dict[str, list[int]]:
+    """Índices de ``linhas`` por aba mensal, pela coluna Data (``dd/mm/aaaa``)."""
+    grupos: dict[str, list[int]] = {}
+    for i, linha in enumerate(linhas):
+        dia = datetime.strptime(str(linha[0]), "%d/%m/%Y").date()
+        grupos.setdefault(aba_do_mes(dia), []).append(i)
+    return grupos
+
+
+# ── Snapshot ──────────────────────────────────────────────────────────────────
+
+class SnapshotMensal(SnapshotAtendimentos):
+    """Snapshot de uma planilha dividida em abas mensais (``AAAA-MM``).
+
+    Cada aba tem o seu ``SnapshotAtendimentos`` (incremental, persistido em
+    ``pasta``); ``df`` e ``cubo`` são a junção de todas as partes já lidas.
+    A primeira aba, se não for mensal, é a base antiga (``sheet1``) e entra
+    sempre. As abas de meses fechados não mudam mais: depois de lidas uma vez
+    (ou recarregadas do disco) nunca voltam a ser consultadas. As que precisam
+    de leitura são buscadas em paralelo.
+    """
+
+    def __init__(
+        self,
+        colunas: list[str],
+        pasta: str | None = None,
+        categorias: dict[str, list[str]] | None = None,
+        workers: int = 4,
+    ):
+        super().__init__(colunas, caminho=None, categorias=categorias)
+        self.pasta = pasta if pa is not None else None
+        self.partes: dict[str, SnapshotAtendimentos] = {}
+        self._titulos: list[str] = []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot-aba")
+        if self.pasta and os.path.isdir(self.pasta):
+            for arquivo in os.listdir(self.pasta):
+                if arquivo.endswith(".arrow"):
+                    self._parte(unquote(arquivo[:-len(".arrow")]))
+            # Sem a planilha, a ordem das abas é a de ``_combinar``: a base antiga na frente
+            self._titulos = sorted(self.partes, key=_ordem_aba)
+            self._combinar()
+
+    def _parte(self, titulo: str) -> SnapshotAtendimentos:
+        if titulo not in self.partes:
+            caminho = os.path.join(self.pasta, quote(titulo, safe="") + ".arrow") if self.pasta else None
+            self.partes[titulo] = SnapshotAtendimentos(self.colunas, caminho=caminho, categorias=self.categorias)
+        return self.partes[titulo]
+
+    @staticmethod
+    def _fechada(titulo: str) -> bool:
+        mes = mes_da_aba(titulo)
+        return mes is not None and date.today() > _fim_do_mes(mes) + timedelta(days=DIAS_CARENCIA)
+
+    def _necessarias(self, titulos: list[str], ini: date | None, fim: date | None) -> list[str]:
+        """Abas que cobrem o período: a base antiga mais os meses que o tocam."""
+        escolhidas = titulos[:1] if titulos and mes_da_aba(titulos[0]) is None else []
+        for titulo in titulos:
+            mes = mes_da_aba(titulo)
+            if mes is None:
+                continue
+            if (ini is None or _fim_do_mes(mes) >= ini) and (fim is None or mes <= fim):
+                escolhidas.append(titulo)
+        return escolhidas
+
+    def cobre(self, ini: date | None = None, fim: date | None = None) -> bool:
+        """True se todas as abas conhecidas do período já foram lidas."""
+        return bool(self._titulos) and all(t in self.partes for t in self._necessarias(self._titulos, ini, fim))
+
+    def _combinar(self):
+        ordem = sorted(self.partes, key=_ordem_aba)
+        frames = [self.partes[t].df for t in ordem if not self.partes[t].df.empty]
+        if frames:
+            df = concatenar(frames)
+            em_ordem = all(
+                pd.notna(a["Data_Filtro"].iloc[-1]) and pd.notna(b["Data_Filtro"].iloc[0])
+                and (a["Data_Filtro"].iloc[-1], a["Hora"].iloc[-1]) <= (b["Data_Filtro"].iloc[0], b["Hora"].iloc[0])
+                for a, b in zip(frames, frames[1:])
+            )
+            if not em_ordem:  # a base antiga pode ter linhas dos mesmos meses das abas
+                df = ordenar(df).reset_index(drop=True)
+        else:
+            df = pd.DataFrame()
+        cubo = CuboAtendimentos()
+        cubo.combinar([p.cubo for p in self.partes.values()])
+        self.linhas = sum(p.linhas for p in self.partes.values())
+        # Contador próprio: as versões das partes vêm do disco e a soma delas pode se repetir
+        self.publicar(df, cubo, self.versao + 1)
+
+    def historico(self, pedido: str | None = None, nf: str | None = None, limite: int = 20) -> pd.DataFrame:
+        """Como ``SnapshotAtendimentos.historico``, consultando o índice de cada aba."""
+        achados = [parte.historico(pedido, nf, limite) for parte in list(self.partes.values())]
+        achados = [a for a in achados if not a.empty]
+        if not achados:
+            return mais_recentes(pd.DataFrame(), limite)
+        return mais_recentes(pd.concat(achados, ignore_index=True), limite)
+
+    def atualizar(self, sheet, validade: float = 60.0, ini: date | None = None, fim: date | None = None) -> pd.DataFrame:
+        """Sincroniza as abas do período (todas, sem ``ini``/``fim``).
+
+        ``sheet`` é a ``PlanilhaMonitorada`` da planilha (precisa de ``abas()``).
+        """
+        with self._lock:
+            if time.time() - self.atualizado_em < validade and self.cobre(ini, fim):
+                return self.df
+            abas = sheet.abas()
+            self._titulos = list(abas)
+            ler = [
+                t for t in self._necessarias(self._titulos, ini, fim)
+                if not (self._fechada(t) and t in self.partes and (self.partes[t].linhas or self.partes[t].atualizado_em))
+            ]
+            antes = {t: p.versao for t, p in self.partes.items()}
+            futuros = [self._executor.submit(self._parte(t).atualizar, abas[t], 0) for t in ler]
+            erros = [f.exception() for f in futuros if f.exception() is not None]
+            if antes != {t: p.versao for t, p in self.partes.items()}:
+                self._combinar()
+            if erros:
+                raise erros[0]
+            self.atualizado_em = time.time()
+            return self.df
@@ -1,94 +1,258 @@
-import time
+import json
 import os
+from collections import Counter
 
 import gspread
+from gspread.exceptions import APIError, WorksheetNotFound
 import pandas as pd
-import pytz
 import streamlit as st
-from datetime import datetime
+from datetime import date
+
+from modules.armazenamento import Armazenamento
+from modules.conexao import ConexaoPlanilha, PlanilhaMonitorada
+from modules.fila_gravacao import SemConexao
+from modules.ingestao import categorias_de_listas
+from modules.journal import VAR_DIR
+from modules.limitador import AgendadorSheets, CotaEsgotada
+from modules.metricas import cache_contado
+from modules.planilha_falsa import PlanilhaFalsa
+from modules.registros import COLUNAS
+from modules.shards import SnapshotMensal, agrupar_por_aba
+from modules.templates import carregar_listas, carregar_templates
 
 
 NOME_PLANILHA = "Base_Atendimentos_Engage"
-COLUNAS = ["Data", "Hora", "Dia_Semana", "Setor", "Colaborador", "Motivo",
-           "Portal", "Nota_Fiscal", "Numero_Pedido", "Motivo_CRM", "Transportadora"]
+TIMEOUT_HTTP = 30  # segundos por requisição ao Google
+# Cota da API por minuto (Google: 60 leituras e 60 escritas por usuário), com folga
+LEITURAS_POR_MINUTO = 55
+ESCRITAS_POR_MINUTO = 55
+PASTA_SNAPSHOT = os.environ.get("ENGAGE_SNAPSHOT", os.path.join(VAR_DIR, "snapshot"))  # um .arrow por aba
+
 
+def _config_planilha_falsa() -> dict | None:
+    """Parâmetros da planilha falsa, se ela estiver ligada.
 
-def _obter_data_hora_brasil():
-    fuso = pytz.timezone("America/Sao_Paulo")
-    return datetime.now(fuso)
+    Liga com a variável ``ENGAGE_PLANILHA_FALSA`` (JSON, ``{}`` para os padrões)
+    ou com a seção ``[planilha_falsa]`` em ``secrets.toml``; as chaves são os
+    argumentos de ``PlanilhaFalsa``.
+    """
+    bruto = os.environ.get("ENGAGE_PLANILHA_FALSA")
+    if bruto is not None:
+        return json.loads(bruto or "{}")
+    try:
+        if "planilha_falsa" in st.secrets:
+            return dict(st.secrets["planilha_falsa"])
+    except Exception:
+        pass
+    return None
 
 
-def _dia_semana_pt(dt) -> str:
-    dias = {0: "Segunda-feira", 1: "Terça-feira", 2: "Quarta-feira",
-            3: "Quinta-feira", 4: "Sexta-feira", 5: "Sábado", 6: "Domingo"}
-    return dias[dt.weekday()]
+@cache_contado(st.cache_resource, show_spinner=False)
+def _planilha_falsa(config: str) -> PlanilhaFalsa:
+    """Uma planilha falsa por configuração, viva enquanto o processo durar."""
+    return PlanilhaFalsa(COLUNAS, title=NOME_PLANILHA, **json.loads(config))
 
 
-@st.cache_resource(ttl=300, show_spinner=False)
-def _conectar() -> gspread.Worksheet | None:
+def _chave_planilha() -> str | None:
+    """ID da planilha (``ENGAGE_PLANILHA_ID`` ou ``planilha_id`` nos secrets).
+
+    Sem ele a primeira abertura é pelo título e o ID é lembrado pela conexão.
+    """
+    if os.environ.get("ENGAGE_PLANILHA_ID"):
+        return os.environ["ENGAGE_PLANILHA_ID"]
     try:
-        if "gcp_service_account" in st.secrets:
-            secrets = st.secrets["gcp_service_account"]
-            creds = {
-                "type": secrets["type"],
-                "project_id": secrets["project_id"],
-                "private_key_id": secrets["private_key_id"],
-                "private_key": secrets["private_key"].replace("\\n", "\n"),
-                "client_email": secrets["client_email"],
-                "client_id": secrets["client_id"],
-                "auth_uri": secrets["auth_uri"],
-                "token_uri": secrets["token_uri"],
-                "auth_provider_x509_cert_url": secrets["auth_provider_x509_cert_url"],
-                "client_x509_cert_url": secrets["client_x509_cert_url"],
-            }
-            client = gspread.service_account_from_dict(creds)
-        elif os.path.exists("credentials.json"):
-            client = gspread.service_account(filename="credentials.json")
-        else:
-            return None
-        return client.open(NOME_PLANILHA).sheet1
+        return st.secrets.get("planilha_id")
     except Exception:
         return None
 
 
-def salvar_registro(dados: dict) -> bool:
-    """Grava uma linha na planilha com 3 tentativas e backoff exponencial."""
-    agora = _obter_data_hora_brasil()
-    linha = [
-        agora.strftime("%d/%m/%Y"),
-        agora.strftime("%H:%M:%S"),
-        _dia_semana_pt(agora),
-        dados.get("setor", ""),
-        dados.get("colaborador", ""),
-        dados.get("motivo", ""),
-        dados.get("portal", ""),
-        str(dados.get("nota_fiscal", "")),
-        str(dados.get("numero_pedido", "")),
-        dados.get("motivo_crm", ""),
-        dados.get("transportadora", "-"),
-    ]
-    for tentativa in range(3):
+def _secrets_conta_servico():
+    try:
+        return st.secrets["gcp_service_account"] if "gcp_service_account" in st.secrets else None
+    except Exception:  # sem secrets.toml
+        return None
+
+
+def _criar_cliente() -> gspread.Client | None:
+    secrets = _secrets_conta_servico()
+    if secrets is not None:
+        creds = {
+            "type": secrets["type"],
+            "project_id": secrets["project_id"],
+            "private_key_id": secrets["private_key_id"],
+            "private_key": secrets["private_key"].replace("\\n", "\n"),
+            "client_email": secrets["client_email"],
+            "client_id": secrets["client_id"],
+            "auth_uri": secrets["auth_uri"],
+            "token_uri": secrets["token_uri"],
+            "auth_provider_x509_cert_url": secrets["auth_provider_x509_cert_url"],
+            "client_x509_cert_url": secrets["client_x509_cert_url"],
+        }
+        client = gspread.service_account_from_dict(creds)
+    elif os.path.exists("credentials.json"):
+        client = gspread.service_account(filename="credentials.json")
+    else:
+        return None
+    client.set_timeout(TIMEOUT_HTTP)
+    return client
+
+
+def _abrir_planilha(client: gspread.Client, chave: str | None) -> gspread.Worksheet:
+    planilha = client.open_by_key(chave) if chave else client.open(NOME_PLANILHA)
+    return planilha.sheet1
+
+
+def _verificar_planilha(sheet: gspread.Worksheet):
+    """Sondagem barata: só o ID da planilha, sem ler células."""
+    sheet.spreadsheet.fetch_sheet_metadata({"fields": "spreadsheetId"})
+
+
+def _abrir_falsa(planilha: PlanilhaFalsa, chave: str | None) -> PlanilhaFalsa:
+    _verificar_planilha(planilha)  # como o open_by_key real, passa pela rede (simulada)
+    return planilha
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def _conexao() -> ConexaoPlanilha:
+    """Conexão única do processo com a planilha (real ou falsa).
+
+    Todo o tráfego passa por um só ``AgendadorSheets``: cotas de leitura e
+    escrita do processo inteiro e leituras simultâneas iguais coalescidas.
+    """
+    agendador = AgendadorSheets(LEITURAS_POR_MINUTO, ESCRITAS_POR_MINUTO)
+    config = _config_planilha_falsa()
+    if config is not None:
+        falsa = _planilha_falsa(json.dumps(config, sort_keys=True))
+        return ConexaoPlanilha(lambda: falsa, _abrir_falsa, _verificar_planilha, agendador=agendador)
+    return ConexaoPlanilha(_criar_cliente, _abrir_planilha, _verificar_planilha,
+                           chave=_chave_planilha(), agendador=agendador)
+
+
+def _conectar() -> PlanilhaMonitorada | None:
+    """Worksheet da planilha, ou None enquanto não houver conexão."""
+    try:
+        return _conexao().obter()
+    except Exception:
+        return None
+
+
+_ABAS_COM_CABECALHO: set[str] = set()  # abas mensais já conferidas neste processo
+
+
+def _aba_para_gravar(sheet: PlanilhaMonitorada, titulo: str) -> PlanilhaMonitorada:
+    """Aba mensal ``titulo``, criada na primeira gravação do mês.
+
+    O cabeçalho é (re)escrito antes da primeira linha que o processo grava na
+    aba: se a criação foi interrompida, nenhuma linha de dados entra sem ele.
+    """
+    try:
+        aba = sheet.aba(titulo)
+    except WorksheetNotFound:
+        aba = sheet.criar_aba(titulo, linhas=1000, colunas=len(COLUNAS))
+    if titulo not in _ABAS_COM_CABECALHO:
+        aba.update([COLUNAS], "A1")
+        _ABAS_COM_CABECALHO.add(titulo)
+    return aba
+
+
+def _gravar_lote(linhas: list[list]):
+    """Grava cada linha na aba do seu mês (normalmente uma só chamada)."""
+    sheet = _conectar()
+    if sheet is None:
+        raise SemConexao("Sem conexão com o Google Sheets")
+    gravou = False
+    try:
+        for titulo, indices in agrupar_por_aba(linhas).items():
+            _aba_para_gravar(sheet, titulo).append_rows([linhas[i] for i in indices])
+            gravou = True
+    except (CotaEsgotada, APIError) as e:
+        recusado = isinstance(e, CotaEsgotada) or e.code == 429
+        if recusado and not gravou:  # recusado por cota: nada foi gravado
+            raise SemConexao(str(e)) from e
+        raise  # parte do lote pode ter sido gravada: fica em voo para conferência
+
+
+def _conferir_aba(aba: PlanilhaMonitorada, linhas: list[list]) -> set[int]:
+    """Índices de ``linhas`` que já constam no final da aba."""
+    ultima = len(aba.col_values(1))
+    primeira = max(2, ultima - 2 * len(linhas) - 50)
+    cauda = aba.get_values(f"A{primeira}:K{ultima}") if ultima >= 2 else []
+    n = len(COLUNAS)
+    # Multiconjunto: duas linhas iguais no lote só contam se as duas estão na aba
+    restantes = Counter(tuple((list(map(str, r)) + [""] * n)[:n]) for r in cauda)
+    presentes = set()
+    for k, linha in enumerate(linhas):
+        chave = tuple(map(str, linha))
+        if restantes[chave] > 0:
+            restantes[chave] -= 1
+            presentes.add(k)
+    return presentes
+
+
+def _conferir_lote(linhas: list[list]) -> set[int]:
+    """Índices de ``linhas`` que já constam na aba do seu mês."""
+    sheet = _conectar()
+    if sheet is None:
+        raise SemConexao("Sem conexão com o Google Sheets")
+    presentes = set()
+    for titulo, indices in agrupar_por_aba(linhas).items():
         try:
-            sheet = _conectar()
-            if sheet is None:
-                return False
-            sheet.append_row(linha)
-            return True
-        except Exception:
-            if tentativa < 2:
-                time.sleep(0.5 * (2 ** tentativa))
-    return False
-
-
-@st.cache_data(ttl=60, show_spinner=False)
-def carregar_dados_dashboard() -> pd.DataFrame:
+            aba = sheet.aba(titulo)
+        except WorksheetNotFound:
+            continue  # a aba nem chegou a ser criada: nada foi gravado
+        presentes |= {indices[k] for k in _conferir_aba(aba, [linhas[i] for i in indices])}
+    return presentes
+
+
+class ArmazenamentoSheets(Armazenamento):
+    """Google Sheets como armazenamento principal; o dashboard lê o snapshot."""
+
+    def gravar_lote(self, linhas: list[list]):
+        _gravar_lote(linhas)
+
+    def conferir_lote(self, linhas: list[list]) -> set[int]:
+        return _conferir_lote(linhas)
+
+    def base(self, ini: date | None = None, fim: date | None = None) -> SnapshotMensal:
+        return carregar_snapshot(ini, fim)
+
+    def historico(self, pedido: str | None = None, nf: str | None = None, limite: int = 20) -> pd.DataFrame:
+        """Pelo índice do snapshot; nunca espera a rede (a primeira carga roda em segundo plano)."""
+        snap = _snapshot()
+        snap.atualizar_em_segundo_plano(_conectar, validade=60)
+        return snap.historico(pedido, nf, limite)
+
+
+def _categorias() -> dict[str, list[str]]:
+    return categorias_de_listas(
+        carregar_listas(), [carregar_templates("sac"), carregar_templates("pendencias")]
+    )
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def _snapshot() -> SnapshotMensal:
+    """Snapshot único do processo, compartilhado por todas as sessões."""
+    return SnapshotMensal(COLUNAS, pasta=PASTA_SNAPSHOT, categorias=_categorias())
+
+
+def carregar_snapshot(ini: date | None = None, fim: date | None = None) -> SnapshotMensal:
+    """Snapshot da planilha, atualizado no máximo a cada 60 s lendo só as linhas novas.
+
+    Se o snapshot (em memória ou em disco) já cobre o período ``ini``/``fim``
+    (sem eles, todas as abas) ele é devolvido na hora e a conciliação com a
+    planilha roda em segundo plano. Senão espera a leitura só das abas do
+    período. O snapshot é compartilhado entre sessões: seus DataFrames não
+    devem ser alterados.
+    """
+    snap = _snapshot()
+    if snap.linhas and snap.cobre(ini, fim):
+        snap.atualizar_em_segundo_plano(_conectar, validade=60)
+        return snap
     sheet = _conectar()
     if sheet is None:
-        return pd.DataFrame()
+        return snap
     try:
-        registros = sheet.get_all_records()
-        if registros:
-            return pd.DataFrame(registros)
-        return pd.DataFrame(columns=COLUNAS)
+        snap.atualizar(sheet, validade=60, ini=ini, fim=fim)  # só as abas do período
     except Exception:
-        return pd.DataFrame()
+        pass
+    return snap
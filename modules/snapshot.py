@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+from modules.ingestao import (
+    alinhar_categorias, categorias_atuais, limites_periodo, mascara_categorias, ordenar, tipar,
+)
+from modules.explorador import IndiceExplorador
+from modules.indice_pedidos import IndicePedidos, mais_recentes
+from modules.metricas import span
+from modules.rollup import CuboAtendimentos
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sem pyarrow o snapshot fica só em memória
+    pa = None
+
+_PONTOS_AMOSTRA = 8  # linhas conferidas para detectar edições/remoções
+_FORMATO = "3"       # muda quando o layout do arquivo em disco muda
+
+
+class SnapshotAtendimentos:
+    """Cópia local da planilha (append-only) mantida por leitura incremental.
+
+    Guarda quantas linhas já foram ingeridas e, a cada atualização, busca apenas o
+    intervalo novo no final da planilha. Antes disso confere uma amostra de linhas
+    já ingeridas; se alguma mudou (edição ou remoção) faz a recarga completa.
+
+    Com ``caminho`` (e pyarrow instalado) o snapshot é persistido em Arrow IPC
+    com carimbo de versão e relido por memory-map na partida do processo.
+
+    ``df`` já vem tipado (ver ``modules.ingestao.tipar``) e ordenado por data e
+    hora; o índice guarda a posição da linha na planilha. ``cubo`` acompanha
+    ``df`` com as contagens pré-agregadas usadas nos gráficos, e ``indice``
+    com os pedidos e NFs de cada linha (ver ``historico``). ``df``, ``cubo`` e
+    ``versao`` são trocados juntos (``publicar``). O explorador de registros
+    usa um ``IndiceExplorador`` montado uma vez por versão.
+    """
+
+    def __init__(
+        self,
+        colunas: list[str],
+        caminho: str | None = None,
+        categorias: dict[str, list[str]] | None = None,
+    ):
+        self.colunas   = list(colunas)
+        self.categorias = categorias or {}
+        self.caminho   = caminho if pa is not None else None
+        self._atual: tuple[pd.DataFrame, CuboAtendimentos, int] = (pd.DataFrame(), CuboAtendimentos(), 0)
+        self.indice    = IndicePedidos()
+        self.linhas    = 0      # linhas de dados ingeridas (sem o cabeçalho)
+        self.atualizado_em = 0.0
+        self._lock = threading.Lock()
+        self._em_segundo_plano: threading.Thread | None = None
+        self._lock_thread = threading.Lock()  # separado: ``_lock`` fica preso durante a rede
+        self._mascaras_setor: tuple[int, dict[str, np.ndarray]] = (-1, {})
+        self._explorador: tuple[int, IndiceExplorador | None] = (-1, None)
+        self._lock_explorador = threading.Lock()
+        self._montando: threading.Thread | None = None
+        self._ler_disco()
+
+    # ── Versão publicada ─────────────────────────────────────────────────────
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._atual[0]
+
+    @property
+    def cubo(self) -> CuboAtendimentos:
+        return self._atual[1]
+
+    @property
+    def versao(self) -> int:
+        """Muda sempre que ``df`` muda."""
+        return self._atual[2]
+
+    def publicar(self, df: pd.DataFrame, cubo: CuboAtendimentos, versao: int):
+        """Troca ``df``, ``cubo`` e ``versao`` numa atribuição só.
+
+        Quem precisa de mais de um deles lê ``_atual`` uma vez e nunca junta
+        o frame novo com a versão (e as máscaras em cache) do anterior.
+        """
+        self._atual = (df, cubo, versao)
+
+    # ── Persistência ─────────────────────────────────────────────────────────
+
+    def _ler_disco(self):
+        if not self.caminho or not os.path.exists(self.caminho):
+            return
+        try:
+            tabela = feather.read_table(self.caminho, memory_map=True)
+            meta = tabela.schema.metadata or {}
+            if meta.get(b"formato", b"").decode() != _FORMATO:
+                return
+            colunas = json.loads(meta[b"colunas"])
+            df = tabela.to_pandas()
+            cubo = CuboAtendimentos()
+            cubo.reconstruir(df)
+            self.indice.reconstruir(df)
+            self.colunas, self.linhas = colunas, int(meta[b"linhas"])
+            self.publicar(df, cubo, int(meta[b"versao"]))
+        except Exception:
+            self.indice = IndicePedidos()
+            self.publicar(pd.DataFrame(), CuboAtendimentos(), 0)
+
+    def _gravar_disco(self):
+        if not self.caminho:
+            return
+        df, _, versao = self._atual
+        tabela = pa.Table.from_pandas(df, preserve_index=True)
+        tabela = tabela.replace_schema_metadata({
+            **(tabela.schema.metadata or {}),  # inclui o índice salvo pelo pandas
+            "formato": _FORMATO,
+            "colunas": json.dumps(self.colunas),
+            "linhas":  str(self.linhas),
+            "versao":  str(versao),
+        })
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        temporario = f"{self.caminho}.tmp"
+        feather.write_feather(tabela, temporario, compression="uncompressed")
+        os.replace(temporario, self.caminho)
+
+    # ── Amostragem ───────────────────────────────────────────────────────────
+
+    def _indices_amostra(self) -> list[int]:
+        if self.linhas == 0:
+            return []
+        passo = max(1, self.linhas // _PONTOS_AMOSTRA)
+        return sorted({*range(0, self.linhas, passo), self.linhas - 1})
+
+    @staticmethod
+    def _checksum(linhas: list[list]) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        for linha in linhas:
+            h.update("\x1f".join(map(str, linha)).encode())
+            h.update(b"\x1e")
+        return h.hexdigest()
+
+    def _normalizar(self, linhas: list[list]) -> list[list]:
+        n = len(self.colunas)
+        return [(list(map(str, r)) + [""] * n)[:n] for r in linhas]
+
+    def _amostra_confere(self, sheet) -> bool:
+        indices = self._indices_amostra()
+        ultima_col = rowcol_to_a1(1, len(self.colunas)).rstrip("1")
+        faixas = [f"A{i + 2}:{ultima_col}{i + 2}" for i in indices]
+        remotas = self._normalizar([(r[0] if r else []) for r in sheet.batch_get(faixas)])
+        locais = self.df.loc[indices, self.colunas].astype(str).values.tolist()
+        return self._checksum(remotas) == self._checksum(locais)
+
+    # ── Atualização ──────────────────────────────────────────────────────────
+
+    def _recarregar(self, sheet):
+        with span("snapshot.ler_planilha"):
+            valores = sheet.get_values()
+        with span("snapshot.tipar"):
+            if valores:
+                self.colunas = [c for c in valores[0] if c] or self.colunas
+            dados = self._normalizar(valores[1:])
+            df = ordenar(tipar(pd.DataFrame(dados, columns=self.colunas), self.categorias))
+            cubo = CuboAtendimentos()
+            cubo.reconstruir(df)
+            self.publicar(df, cubo, self.versao + 1)
+            self.indice.reconstruir(df)
+        self.linhas = len(dados)
+
+    def _anexar_cauda(self, sheet) -> bool:
+        ultima_col = rowcol_to_a1(1, len(self.colunas)).rstrip("1")
+        with span("snapshot.ler_planilha"):
+            cauda = self._normalizar(sheet.get_values(f"A{self.linhas + 2}:{ultima_col}"))
+        cauda = [r for r in cauda if any(r)]
+        if not cauda:
+            return False
+        with span("snapshot.tipar"):
+            novos = pd.DataFrame(cauda, columns=self.colunas,
+                                 index=pd.RangeIndex(self.linhas, self.linhas + len(cauda)))
+            novos = ordenar(tipar(novos, categorias_atuais(self.df)))
+        base, novos = alinhar_categorias(self.df, novos)
+        juntos = pd.concat([base, novos])
+        # Caso comum: tudo que chegou é mais recente que o snapshot, basta anexar
+        if not base.empty:
+            ult, pri = base.iloc[-1], novos.iloc[0]
+            em_ordem = (
+                pd.notna(ult["Data_Filtro"]) and pd.notna(pri["Data_Filtro"])
+                and (ult["Data_Filtro"], ult["Hora"]) <= (pri["Data_Filtro"], pri["Hora"])
+            )
+            if not em_ordem:
+                juntos = ordenar(juntos)
+        cubo = CuboAtendimentos()
+        cubo.df = self.cubo.df  # o cubo publicado não muda: ``incorporar`` monta um frame novo
+        cubo.incorporar(novos)
+        self.publicar(juntos, cubo, self.versao + 1)  # antes do índice: todo rótulo indexado já está em ``df``
+        self.indice.incorporar(novos)
+        self.linhas += len(cauda)
+        return True
+
+    def atualizar(self, sheet, validade: float = 60.0) -> pd.DataFrame:
+        """Sincroniza com a planilha se o snapshot tiver mais de ``validade`` segundos."""
+        with self._lock:
+            if time.time() - self.atualizado_em < validade:
+                return self.df
+            if self.linhas and self._amostra_confere(sheet):
+                mudou = self._anexar_cauda(sheet)
+            else:
+                self._recarregar(sheet)
+                mudou = True
+            if mudou:
+                try:
+                    self._gravar_disco()
+                except Exception:
+                    pass  # o disco é só aceleração da partida
+            self.atualizado_em = time.time()
+            return self.df
+
+    # ── Consultas ────────────────────────────────────────────────────────────
+
+    def _mascara_setor(self, df: pd.DataFrame, versao: int, setor: str) -> np.ndarray:
+        """Máscara do setor sobre ``df`` inteiro, calculada uma vez por versão."""
+        versao_cache, mascaras = self._mascaras_setor
+        if versao_cache != versao:
+            mascaras = {}
+            self._mascaras_setor = (versao, mascaras)
+        if setor not in mascaras:
+            mascaras[setor] = mascara_categorias(df["Setor"], [setor])
+        return mascaras[setor]
+
+    def fatiar(self, ini, fim, setores: list[str]) -> pd.DataFrame:
+        """Linhas entre ``ini`` e ``fim`` (inclusive) dos setores pedidos.
+
+        O período é resolvido por busca binária sobre as datas ordenadas e o
+        setor por máscaras pré-calculadas — nada percorre a base como objetos.
+        """
+        df, _, versao = self._atual
+        if df.empty:
+            return df
+        lo, hi = limites_periodo(df["Data_Filtro"], ini, fim)
+        parte = df.iloc[lo:hi]
+        if set(df["Setor"].cat.categories) <= set(setores):
+            return parte
+        mask = np.zeros(len(df), dtype=bool)
+        for setor in setores:
+            mask |= self._mascara_setor(df, versao, setor)
+        return parte[mask[lo:hi]]
+
+    def historico(self, pedido: str | None = None, nf: str | None = None, limite: int = 20) -> pd.DataFrame:
+        """Atendimentos anteriores do pedido ou da NF, do mais recente ao mais antigo.
+
+        Consulta o ``indice`` (dicionário) e busca só as linhas encontradas pelo
+        rótulo: o custo não depende do tamanho da base.
+        """
+        df = self.df
+        rotulos = [r for r in self.indice.rotulos(pedido, nf) if r in df.index]
+        return mais_recentes(df.loc[rotulos], limite)
+
+    def explorador(self) -> IndiceExplorador:
+        """Índice do explorador de registros sobre ``df``, montado uma vez por versão.
+
+        Só a primeira montagem espera. Quando a versão muda, o índice novo é
+        montado numa thread e, até ficar pronto, as consultas seguem no anterior
+        (que guarda o próprio ``df``: página e total continuam coerentes).
+        """
+        df, _, versao = self._atual
+        with self._lock_explorador:
+            versao_indice, indice = self._explorador
+            if indice is None:
+                with span("explorador.indexar"):
+                    indice = IndiceExplorador(df)
+                self._explorador = (versao, indice)
+            elif versao_indice != versao and not (self._montando is not None and self._montando.is_alive()):
+                self._montando = threading.Thread(
+                    target=self._montar_explorador, args=(df, versao, indice.busca_montada),
+                    name="explorador-indice", daemon=True,
+                )
+                self._montando.start()
+            return indice
+
+    def _montar_explorador(self, df: pd.DataFrame, versao: int, com_busca: bool):
+        with span("explorador.indexar"):
+            indice = IndiceExplorador(df)
+            if com_busca:  # já houve busca nesta base: a próxima não deve esperar pelos trigramas
+                indice.indice_busca()
+        with self._lock_explorador:
+            self._explorador = (versao, indice)
+
+    def explorar(self, filtros: dict[str, list[str]], busca: str = "", inicio: int = 0,
+                 quantidade: int = 50) -> tuple[pd.DataFrame, int]:
+        """Página do explorador (mais recentes primeiro) e o total de linhas que atendem aos filtros.
+
+        Filtros e busca vão aos índices da versão atual e só as linhas da
+        página são copiadas do frame.
+        """
+        pagina, total = self.explorador().pagina(filtros, busca, inicio, quantidade)
+        return pagina[[c for c in self.colunas if c in pagina]], total
+
+    def valores_filtro(self) -> dict[str, list[str]]:
+        """Valores presentes na base de cada coluna filtrável do explorador."""
+        return self.explorador().valores
+
+    def atualizar_em_segundo_plano(self, conectar: Callable, validade: float = 60.0):
+        """Dispara a sincronização numa thread, sem bloquear quem está lendo ``df``."""
+        if time.time() - self.atualizado_em < validade:
+            return
+        with self._lock_thread:
+            if self._em_segundo_plano is not None and self._em_segundo_plano.is_alive():
+                return
+
+            def _sincronizar():
+                sheet = conectar()
+                if sheet is not None:
+                    try:
+                        self.atualizar(sheet, validade)
+                    except Exception:
+                        pass
+
+            self._em_segundo_plano = threading.Thread(target=_sincronizar, name="snapshot-sync", daemon=True)
+            self._em_segundo_plano.start()
@@ -0,0 +1,40 @@
+import streamlit as st
+
+from modules.registros import conferir_tickets, envio_com_falha, registros_aguardando
+
+INTERVALO_STATUS = 2  # segundos entre consultas ao journal
+
+
+def _pedido(dados: dict) -> str:
+    return dados.get("numero_pedido") or dados.get("nota_fiscal") or "-"
+
+
+@st.fragment(run_every=INTERVALO_STATUS)
+def painel_gravacoes(chave_tickets: str):
+    """Acompanha os tickets da sessão sem travar o formulário.
+
+    Roda sozinho a cada ``INTERVALO_STATUS`` segundos, consultando só o journal
+    local: avisa com ✅ cada registro que chegou à planilha, com ⚠️ o que o
+    journal não conhece mais e quando o envio está falhando (os registros
+    continuam salvos e são reenviados).
+    """
+    tickets = st.session_state.get(chave_tickets, {})
+    if not tickets:
+        return
+    gravados, desconhecidos = conferir_tickets(tickets)
+    for dados in gravados:
+        st.toast(f"Registrado na planilha! (pedido {_pedido(dados)})", icon="✅")
+    for dados in desconhecidos:
+        st.toast(f"Status desconhecido: confira na planilha o pedido {_pedido(dados)}.", icon="⚠️")
+    if not tickets:
+        return
+    if envio_com_falha():
+        st.warning(
+            f"⚠️ Planilha indisponível no momento: {len(tickets)} registro(s) seu(s) salvo(s) "
+            "localmente serão reenviados automaticamente."
+        )
+    else:
+        st.caption(
+            f"⏳ {len(tickets)} registro(s) seu(s) salvo(s) localmente, aguardando envio à planilha "
+            f"({registros_aguardando()} na fila geral)."
+        )
@@ -1,12 +1,18 @@
 import json
 import os
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
 import streamlit as st
 
+from modules.metricas import cache_contado
+
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 
 
-@st.cache_data(show_spinner=False)
+@cache_contado(st.cache_data, show_spinner=False)
 def carregar_templates(setor: str) -> dict:
     if setor == "pendencias":
         path = os.path.join(DATA_DIR, "templates_pendencias.json")
@@ -16,19 +22,129 @@ def carregar_templates(setor: str) -> dict:
         return json.load(f)
 
 
-@st.cache_data(show_spinner=False)
+@cache_contado(st.cache_data, show_spinner=False)
 def carregar_listas() -> dict:
     path = os.path.join(DATA_DIR, "lists.json")
     with open(path, encoding="utf-8") as f:
         return json.load(f)
 
 
+# ── Motor de templates ───────────────────────────────────────────────────────
+# Os dois formatos de marcador — {chave} e "(Nome do cliente)" — viram slots.
+_SLOT = re.compile(r"\{(\w+)\}|\(Nome do cliente\)")
+
+# Regras de cabeçalho por motivo
+FRASE_PEDIDO    = "frase_pedido"     # frase do pedido logo após a 1ª linha
+SAUDACAO_PEDIDO = "saudacao_pedido"  # saudação reescrita já com o número do pedido
+SEM_CABECALHO   = "sem_cabecalho"    # texto usado como está
+SEM_TEXTO       = "sem_texto"        # motivo não gera mensagem
+
+_FRASE_PEDIDO = "O atendimento é referente ao seu pedido de número {numero_pedido}..."
+_SAUDACAO     = "Olá, (Nome do cliente)!"
+
+# Pendências sem mensagem para o cliente
+MOTIVOS_SEM_TEXTO_PENDENCIAS = [
+    "ATENDIMENTO DIGISAC", "2° TENTATIVA DE CONTATO", "3° TENTATIVA DE CONTATO",
+    "REENTREGA", "AGUARDANDO TRANSPORTADORA",
+]
+
+
+class TemplateCompilado(NamedTuple):
+    """Template quebrado em trechos literais intercalados com slots."""
+    literais: tuple[str, ...]   # len(literais) == len(slots) + 1
+    slots:    tuple[str, ...]
+    marcas:   tuple[str, ...]   # texto original de cada slot
+
+    def renderizar(self, valores: dict, padrao: str | None = None) -> str:
+        """Preenche todos os slots numa única passada.
+
+        Slots sem valor recebem ``padrao``; se ``padrao`` for None o marcador
+        original é mantido.
+        """
+        partes = [self.literais[0]]
+        for slot, marca, literal in zip(self.slots, self.marcas, self.literais[1:]):
+            valor = valores.get(slot)
+            partes.append(str(valor) if valor is not None else (marca if padrao is None else padrao))
+            partes.append(literal)
+        return "".join(partes)
+
+
+@lru_cache(maxsize=512)
+def compilar(texto: str) -> TemplateCompilado:
+    literais, slots, marcas = [], [], []
+    inicio = 0
+    for m in _SLOT.finditer(texto):
+        literais.append(texto[inicio:m.start()])
+        slots.append(m.group(1) or "nome_cliente")
+        marcas.append(m.group(0))
+        inicio = m.end()
+    literais.append(texto[inicio:])
+    return TemplateCompilado(tuple(literais), tuple(slots), tuple(marcas))
+
+
+def aplicar_cabecalho(texto: str, regra: str) -> str:
+    """Aplica a regra de cabeçalho sobre o texto cru (antes de compilar)."""
+    if regra == SEM_TEXTO:
+        return ""
+    if regra == SAUDACAO_PEDIDO:
+        corpo = texto.replace(_SAUDACAO, "").strip()
+        return f"{_SAUDACAO}\nO atendimento é referente ao seu pedido de número {{numero_pedido}}\n\n{corpo}"
+    if regra == FRASE_PEDIDO:
+        if "\n" in texto:
+            primeira, resto = texto.split("\n", 1)
+            return f"{primeira}\n\n{_FRASE_PEDIDO}\n{resto}"
+        return f"{_FRASE_PEDIDO}\n\n{texto}"
+    return texto
+
+
+def regras_cabecalho(setor: str, listas: dict) -> tuple[str, dict[str, str]]:
+    """Regra padrão e exceções por motivo de cada setor."""
+    if setor == "pendencias":
+        return FRASE_PEDIDO, {m: SEM_TEXTO for m in MOTIVOS_SEM_TEXTO_PENDENCIAS}
+    excecoes = {m: SEM_CABECALHO for m in
+                listas["excecoes_nf"] + listas["lista_livre_escrita"] + listas["scripts_martins"]}
+    excecoes["COMPROVANTE DE ENTREGA (MARTINS)"] = SEM_TEXTO
+    excecoes["BARRAR ENTREGA NA TRANSPORTADORA"] = SAUDACAO_PEDIDO
+    excecoes["ALTERAÇÃO DE ENDEREÇO (SOLICITAÇÃO DE DADOS)"] = SAUDACAO_PEDIDO
+    return FRASE_PEDIDO, excecoes
+
+
+class MotorTemplates:
+    """Todos os templates de um setor, compilados uma vez com suas regras de cabeçalho."""
+
+    def __init__(self, modelos: dict, padrao: str, excecoes: dict[str, str]):
+        self.compilados = {
+            motivo: compilar(aplicar_cabecalho(texto, excecoes.get(motivo, padrao)))
+            for motivo, texto in modelos.items()
+        }
+        self._renderizar_cache = lru_cache(maxsize=4096)(self._renderizar)
+
+    def _renderizar(self, motivo: str, valores: tuple) -> str:
+        compilado = self.compilados.get(motivo)
+        return compilado.renderizar(dict(valores)) if compilado else ""
+
+    def renderizar(self, motivo: str, valores: dict) -> str:
+        return self._renderizar_cache(motivo, tuple(sorted(valores.items())))
+
+
+@cache_contado(st.cache_resource, show_spinner=False)
+def carregar_motor(setor: str) -> MotorTemplates:
+    padrao, excecoes = regras_cabecalho(setor, carregar_listas())
+    return MotorTemplates(carregar_templates(setor), padrao, excecoes)
+
+
+@lru_cache(maxsize=1024)
+def _renderizar_texto(texto: str, valores: tuple) -> str:
+    return compilar(texto).renderizar(dict(valores))
+
+
+def renderizar_texto(texto: str, valores: dict) -> str:
+    """Renderiza um texto livre (digitado pelo atendente) com os mesmos slots dos templates."""
+    return _renderizar_texto(texto, tuple(sorted(valores.items())))
+
+
 def renderizar_template(template: str, dados: dict) -> str:
     """Substitui placeholders {chave} pelo valor correspondente.
     Placeholders sem valor ficam vazios — sem KeyError.
     """
-    class DefaultDict(dict):
-        def __missing__(self, key):
-            return ""
-
-    return template.format_map(DefaultDict(dados))
+    return compilar(template).renderizar(dados, padrao="")